@@ -1,146 +1,243 @@
-"""Converts PDF to images and processes them with AI agent. | Inputs: pdf_file | Outputs: ocr_results, pdf_name"""
+"""Converts PDF to images and processes them with AI agent. | Inputs: pdf_file | Outputs: ocr_results, pdf_name, _ocr_retry_pages"""
 
 import os
 import io
-import requests
+import importlib.util
 import json
-import urllib.parse
-from dotenv import load_dotenv
-
-# Try importing pypdfium2, handle if missing
-try:
-    import pypdfium2 as pdfium
-except ImportError:
-    pdfium = None
-    print("Warning: pypdfium2 not installed. PDF conversion will fail.")
-
-def convert_pdf(pdf_path):
-    auth_token = os.getenv("GIA_API_TOKEN")
-    pdf_name = os.path.basename(pdf_path)
-    images_data = []
-
-    if not pdfium:
+
+# gia_runtime is required; the OCR cache (OCR_CACHE=0) and the per-page
+# checkpoints (OCR_CHECKPOINT=0) are switched off through its settings
+from gia_runtime.cache import ocr_cache_key, open_ocr_cache
+from gia_runtime.checkpoint import content_key, open_checkpoint
+from gia_runtime.imaging import image_type, summarise
+from gia_runtime.pdf import downloaded_pdf, render_pages
+from gia_runtime.raster import render_processes
+from gia_runtime.scheduler import check_response, get_scheduler
+from gia_runtime.trace import in_context, span, start_trace
+
+# requests (via gia_runtime.client), pypdfium2 and dotenv are imported where they are
+# used, so loading this script stays cheap and a pre-warmed worker pays nothing for them
+
+def get_client():
+    """Pooled GIA API client (keep-alive, timeouts, retries); this deployment serves files under /api/uploads."""
+    from gia_runtime.client import GiaClient
+
+    return GiaClient(
+        os.getenv("GIA_API_TOKEN"),
+        base_url=os.environ.get("API_URL", "http://localhost:4000"),
+        files_route="/api/uploads",
+    )
+
+def convert_pdf(local_pdf_path, encode_stats=None):
+    """Returns a lazy iterator over the pages of the downloaded PDF (see gia_runtime.pdf.render_pages)."""
+    if importlib.util.find_spec("pypdfium2") is None:
         raise ImportError("pypdfium2 is required for PDF conversion")
 
-    # Download from MinIO via API
-    api_host = os.environ.get("API_URL", "http://localhost:4000")
-    headers = {"Authorization": f"Bearer {auth_token}"}
-    
-    # Simple URL encoding
-    encoded_path = urllib.parse.quote(pdf_path)
-    # The API seems to expect the path to be somewhat encoded or just appended. 
-    # Based on original code: encoded_path = '/'.join(urllib.parse.quote(segment, safe='') for segment in file_path.split('/'))
-    # Let's keep the split/quote logic to be safe as it works for the existing backend
-    encoded_path = '/'.join(urllib.parse.quote(segment, safe='') for segment in pdf_path.split('/'))
-    
-    url = f"{api_host.rstrip('/')}/api/uploads/download/{encoded_path}"
-    print(f"Downloading PDF from: {url}")
-    
-    response = requests.get(url, headers=headers, stream=True)
-    response.raise_for_status()
-
-    # Load PDF from bytes
-    pdf = pdfium.PdfDocument(response.content)
-    for i in range(len(pdf)):
-        page = pdf[i]
-        # scale=2 is ~144 DPI
-        bitmap = page.render(scale=2, rotation=0)
-        pil_image = bitmap.to_pil()
-        img_byte_arr = io.BytesIO()
-        pil_image.save(img_byte_arr, format='PNG', optimize=False, compress_level=0)
-        images_data.append(img_byte_arr.getvalue())
-            
-    return images_data, pdf_name
-
-def upload_images_to_minio(images_data, pdf_name, origin_path):
-    """Upload extracted images to MinIO."""
-    auth_token = os.getenv("GIA_API_TOKEN")
-    uploaded_paths = []
+    # OCR_TEXT_FAST_PATH=0 sends born-digital pages to vision OCR as well
+    text_fast_path = os.environ.get("OCR_TEXT_FAST_PATH", "1").lower() in ("1", "true", "yes")
+    # OCR_RENDER_PROCESSES > 1 (or 0 for all cores) rasterises pages in parallel
+    return render_pages(local_pdf_path, text_fast_path, render_processes(), encode_stats)
+
+def get_vision_request():
+    """Vision tool, method and prompt used for page OCR (also part of the cache key)."""
+    return {
+        "config_name": "OpenAI Vision",
+        "method_name": "analyze_image_standalone",
+        "prompt": "Analyze the image and transcribe the text if any. Do not add any conversational commentary."
+    }
+
+def upload_images_to_minio(client, images_data, pdf_name, origin_path, cache=None, completed=None):
+    """Upload extracted images to MinIO in multipart batches.
+
+    Returns the ordered page sources: {"page": n, "image": path, "cache_key": key}
+    for uploaded images and {"page": n, "text": markdown} for born-digital pages,
+    pages already done in the checkpoint (``completed``, page -> text) and
+    pages whose OCR result is already cached (these are not uploaded). A page
+    the upload returned no path for gets an ``"error"`` and is reported as
+    failed by process_images.
+    """
+    completed = completed or {}
+    page_sources = []
     
     pdf_folder = os.path.dirname(origin_path)
     extracted_folder = f"{pdf_folder}/extracted_files"
+    safe_name = os.path.splitext(pdf_name)[0]
+
+    # Up to GIA_UPLOAD_BATCH_SIZE rendered pages are held before each upload request
+    batch_size = max(1, int(os.environ.get("GIA_UPLOAD_BATCH_SIZE", "8")))
+    batch = []
+
+    def flush():
+        with span("upload", pages=len(batch)) as phase:
+            phase.add("bytes_out", sum(len(files[1]) for _, files in batch))
+            uploaded = client.upload_files(extracted_folder, [files for _, files in batch], batch_size=len(batch))
+        for (source, _), path in zip(batch, uploaded):
+            source["image"] = path
+        for source, _ in batch:
+            if not source["image"]:
+                source["error"] = "upload returned no file path"
+        batch.clear()
     
-    api_host = os.environ.get("API_URL", "http://localhost:4000")
-    headers = {"Authorization": f"Bearer {auth_token}"}
-    
-    for i, img_bytes in enumerate(images_data):
-        safe_name = os.path.splitext(pdf_name)[0]
-        img_filename = f"{safe_name}_page_{i+1}.png"
-        
-        encoded_path = urllib.parse.quote(extracted_folder, safe='')
-        upload_url = f"{api_host.rstrip('/')}/api/uploads/upload/{encoded_path}"
-        
-        files = {'files': (img_filename, img_bytes, 'image/png')}
-        response = requests.post(upload_url, headers=headers, files=files)
-        response.raise_for_status()
-        
-        result = response.json()
-        if result.get('files'):
-            uploaded_paths.append(result['files'][0].get('path', ''))
-    
-    return uploaded_paths
+    for i, kind, payload in images_data:
+        if kind == "text":
+            page_sources.append({"page": i + 1, "text": payload})
+            continue
 
-def process_images(image_paths):
-    auth_token_val = os.getenv("GIA_API_TOKEN")
-    results = []
-    api_host = os.environ.get("API_URL", "http://localhost:4000")
-    tool_url = f"{api_host.rstrip('/')}/api/tools/execute-method"
+        if i + 1 in completed:
+            page_sources.append({"page": i + 1, "text": completed[i + 1]})
+            continue
+
+        cache_key = None
+        if cache is not None:
+            vision = get_vision_request()
+            cache_key = ocr_cache_key(payload, vision["prompt"], vision["config_name"])
+            cached_text = cache.get(cache_key)
+            if cached_text is not None:
+                page_sources.append({"page": i + 1, "text": cached_text})
+                continue
+
+        extension, content_type = image_type(payload)
+        img_filename = f"{safe_name}_page_{i+1}.{extension}"
+        source = {"page": i + 1, "image": None, "cache_key": cache_key}
+        page_sources.append(source)
+        batch.append((source, (img_filename, payload, content_type)))
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
     
-    headers = {
-        "Authorization": f"Bearer {auth_token_val}",
-        "Content-Type": "application/json"
-    }
+    return page_sources
 
-    for index, img_path in enumerate(image_paths):
-        print(f"Processing page {index + 1}: {img_path}")
-        payload = {
-            "config_name": "OpenAI Vision",
-            "method_name": "analyze_image_standalone",
-            "parameters": {
-                "file_path": img_path,
-                "prompt": "Analyze the image and transcribe the text if any. Do not add any conversational commentary."
-            }
+def process_images(client, page_sources, cache=None, checkpoint=None, document=None):
+    """OCR the page sources concurrently; returns the assembled text and the failed page numbers.
+
+    Vision calls go through the shared scheduler for the vision tool
+    (gia_runtime.scheduler), which adapts the number of concurrent calls to
+    the upstream quota and retries 429/503 responses and refused connections
+    within a per-page deadline (a call that may have run is not sent again). Each page result is written to the checkpoint as it
+    completes and failed pages to its retry set, so a re-executed task only
+    redoes those pages. A failed page keeps its place in the text as an
+    ``<!-- Error processing page N: ... -->`` marker, as in pdf_ocr.
+    """
+    vision = get_vision_request()
+    scheduler = get_scheduler(vision["config_name"])
+    # No transport-level retries: the scheduler has to see 429s to back off
+    vision_client = client.with_retries(0)
+    connect_timeout, read_timeout = client.timeout
+
+    def analyze(source, timeout):
+        print(f"Processing page {source['page']}: {source['image']}")
+        parameters = {
+            "file_path": source["image"],
+            "prompt": vision["prompt"]
         }
-        
-        try:
-            response = requests.post(tool_url, headers=headers, json=payload, timeout=120.0)
-            if response.ok:
-                result_json = response.json()
-                if result_json.get('success'):
-                    results.append(result_json.get('result', ''))
-                else:
-                    results.append(f"Error: {result_json.get('error')}")
-            else:
-                results.append(f"Error: HTTP {response.status_code}")
-                
-        except Exception as e:
-            results.append(f"Exception: {str(e)}")
-            
-    return "\n\n".join(results)
+        with span("vision", page=source["page"]) as phase:
+            response = check_response(vision_client.execute_method(
+                vision["config_name"], vision["method_name"], parameters,
+                timeout=(connect_timeout, min(read_timeout, timeout)),
+            ))
+            result_json = response.json()
+            if not result_json.get('success'):
+                raise RuntimeError(result_json.get('error') or "vision call failed")
+            text = result_json.get('result', '')
+            phase.add("bytes_in", len(text.encode("utf-8")))
+        if cache is not None and source.get("cache_key"):
+            cache.put(source["cache_key"], text)
+        if checkpoint is not None:
+            checkpoint.record(document, source["page"], text)
+        return text
+
+    # Born-digital pages already carry their text layer; only uploaded images need a vision call
+    pending = [source for source in page_sources if "text" not in source and "error" not in source]
+    with span("ocr", pages=len(pending)):
+        outcomes = dict(zip((source["page"] for source in pending), scheduler.map(in_context(analyze), pending)))
+
+    results = []
+    failed = []
+    for source in page_sources:
+        if "text" in source:
+            results.append(source["text"])
+            continue
+        if "error" in source:
+            text, error = None, source["error"]
+        else:
+            text, error = outcomes[source["page"]]
+        if error is not None:
+            print(f"OCR failed for page {source['page']}: {error}")
+            failed.append(source["page"])
+            if checkpoint is not None:
+                checkpoint.record_failure(document, source["page"], error)
+            results.append(f"<!-- Error processing page {source['page']}: {error} -->")
+            continue
+        results.append(text)
+
+    # Final assembly: all pages done, the checkpoint is no longer needed
+    if checkpoint is not None and not failed:
+        checkpoint.clear(document)
+
+    return "\n\n".join(results), failed
 
 # Main Execution
 if __name__ == "__main__":
+    # Phase and page spans go to GIA_TRACE_FILE; their summary becomes _metrics
+    _tracer = start_trace("dpr", task="ScriptTask_D09062")
     try:
+        from dotenv import load_dotenv
         load_dotenv()
         
         # Handle variable name mismatch (file_path vs pdf_file)
         pdf_file = dpr_file[0]["file_path"]
         print(pdf_file)
         
-        # 1. Convert PDF to images
-        raw_images, pdf_filename = convert_pdf(pdf_file)
-        
-        # 2. Upload images to MinIO
-        images_paths = upload_images_to_minio(raw_images, pdf_filename, pdf_file)
-        
-        # 3. Clean up memory
-        del raw_images
+        _client = get_client()
+        _encode_stats = {}
+        _cache = open_ocr_cache()
+        _checkpoint = open_checkpoint()
+        pdf_filename = os.path.basename(pdf_file)
+        print(f"Downloading PDF: {pdf_file}")
+        # The local copy is removed when this block ends, whether or not rendering started
+        with downloaded_pdf(_client, pdf_file) as _local_pdf:
+            # The content identifies the document across retries, even if the path is reused for a new upload
+            _document = content_key(_local_pdf, "dpr")
+            _completed = _checkpoint.completed(_document) if _checkpoint is not None else {}
+            if _completed:
+                print(f"Resuming from checkpoint: {len(_completed)} pages already done")
+
+            # 1. Convert PDF to a lazy stream of page images
+            raw_images = convert_pdf(_local_pdf, _encode_stats)
+
+            # 2. Upload images to MinIO in batches as they are rendered, skipping pages
+            # already done by a previous attempt or whose OCR result is already cached
+            images_paths = upload_images_to_minio(_client, raw_images, pdf_filename, pdf_file, _cache, _completed)
+
+            # 3. Clean up memory
+            raw_images.close()
+            del raw_images
+        del _local_pdf
+        _image_encoding_stats = summarise(_encode_stats)
+        print(f"Encoded {_image_encoding_stats.get('pages', 0)} page images, "
+              f"{_image_encoding_stats['bytes_saved']} bytes saved by compact encoding")
+        del _encode_stats
         
-        # 4. Process with AI Agent
-        pdf_read_results = process_images(images_paths)
+        # 4. Process scanned pages with AI Agent (born-digital pages use their text layer)
+        pdf_read_results, _ocr_retry_pages = process_images(_client, images_paths, _cache, _checkpoint, _document)
+        _vision_scheduler_stats = get_scheduler(get_vision_request()["config_name"]).stats()
+        if _cache is not None:
+            _ocr_cache_stats = _cache.stats()
+            _cache.close()
+        if _checkpoint is not None:
+            _checkpoint.close()
+        del _cache, _checkpoint, _completed, _document, _client
+        if _ocr_retry_pages:
+            # Fail the task: its retry resumes from the checkpoint and only redoes these pages
+            raise RuntimeError(f"OCR failed for pages {_ocr_retry_pages}; re-run the task to retry only these")
                
     except Exception as e:
         import traceback
         traceback.print_exc()
         # Re-raise exception so the task fails and we see the error in the workflow
         raise e
+    finally:
+        _metrics = _tracer.finish() if _tracer is not None else None
+        del _tracer
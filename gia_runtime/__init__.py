@@ -0,0 +1,5 @@
+"""Shared runtime helpers for GIA workflow script tasks.
+
+Script tasks import these modules directly (e.g. ``from gia_runtime.cache import
+open_ocr_cache``), so the repository root must be on the worker's PYTHONPATH.
+"""
@@ -0,0 +1,14 @@
+"""Offline tooling for the workflow BPMN files in this repository.
+
+- ``gia_runtime.bpmn.model``: parse a ``.bpmn`` file into an indexed process graph
+- ``gia_runtime.bpmn.compiled``: precompiled, indexed models (flow adjacency,
+  resolved script paths, service configuration, compiled conditions) cached
+  on disk by file hash
+- ``gia_runtime.bpmn.simulate``: run a process with stubbed tasks and simulated
+  latencies to benchmark end-to-end time (``python -m gia_runtime.bpmn.simulate``)
+- ``gia_runtime.bpmn.execute``: run a process locally with its real scripts,
+  stubbed service tasks and fixture-completed user tasks, recording a per-task
+  timeline (``python -m gia_runtime.bpmn.execute``)
+- ``gia_runtime.bpmn.analyze``: static critical-path analysis that finds tasks
+  chained without a data dependency (``python -m gia_runtime.bpmn.analyze``)
+"""
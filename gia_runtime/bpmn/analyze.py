@@ -0,0 +1,337 @@
+"""Static critical-path analysis: find tasks that are serialized without a data dependency.
+
+Each task's reads and writes are taken from the definition and its scripts:
+
+- script tasks: the ``Inputs:`` / ``Outputs:`` lists of the docstring of
+  ``scripts/<id>.py`` (or the file named in ``<script>``);
+- service tasks: ``{var}`` references in ``<parameter value="...">`` (and
+  values that are exactly the name of a variable written elsewhere in the
+  process) are read, the ``resultVariable`` (default ``response``) is written;
+- user and manual tasks write their form fields.
+
+User, manual, send/receive tasks, call activities, sub-processes, decision
+gateways with more than one outgoing flow, and script tasks without an
+``Inputs:``/``Outputs:`` docstring are barriers: a human decision or an
+external side effect orders everything around it, so they keep all their
+flow predecessors and successors. Every other task only depends on the flow
+predecessors it shares a variable with (read after write, write after read,
+write after write). Loops are analysed as a single pass with their back
+edges removed.
+
+From the resulting dependency graph the analysis reports the critical path,
+the sets of tasks that could start together but are currently chained, and,
+given per-task latencies (samples are reduced to their median), the current
+and achievable end-to-end latency::
+
+    python -m gia_runtime.bpmn.analyze .
+    python -m gia_runtime.bpmn.analyze tender_process --samples latencies.json
+
+``latencies.json`` maps task ids to a latency in seconds or a list of
+samples; ``--latency`` sets a task id or element type directly.
+"""
+
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import sys
+
+from gia_runtime.bpmn.model import local_name, parse_bpmn
+from gia_runtime.bpmn.simulate import latency_table, parse_latency
+
+_DECISIONS = {"exclusiveGateway", "inclusiveGateway", "eventBasedGateway", "complexGateway"}
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_]\w*)\}")
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+
+
+def _docstring_names(docstring, label):
+    match = re.search(rf"{label}:[ \t]*(.*?)(?:\||\n|Outputs:|$)", docstring, re.DOTALL)
+    if not match:
+        return None
+    names = set()
+    for item in match.group(1).split(","):
+        # "ocr_results (pipelined mode)" -> "ocr_results"
+        name = _IDENTIFIER.match(item.strip())
+        if name:
+            names.add(name.group(0))
+    return names
+
+
+def script_io(path):
+    """``(reads, writes)`` from a script's ``Inputs:``/``Outputs:`` docstring, or None."""
+    try:
+        with open(path, encoding="utf-8") as script_file:
+            docstring = ast.get_docstring(ast.parse(script_file.read())) or ""
+    except (OSError, SyntaxError, ValueError):
+        return None
+    reads = _docstring_names(docstring, "Inputs")
+    writes = _docstring_names(docstring, "Outputs")
+    if reads is None or writes is None:
+        return None
+    return reads, writes
+
+
+def _script_path(element, base_dir):
+    for child in element.node.iter():
+        if local_name(child.tag) == "script" and child.text and child.text.strip().endswith(".py"):
+            return os.path.join(base_dir, child.text.strip())
+    return os.path.join(base_dir, "scripts", f"{element.id}.py")
+
+
+def _service_io(element):
+    values = []
+    writes = set()
+    for child in element.node.iter():
+        tag = local_name(child.tag)
+        if tag == "parameter":
+            values.append(child.get("value") if child.get("value") is not None else (child.text or ""))
+        elif tag == "resultVariable" and child.get("name"):
+            writes.add(child.get("name"))
+    reads = {name for value in values for name in _PLACEHOLDER.findall(value)}
+    bare = {value.strip() for value in values if _IDENTIFIER.fullmatch(value.strip())}
+    return reads, writes or {"response"}, bare
+
+
+def _form_fields(element):
+    return {
+        child.get("id") for child in element.node.iter()
+        if local_name(child.tag) == "formField" and child.get("id")
+    }
+
+
+def _flow_dag(process):
+    """Flow successors with loop back edges removed, and a topological order."""
+    successors = {element_id: [] for element_id in process.elements}
+    state = {}
+    for start in process.start_events() or list(process.elements.values())[:1]:
+        if start.id in state:
+            continue
+        state[start.id] = "open"
+        stack = [(start.id, iter(process.outgoing(start.id)))]
+        while stack:
+            element_id, flows = stack[-1]
+            flow = next(flows, None)
+            if flow is None:
+                state[element_id] = "done"
+                stack.pop()
+                continue
+            target = flow.target
+            if target not in process.elements or state.get(target) == "open":
+                continue  # back edge of a loop
+            successors[element_id].append(target)
+            if target not in state:
+                state[target] = "open"
+                stack.append((target, iter(process.outgoing(target))))
+
+    indegree = {element_id: 0 for element_id in successors}
+    for targets in successors.values():
+        for target in targets:
+            indegree[target] += 1
+    order = []
+    ready = [element_id for element_id in process.elements if element_id in state and indegree[element_id] == 0]
+    while ready:
+        element_id = ready.pop(0)
+        order.append(element_id)
+        for target in successors[element_id]:
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                ready.append(target)
+    return successors, order
+
+
+def _longest_path(order, predecessors, weight):
+    finish = {}
+    best = {}
+    position = {node: index for index, node in enumerate(order)}
+    for node in order:
+        # On ties prefer the latest predecessor, so zero-latency steps stay on the path
+        previous = max(predecessors.get(node, ()), key=lambda p: (finish[p], position[p]), default=None)
+        finish[node] = weight(node) + (finish[previous] if previous is not None else 0.0)
+        best[node] = previous
+    if not finish:
+        return 0.0, []
+    end = max(finish, key=finish.get)
+    path = []
+    node = end
+    while node is not None:
+        path.append(node)
+        node = best[node]
+    return finish[end], path[::-1]
+
+
+def analyze_process(process, base_dir=None, latency_for=None):
+    """Analyse one process; see the module docstring. Returns a result dict."""
+    latency_for = latency_for or latency_table()
+    successors, order = _flow_dag(process)
+
+    flow_predecessors = {element_id: [] for element_id in order}
+    for element_id in order:
+        for target in successors[element_id]:
+            flow_predecessors[target].append(element_id)
+    ancestors = {}
+    for element_id in order:
+        found = set()
+        for parent in flow_predecessors[element_id]:
+            found.add(parent)
+            found |= ancestors[parent]
+        ancestors[element_id] = found
+
+    # Reads/writes per analysed node; None marks a barrier
+    io = {}
+    opaque = {}
+    bare_values = {}
+    for element_id in order:
+        element = process.elements[element_id]
+        if element.type == "scriptTask":
+            found = script_io(_script_path(element, base_dir)) if base_dir else None
+            io[element_id] = found
+            if found is None:
+                opaque[element_id] = "script without Inputs/Outputs docstring"
+        elif element.type in ("serviceTask", "businessRuleTask"):
+            reads, writes, bare_values[element_id] = _service_io(element)
+            io[element_id] = (reads, writes)
+        elif element.is_task:
+            io[element_id] = None
+            opaque[element_id] = element.type
+        elif element.type in _DECISIONS and len(element.outgoing) > 1:
+            io[element_id] = None
+            opaque[element_id] = "decision"
+
+    written = set()
+    for element_id, found in io.items():
+        if found is not None:
+            written |= found[1]
+        elif process.elements[element_id].type in ("userTask", "manualTask"):
+            written |= _form_fields(process.elements[element_id])
+    for element_id, values in bare_values.items():
+        io[element_id][0].update(values & written)
+
+    dependencies = {}
+    for element_id in order:
+        if element_id not in io:
+            continue
+        earlier = [node for node in ancestors[element_id] if node in io]
+        if io[element_id] is None:
+            dependencies[element_id] = set(earlier)
+            continue
+        reads, writes = io[element_id]
+        found = set()
+        for node in earlier:
+            if io[node] is None:
+                found.add(node)
+                continue
+            node_reads, node_writes = io[node]
+            if node_writes & reads or node_reads & writes or node_writes & writes:
+                found.add(node)
+        dependencies[element_id] = found
+
+    nodes = [element_id for element_id in order if element_id in io]
+
+    def weight(element_id):
+        return latency_for(process.elements[element_id])
+
+    current, current_path = _longest_path(order, flow_predecessors, weight)
+    critical, critical_path = _longest_path(nodes, dependencies, weight)
+
+    level = {}
+    for element_id in nodes:
+        level[element_id] = 1 + max((level[dep] for dep in dependencies[element_id]), default=-1)
+    by_level = {}
+    for element_id in nodes:
+        if io[element_id] is not None:
+            by_level.setdefault(level[element_id], []).append(element_id)
+    parallel_sets = []
+    for members in by_level.values():
+        chained = any(a in ancestors[b] for a in members for b in members if a != b)
+        if len(members) > 1 and chained:
+            parallel_sets.append(members)
+
+    return {
+        "process": process.id,
+        "current": current,
+        "current_path": [node for node in current_path if weight(node) or node in io],
+        "critical": critical,
+        "critical_path": critical_path,
+        "saving": current - critical,
+        "parallel_sets": parallel_sets,
+        "dependencies": {node: sorted(deps) for node, deps in dependencies.items()},
+        "barriers": opaque,
+    }
+
+
+def analyze_file(path, latency_for=None):
+    """Analyse every executable process in a ``.bpmn`` file."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [
+        analyze_process(process, base_dir, latency_for)
+        for process in parse_bpmn(path) if process.start_events()
+    ]
+
+
+def load_samples(path):
+    """Read ``{task_id: seconds | [samples]}`` and reduce samples to their median."""
+    with open(path, encoding="utf-8") as samples_file:
+        raw = json.load(samples_file)
+    return {
+        task_id: statistics.median(value) if isinstance(value, list) else float(value)
+        for task_id, value in raw.items() if value not in (None, [])
+    }
+
+
+def _bpmn_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for name in sorted(files):
+                    if name.endswith(".bpmn"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _report(path, result, out):
+    out.write(f"{path} ({result['process']})\n")
+    out.write(f"  current  {result['current']:8.1f}s  {' -> '.join(result['current_path'])}\n")
+    out.write(f"  critical {result['critical']:8.1f}s  {' -> '.join(result['critical_path'])}\n")
+    if result["current"]:
+        share = 100 * result["saving"] / result["current"]
+        out.write(f"  saving   {result['saving']:8.1f}s  ({share:.0f}%)\n")
+    for members in result["parallel_sets"]:
+        out.write(f"  parallel: {', '.join(members)}\n")
+    if not result["parallel_sets"]:
+        out.write("  parallel: none\n")
+    out.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help=".bpmn files or directories to scan")
+    parser.add_argument("--samples", help="JSON file of per-task latencies or latency samples (seconds)")
+    parser.add_argument("--latency", action="append", type=parse_latency, default=[], metavar="ID_OR_TYPE=SECONDS",
+                        help="latency for a task id or element type (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    overrides = load_samples(args.samples) if args.samples else {}
+    overrides.update(dict(args.latency))
+    latency_for = latency_table(overrides)
+
+    results = {}
+    for path in _bpmn_files(args.paths):
+        try:
+            results[path] = analyze_file(path, latency_for)
+        except Exception as e:
+            print(f"{path}: {e}", file=sys.stderr)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for path, processes in results.items():
+        for result in processes:
+            _report(path, result, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
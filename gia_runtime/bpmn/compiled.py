@@ -0,0 +1,320 @@
+"""Precompiled, indexed BPMN models cached by file hash.
+
+Starting an instance used to mean parsing the definition XML and walking the
+element tree to resolve flows, gateways, script paths and service
+configuration; every gateway evaluation compiled its condition again.
+``load_model`` does that work once per definition:
+
+- elements are numbered and sequence flows become adjacency tuples
+  (``outgoing[i]`` / ``incoming[i]`` hold flow indices);
+- ``scripts/<id>.py`` paths (or the file named in ``<script>``) are resolved;
+- service tasks keep module, function, parameters, the ``{var}`` names the
+  parameters reference, the result variable and their ``<memoize ttl>``
+  opt-in (see ``gia_runtime.memo``);
+- user tasks keep their form fields (with ``defaultValue``);
+- ``conditionExpression``s are compiled to code objects (a ``${...}``
+  wrapper is unwrapped first).
+
+The compiled model is marshalled (code objects included) to
+``BPMN_CACHE_DIR/<sha256 of the file>.bpmnc``, stamped with the interpreter's
+bytecode magic, so another worker or a restarted one loads it without XML
+parsing or ``compile()``. Within a process, models are additionally kept in
+memory keyed by path, modification time and size. The cache holds code, so
+it lives in a directory private to the worker's user (``BPMN_CACHE_DIR``,
+default ``<tmp>/gia_bpmn_cache-<uid>``, mode 0700) and ``read_marshalled``
+ignores files that user does not own or others can write. ``BPMN_CACHE=0``
+disables the disk cache.
+
+``python -m gia_runtime.bpmn.compiled FILE...`` compares parse, disk and
+memory load times.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+
+from gia_runtime.bpmn.model import BPMN_NS, local_name, parse_bpmn
+from gia_runtime.cache import private_dir
+from gia_runtime.script_cache import read_marshalled, write_marshalled
+
+# Bump when the marshalled layout changes
+FORMAT = 3
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_]\w*)\}")
+# "${expression}" (JUEL-style wrapping used by some definitions) -> "expression"
+_WRAPPED_EXPRESSION = re.compile(r"^\$\{(.*)\}$", re.DOTALL)
+
+_memory = {}
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "disk_hits": 0, "compiled": 0}
+
+
+class ConditionError(ValueError):
+    """A gateway condition failed to compile or cannot select a flow."""
+
+
+class CompiledModel:
+    """One process of a compiled definition.
+
+    Elements and flows are addressed by index; ``index[element_id]`` maps an
+    id to its element index and ``flow_index[flow_id]`` a flow id to its flow.
+    """
+
+    def __init__(self, data, base_dir):
+        self.id = data["id"]
+        self.name = data["name"]
+        self.digest = data["digest"]
+        self.ids = data["ids"]
+        self.types = data["types"]
+        self.names = data["names"]
+        self.outgoing = data["outgoing"]
+        self.incoming = data["incoming"]
+        self.start = data["start"]
+        self.defaults = data["defaults"]
+        self.flow_ids = data["flow_ids"]
+        self.flow_source = data["flow_source"]
+        self.flow_target = data["flow_target"]
+        self.conditions = data["conditions"]
+        self.condition_text = data["condition_text"]
+        self.condition_errors = data["condition_errors"]
+        self.services = data["services"]
+        self.forms = data["forms"]
+        self.scripts = {
+            element_id: os.path.normpath(os.path.join(base_dir, path))
+            for element_id, path in data["scripts"].items()
+        }
+        self.index = {element_id: i for i, element_id in enumerate(self.ids)}
+        self.flow_index = {flow_id: i for i, flow_id in enumerate(self.flow_ids)}
+
+    def successors(self, element_id):
+        """Target element ids of an element's outgoing flows."""
+        return [self.ids[self.flow_target[f]] for f in self.outgoing[self.index[element_id]]]
+
+    def evaluate(self, flow, variables):
+        """Evaluate flow ``flow`` (index) against ``variables``; unconditional flows are true."""
+        code = self.conditions[flow]
+        if code is None:
+            if flow in self.condition_errors:
+                raise ConditionError(self.condition_errors[flow])
+            return True
+        return bool(eval(code, {}, variables))
+
+    def next_flows(self, element_id, variables):
+        """Indices of the flows a token leaving ``element_id`` takes.
+
+        Exclusive gateways take their first true flow, else the default;
+        inclusive gateways take every true flow, else the default; other
+        elements take every flow whose condition (if any) holds.
+        """
+        element = self.index[element_id]
+        flows = self.outgoing[element]
+        default = self.defaults.get(element)
+        candidates = [flow for flow in flows if flow != default]
+        if self.types[element] == "exclusiveGateway":
+            for flow in candidates:
+                if self.evaluate(flow, variables):
+                    return [flow]
+            taken = []
+        else:
+            taken = [flow for flow in candidates if self.evaluate(flow, variables)]
+        if not taken and default is not None:
+            return [default]
+        if not taken and flows and self.types[element].endswith("Gateway"):
+            raise ConditionError(f"No outgoing flow of {element_id!r} matches")
+        return taken
+
+
+def _compile_process(process, source_name, digest):
+    ids = list(process.elements)
+    index = {element_id: i for i, element_id in enumerate(ids)}
+    flow_ids = [flow_id for flow_id, flow in process.flows.items()
+                if flow.source in index and flow.target in index]
+    flow_index = {flow_id: i for i, flow_id in enumerate(flow_ids)}
+
+    conditions, condition_text, condition_errors = [], [], {}
+    for i, flow_id in enumerate(flow_ids):
+        text = process.flows[flow_id].condition
+        code = None
+        if text:
+            wrapped = _WRAPPED_EXPRESSION.match(text)
+            try:
+                code = compile(wrapped.group(1).strip() if wrapped else text, f"{source_name}#{flow_id}", "eval")
+            except SyntaxError as e:
+                condition_errors[i] = f"Invalid condition on flow {flow_id!r}: {e.msg}"
+        conditions.append(code)
+        condition_text.append(text)
+
+    scripts, services, forms, defaults = {}, {}, {}, {}
+    for element_id, element in process.elements.items():
+        default = element.node.get("default")
+        if default in flow_index:
+            defaults[index[element_id]] = flow_index[default]
+        if element.type == "scriptTask":
+            script = element.node.find(f"{{{BPMN_NS}}}script")
+            path = script.text.strip() if script is not None and script.text else ""
+            scripts[element_id] = path if path.endswith(".py") else f"scripts/{element_id}.py"
+        elif element.type == "serviceTask":
+            service = {"module": None, "function": None, "parameters": {}, "placeholders": [],
+                       "result_variable": "response", "memoize": None}
+            for child in element.node.iter():
+                tag = local_name(child.tag)
+                if tag == "moduleName":
+                    service["module"] = (child.text or "").strip()
+                elif tag == "functionName":
+                    service["function"] = (child.text or "").strip()
+                elif tag == "parameter" and child.get("name"):
+                    value = child.get("value") if child.get("value") is not None else (child.text or "")
+                    service["parameters"][child.get("name")] = value
+                    for name in _PLACEHOLDER.findall(value):
+                        if name not in service["placeholders"]:
+                            service["placeholders"].append(name)
+                elif tag == "resultVariable" and child.get("name"):
+                    service["result_variable"] = child.get("name")
+                elif tag == "memoize":
+                    ttl = child.get("ttl")
+                    service["memoize"] = {"ttl": float(ttl) if ttl else None}
+            services[element_id] = service
+        elif element.type == "userTask":
+            forms[element_id] = [
+                {
+                    "id": child.get("id"),
+                    "label": child.get("label"),
+                    "type": child.get("type"),
+                    "required": child.get("required") == "true",
+                    "default": child.get("defaultValue"),
+                }
+                for child in element.node.iter()
+                if local_name(child.tag) == "formField" and child.get("id")
+            ]
+
+    return {
+        "id": process.id,
+        "name": process.name,
+        "digest": digest,
+        "ids": tuple(ids),
+        "types": tuple(process.elements[element_id].type for element_id in ids),
+        "names": tuple(process.elements[element_id].name for element_id in ids),
+        "outgoing": tuple(tuple(flow_index[f] for f in process.elements[e].outgoing if f in flow_index) for e in ids),
+        "incoming": tuple(tuple(flow_index[f] for f in process.elements[e].incoming if f in flow_index) for e in ids),
+        "start": tuple(index[element.id] for element in process.start_events()),
+        "defaults": defaults,
+        "flow_ids": tuple(flow_ids),
+        "flow_source": tuple(index[process.flows[f].source] for f in flow_ids),
+        "flow_target": tuple(index[process.flows[f].target] for f in flow_ids),
+        "conditions": tuple(conditions),
+        "condition_text": tuple(condition_text),
+        "condition_errors": condition_errors,
+        "scripts": scripts,
+        "services": services,
+        "forms": forms,
+    }
+
+
+def compile_definition(data, source_name="<bpmn>"):
+    """Compile BPMN XML bytes into marshal-able process dicts."""
+    digest = hashlib.sha256(data).hexdigest()
+    text = data.decode("utf-8")
+    processes = [_compile_process(process, source_name, digest) for process in parse_bpmn(text)]
+    return {"format": FORMAT, "digest": digest, "processes": processes}
+
+
+def _cache_dir():
+    if os.environ.get("BPMN_CACHE", "1").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        return private_dir("gia_bpmn_cache", os.environ.get("BPMN_CACHE_DIR") or None)
+    except OSError:
+        return None
+
+
+def _read_cache(path):
+    compiled = read_marshalled(path)
+    if not isinstance(compiled, dict) or compiled.get("format") != FORMAT:
+        return None
+    return compiled
+
+
+def load_models(path):
+    """Return ``{process_id: CompiledModel}`` for a ``.bpmn`` file, compiling at most once per content."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _memory.get(path)
+        if cached is not None and cached[0] == signature:
+            _stats["memory_hits"] += 1
+            return cached[1]
+
+    with open(path, "rb") as bpmn_file:
+        data = bpmn_file.read()
+    digest = hashlib.sha256(data).hexdigest()
+    cache_dir = _cache_dir()
+    cache_path = os.path.join(cache_dir, f"{digest}.bpmnc") if cache_dir else None
+    compiled = _read_cache(cache_path) if cache_path else None
+    if compiled is not None and compiled.get("digest") == digest:
+        counter = "disk_hits"
+    else:
+        compiled = compile_definition(data, path)
+        counter = "compiled"
+        if cache_path:
+            write_marshalled(cache_path, compiled)
+
+    base_dir = os.path.dirname(path)
+    models = {process["id"]: CompiledModel(process, base_dir) for process in compiled["processes"]}
+    with _lock:
+        _stats[counter] += 1
+        _memory[path] = (signature, models)
+    return models
+
+
+def load_model(path, process_id=None):
+    """Return one compiled process: ``process_id``, or the first with a start event."""
+    models = load_models(path)
+    if process_id is not None:
+        return models[process_id]
+    for model in models.values():
+        if model.start:
+            return model
+    raise ValueError(f"No process with a start event in {path}")
+
+
+def stats():
+    """Counts of in-memory hits, disk cache hits and compilations in this process."""
+    with _lock:
+        return dict(_stats)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare BPMN parse time with compiled-model cache loads.")
+    parser.add_argument("paths", nargs="+", help=".bpmn files")
+    parser.add_argument("--repeat", type=int, default=200, help="loads per measurement")
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        with open(path, "rb") as bpmn_file:
+            data = bpmn_file.read()
+
+        def timed(func):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                func()
+            return (time.perf_counter() - started) / args.repeat * 1000
+
+        def load_from_disk():
+            _memory.pop(os.path.abspath(path), None)
+            load_models(path)
+
+        load_models(path)
+        parse_ms = timed(lambda: compile_definition(data, path))
+        disk_ms = timed(load_from_disk)
+        memory_ms = timed(lambda: load_models(path))
+        print(f"{path}: {len(data) / 1024:.1f} KB, parse+compile {parse_ms:.3f} ms, "
+              f"disk cache {disk_ms:.3f} ms, memory {memory_ms:.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Execute a workflow locally, with stubbed service tasks, and record a timeline.
+
+Runs a process the way the engine does, following the execution contract in
+the README, so workflows can be profiled and regression-tested without the
+GIA platform:
+
+- script tasks run ``scripts/<id>.py`` (see ``gia_runtime.script_cache``)
+  with the workflow variables injected as globals; the top-level variables
+  a script leaves behind (not modules, functions or classes) are written
+  back to the context, names it deleted are removed, ``_``-prefixed ones
+  are kept but not listed as visible, and an ``error`` variable marks the
+  task as failed in the timeline without stopping the run;
+- service tasks resolve ``{var}`` parameters against the variables (and
+  parameters that are just a variable's name, such as the physician
+  workflows' ``prompt="analysis_prompt"``, with a warning) and are
+  dispatched to a stub per module (``Whisper``, ``Agent Call``, ``AI
+  Agent``, the tender agents, ...) after its latency; the result goes to the
+  ``resultVariable`` (default ``response``);
+- user tasks are completed from fixture values, falling back to the current
+  variable and the field's ``defaultValue``;
+- gateway conditions are evaluated against the variables
+  (``CompiledModel.next_flows``); a parallel gateway starts all of its
+  branches concurrently and joins by waiting for a token on each incoming
+  flow;
+- with a claim-check store (``--claim-check``, see ``gia_runtime.claimcheck``)
+  the context holds large values as references: each task gets its
+  variables through ``ClaimCheckStore.load`` and its updates are saved
+  through ``ClaimCheckStore.offload``, as the engine would.
+
+The fixture is a JSON file::
+
+    {
+      "variables": {"user": {"token": "local"}},
+      "user_tasks": {"validate_ocr": [{"validation_status": "Rejected"}, {"validation_status": "Approved"}]},
+      "services": {"AI Agent": {"latency": 20}, "analyze_agent": {"result": "Dr. Priya"}},
+      "scripts": {"convert_pdf_to_images": {"outputs": {"images_data": []}, "latency": 3}}
+    }
+
+Every shipped workflow has a sample fixture, ``fixture.json`` next to its
+``.bpmn`` file, that runs it to an end event; it is used when ``--fixture``
+is not given. A list of user-task values is used one per visit (the last
+one repeats).
+``services`` entries are keyed by task id or module and set a fixed
+``result`` and/or a ``latency`` in seconds; ``scripts`` entries replace a
+script that needs the platform by fixed ``outputs``. ``--scale`` multiplies
+stub latencies. Every run returns (and ``--timeline`` writes) one
+``{"id", "type", "visit", "start", "end", "seconds", "status"}`` entry per
+executed element::
+
+    python -m gia_runtime.bpmn.execute product_intelligence/product_intelligence_workflow.bpmn \\
+        --scale 0.01 --timeline run.json
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from gia_runtime.bpmn.compiled import load_model
+from gia_runtime.bpmn.simulate import DEFAULT_LATENCY
+from gia_runtime.script_cache import run_script
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_]\w*)\}")
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+_INTERNAL_TYPES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, type)
+
+DEFAULT_MAX_VISITS = 100
+
+
+class ExecutionError(RuntimeError):
+    """A task failed, or the run could not continue."""
+
+
+class StandInService:
+    """Default stub for a service module: returns a short text naming the call.
+
+    Any callable ``stub(function, parameters)`` can replace it.
+    """
+
+    def __init__(self, module):
+        self.module = module
+
+    def __call__(self, function, parameters):
+        text = next((str(value) for key, value in parameters.items()
+                     if key in ("prompt", "file_path", "query", "message") and value), "")
+        return f"[{self.module}.{function}] {text[:200]}".rstrip()
+
+
+def bare_references(parameters, variables):
+    """``{parameter: variable}`` for parameters whose whole value is a variable's name without braces."""
+    return {
+        name: value.strip() for name, value in parameters.items()
+        if _IDENTIFIER.fullmatch(value.strip()) and value.strip() in variables
+    }
+
+
+def resolve_parameters(parameters, variables):
+    """Substitute ``{var}`` references; a value that is exactly ``{var}`` keeps the variable's type.
+
+    A value that is only a variable's name (see ``bare_references``) is
+    resolved as if it were ``{name}``.
+    """
+    resolved = {}
+    bare = bare_references(parameters, variables)
+    for name, value in parameters.items():
+        whole = _PLACEHOLDER.fullmatch(value.strip())
+        if whole and whole.group(1) in variables:
+            resolved[name] = variables[whole.group(1)]
+            continue
+        if name in bare:
+            resolved[name] = variables[bare[name]]
+            continue
+        resolved[name] = _PLACEHOLDER.sub(
+            lambda match: str(variables[match.group(1)]) if match.group(1) in variables else match.group(0), value
+        )
+    return resolved
+
+
+def _script_variables(namespace):
+    """The workflow variables a script's namespace holds after it ran."""
+    return {
+        name: value for name, value in namespace.items()
+        if not name.startswith("__") and not isinstance(value, _INTERNAL_TYPES)
+    }
+
+
+class Executor:
+    """Runs one process of a definition against stubs and fixtures.
+
+    ``stubs`` maps a service module to ``stub(function, parameters)``
+    (unlisted modules get a ``StandInService``); ``fixture`` is the parsed
+    fixture JSON; ``memo`` is an optional ``gia_runtime.memo.ServiceMemo``
+    that opted-in service tasks go through and ``claims`` an optional
+    ``gia_runtime.claimcheck.ClaimCheckStore`` for the context.
+    """
+
+    def __init__(self, model, stubs=None, fixture=None, scale=1.0, memo=None, max_visits=DEFAULT_MAX_VISITS,
+                 max_workers=32, claims=None):
+        self.model = model
+        self.claims = claims
+        self.stubs = dict(stubs or {})
+        self.fixture = fixture or {}
+        self.scale = scale
+        self.memo = memo
+        self.max_visits = max_visits
+        self.max_workers = max_workers
+        self._warned = set()
+
+    def _settings(self, section, element_id, module=None):
+        entries = self.fixture.get(section) or {}
+        return entries.get(element_id) or (entries.get(module) if module else None) or {}
+
+    def _sleep(self, seconds):
+        if seconds:
+            time.sleep(seconds * self.scale)
+
+    def _load(self, variables):
+        """The variables a task reads: claim-check references load on first read."""
+        return self.claims.load(variables) if self.claims is not None else variables
+
+    def _run_script(self, element_id, variables):
+        stub = self._settings("scripts", element_id)
+        if "outputs" in stub:
+            self._sleep(stub.get("latency", 0))
+            return dict(stub["outputs"]), ()
+        path = self.model.scripts[element_id]
+        namespace = self.claims.load(variables) if self.claims is not None else dict(variables)
+        namespace["__name__"] = "__main__"
+        run_script(path, namespace)
+        outputs = _script_variables(namespace)
+        if self.claims is not None:
+            # Values read but not replaced come back as the reference they were loaded from
+            outputs = self.claims.offload(namespace, list(outputs))
+        # Only what the script set, so concurrent branches do not overwrite each other with stale inputs
+        updates = {name: value for name, value in outputs.items()
+                   if name not in variables or variables[name] is not value}
+        return updates, [name for name in variables if name not in namespace]
+
+    def _run_service(self, element_id, variables):
+        service = self.model.services[element_id]
+        module, function = service["module"], service["function"]
+        settings = self._settings("services", element_id, module)
+        for parameter, name in bare_references(service["parameters"], variables).items():
+            if (element_id, parameter) not in self._warned:
+                self._warned.add((element_id, parameter))
+                print(f"Warning: {element_id} parameter {parameter!r} names variable {name!r} without "
+                      f"braces; resolved as {{{name}}}, write it as {{{name}}} in the definition")
+        parameters = resolve_parameters(service["parameters"], variables)
+
+        def invoke():
+            self._sleep(settings.get("latency", DEFAULT_LATENCY["serviceTask"]))
+            if "result" in settings:
+                return settings["result"]
+            stub = self.stubs.get(module) or StandInService(module)
+            return stub(function, parameters)
+
+        if self.memo is not None:
+            result = self.memo.call_service(service, parameters, invoke)
+        else:
+            result = invoke()
+        return {service["result_variable"]: result}, ()
+
+    def _complete_user_task(self, element_id, variables, visit):
+        values = (self.fixture.get("user_tasks") or {}).get(element_id, {})
+        if isinstance(values, list):
+            values = values[min(visit, len(values) - 1)] if values else {}
+        updates = dict(values)
+        for field in self.model.forms.get(element_id, ()):
+            name = field["id"]
+            if name in updates:
+                continue
+            if name in variables:
+                updates[name] = variables[name]
+            elif field.get("default") is not None:
+                updates[name] = field["default"]
+            elif field["required"]:
+                raise ExecutionError(f"No fixture value for required field {name!r} of user task {element_id!r}")
+            else:
+                updates[name] = None
+        return updates, ()
+
+    def run(self, variables=None):
+        """Run the process to completion and return the result dict.
+
+        ``status`` is "completed" when an end event was reached, "failed"
+        when a task raised (``error`` holds the message) and "incomplete"
+        when every token stopped before an end event. ``variables`` holds the
+        final context and ``visible`` the names shown in the UI.
+        """
+        model = self.model
+        context = dict(self.fixture.get("variables") or {})
+        context.update(variables or {})
+        lock = threading.Lock()
+        arrived = {}
+        visits = {}
+        timeline = []
+        pending = []
+        state = {"failed": None, "ended": False}
+        started = time.perf_counter()
+
+        def execute(element_id, visit):
+            element_type = model.types[model.index[element_id]]
+            with lock:
+                snapshot = dict(context)
+            if element_type == "scriptTask":
+                updates, removed = self._run_script(element_id, snapshot)
+            elif element_type == "serviceTask":
+                updates, removed = self._run_service(element_id, self._load(snapshot))
+            elif element_type in ("userTask", "manualTask"):
+                updates, removed = self._complete_user_task(element_id, self._load(snapshot), visit)
+            else:
+                return {}, ()
+            if self.claims is not None:
+                updates = self.claims.offload(updates)
+            return updates, removed
+
+        def run(element_id):
+            element = model.index[element_id]
+            element_type = model.types[element]
+            with lock:
+                if state["failed"] is not None:
+                    return
+                visit = visits.get(element_id, 0)
+                visits[element_id] = visit + 1
+            begin = time.perf_counter()
+            status, message, flows = "completed", None, []
+            try:
+                if visit >= self.max_visits:
+                    raise ExecutionError(f"{element_id!r} visited {self.max_visits} times; stopping the loop")
+                updates, removed = execute(element_id, visit)
+                with lock:
+                    context.update(updates)
+                    for name in removed:
+                        context.pop(name, None)
+                    snapshot = dict(context)
+                if element_type == "scriptTask" and updates.get("error"):
+                    status, message = "error", str(updates["error"])
+                if element_type == "endEvent":
+                    state["ended"] = True
+                flows = model.next_flows(element_id, self._load(snapshot))
+            except Exception as e:
+                status, message = "failed", f"{type(e).__name__}: {e}"
+                with lock:
+                    if state["failed"] is None:
+                        state["failed"] = f"{element_id}: {message}"
+            end = time.perf_counter()
+            entry = {
+                "id": element_id,
+                "type": element_type,
+                "name": model.names[element],
+                "visit": visit + 1,
+                "start": begin - started,
+                "end": end - started,
+                "seconds": end - begin,
+                "status": status,
+            }
+            if message:
+                entry["error"] = message
+            with lock:
+                timeline.append(entry)
+            for flow in flows:
+                arrive(flow)
+
+        def arrive(flow):
+            target = model.flow_target[flow]
+            target_id = model.ids[target]
+            incoming = model.incoming[target]
+            if model.types[target] == "parallelGateway" and len(incoming) > 1:
+                with lock:
+                    tokens = arrived.setdefault(target_id, set())
+                    tokens.add(flow)
+                    if len(tokens) < len(incoming):
+                        return
+                    del arrived[target_id]
+            with lock:
+                pending.append(executor.submit(run, target_id))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with lock:
+                for start in model.start:
+                    pending.append(executor.submit(run, model.ids[start]))
+            # Futures are appended while earlier ones run; drain until none are left
+            index = 0
+            while True:
+                with lock:
+                    if index >= len(pending):
+                        break
+                    future = pending[index]
+                future.result()
+                index += 1
+
+        timeline.sort(key=lambda entry: (entry["start"], entry["id"]))
+        status = "failed" if state["failed"] else "completed" if state["ended"] else "incomplete"
+        elapsed = time.perf_counter() - started
+        result = {
+            "status": status,
+            "error": state["failed"],
+            "elapsed": elapsed,
+            "variables": dict(self.claims.load(context).materialise_all()) if self.claims is not None else context,
+            "visible": sorted(name for name in context if not name.startswith("_")),
+            "timeline": timeline,
+        }
+        if self.claims is not None:
+            result["claim_check"] = self.claims.stats()
+        return result
+
+
+def sample_fixture(path):
+    """The path of the sample fixture shipped next to the ``.bpmn`` file ``path``, or None."""
+    candidate = os.path.join(os.path.dirname(os.path.abspath(path)), "fixture.json")
+    return candidate if os.path.isfile(candidate) else None
+
+
+def load_fixture(path):
+    """Parse the JSON fixture at ``path``."""
+    with open(path, "r", encoding="utf-8") as fixture_file:
+        return json.load(fixture_file)
+
+
+def execute(path, fixture=None, stubs=None, process_id=None, scale=1.0, memo=None, variables=None, claims=None):
+    """Load the process in ``path`` and run it once (see ``Executor.run``)."""
+    return Executor(load_model(path, process_id), stubs, fixture, scale, memo, claims=claims).run(variables)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("bpmn", help="path to a .bpmn file")
+    parser.add_argument("--process", help="process id (default: first with a start event)")
+    parser.add_argument("--fixture", help="JSON fixture: variables, user_tasks, services, scripts "
+                                          "(default: fixture.json next to the .bpmn file)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply stub latencies by this factor (e.g. 0.01)")
+    parser.add_argument("--memo", action="store_true", help="run opted-in service tasks through gia_runtime.memo")
+    parser.add_argument("--claim-check", action="store_true",
+                        help="keep large variables in the context as gia_runtime.claimcheck references")
+    parser.add_argument("--timeline", help="write the run (status, timeline, visible variables) to this JSON file")
+    args = parser.parse_args(argv)
+
+    fixture = None
+    fixture_path = args.fixture or sample_fixture(args.bpmn)
+    if fixture_path:
+        fixture = load_fixture(fixture_path)
+        if not args.fixture:
+            print(f"Using sample fixture {fixture_path}")
+    memo = None
+    if args.memo:
+        from gia_runtime.memo import open_service_memo
+
+        memo = open_service_memo()
+
+    claims = None
+    if args.claim_check:
+        from gia_runtime.claimcheck import open_claim_check
+
+        claims = open_claim_check()
+
+    result = execute(args.bpmn, fixture, process_id=args.process, scale=args.scale, memo=memo, claims=claims)
+    for entry in result["timeline"]:
+        note = f"  {entry['error']}" if entry.get("error") else ""
+        print(f"{entry['start']:9.3f} {entry['end']:9.3f}  {entry['status']:<9} {entry['id']} #{entry['visit']}{note}")
+    print(f"{result['status']} in {result['elapsed']:.3f}s" + (f": {result['error']}" if result["error"] else ""))
+    for name in result["visible"]:
+        print(f"  {name} = {str(result['variables'][name])[:100]!r}")
+    if result.get("claim_check"):
+        print(f"claim check: {json.dumps(result['claim_check'])}")
+    if args.timeline:
+        report = {key: result[key] for key in ("status", "error", "elapsed", "timeline", "visible")}
+        report["variables"] = {name: result["variables"][name] for name in result["visible"]}
+        with open(args.timeline, "w", encoding="utf-8") as timeline_file:
+            json.dump(report, timeline_file, indent=2, default=repr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Parse BPMN 2.0 XML into an indexed process graph.
+
+Only the structure needed by the offline tools is kept: flow nodes with their
+type, name and XML element, and sequence flows with their condition. Incoming
+and outgoing flows are derived from ``sourceRef``/``targetRef`` rather than
+from ``<incoming>``/``<outgoing>`` tags, which several workflows nest inside
+``extensionElements`` or omit entirely.
+"""
+
+import xml.etree.ElementTree as ET
+
+BPMN_NS = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+
+# Process children that are not flow nodes
+_NON_NODES = {"sequenceFlow", "laneSet", "documentation", "extensionElements", "textAnnotation", "association",
+              "dataObject", "dataObjectReference", "dataStoreReference", "ioSpecification", "property"}
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+class Element:
+    """A flow node: event, task, gateway, sub-process or call activity."""
+
+    def __init__(self, element_id, element_type, name, node):
+        self.id = element_id
+        self.type = element_type
+        self.name = name
+        self.node = node
+        self.incoming = []
+        self.outgoing = []
+
+    @property
+    def is_task(self):
+        return self.type.endswith("Task") or self.type in ("task", "callActivity", "subProcess")
+
+    def __repr__(self):
+        return f"<{self.type} {self.id}>"
+
+
+class Flow:
+    """A sequence flow, with its condition expression text if any."""
+
+    def __init__(self, flow_id, source, target, condition=None, name=None):
+        self.id = flow_id
+        self.source = source
+        self.target = target
+        self.condition = condition
+        self.name = name
+
+    def __repr__(self):
+        return f"<flow {self.source} -> {self.target}>"
+
+
+class Process:
+    """One ``<process>`` with its elements and flows indexed by id."""
+
+    def __init__(self, process_id, name=None):
+        self.id = process_id
+        self.name = name
+        self.elements = {}
+        self.flows = {}
+
+    def start_events(self):
+        return [element for element in self.elements.values() if element.type == "startEvent"]
+
+    def outgoing(self, element_id):
+        return [self.flows[flow_id] for flow_id in self.elements[element_id].outgoing]
+
+    def incoming(self, element_id):
+        return [self.flows[flow_id] for flow_id in self.elements[element_id].incoming]
+
+    def default_flow(self, element_id):
+        """The gateway's default flow id (``default`` attribute), or None."""
+        return self.elements[element_id].node.get("default")
+
+
+def _parse_process(node):
+    process = Process(node.get("id"), node.get("name"))
+    for child in node:
+        element_type = local_name(child.tag)
+        if element_type in _NON_NODES or not child.get("id"):
+            continue
+        process.elements[child.get("id")] = Element(child.get("id"), element_type, child.get("name"), child)
+
+    for index, child in enumerate(node.iter(f"{{{BPMN_NS}}}sequenceFlow")):
+        source, target = child.get("sourceRef"), child.get("targetRef")
+        flow_id = child.get("id") or f"{source}->{target}#{index}"
+        condition_node = child.find(f"{{{BPMN_NS}}}conditionExpression")
+        condition = condition_node.text.strip() if condition_node is not None and condition_node.text else None
+        process.flows[flow_id] = Flow(flow_id, source, target, condition, child.get("name"))
+        if source in process.elements:
+            process.elements[source].outgoing.append(flow_id)
+        if target in process.elements:
+            process.elements[target].incoming.append(flow_id)
+    return process
+
+
+def parse_bpmn(source):
+    """Parse a BPMN file path (or XML text) and return its processes."""
+    if isinstance(source, str) and source.lstrip().startswith("<"):
+        root = ET.fromstring(source)
+    else:
+        root = ET.parse(source).getroot()
+    return [_parse_process(node) for node in root.iter(f"{{{BPMN_NS}}}process")]
+
+
+def load_process(source, process_id=None):
+    """Return the process ``process_id``, or the first executable process in the file."""
+    processes = parse_bpmn(source)
+    if process_id is not None:
+        for process in processes:
+            if process.id == process_id:
+                return process
+        raise KeyError(f"No process {process_id!r}")
+    for process in processes:
+        if process.start_events():
+            return process
+    raise ValueError("No process with a start event")
@@ -0,0 +1,153 @@
+"""Run a BPMN process with stubbed tasks to measure its end-to-end latency.
+
+Every task is replaced by a sleep of its simulated latency; gateways and
+events take no time. Tokens follow the BPMN semantics the engine implements:
+
+- a parallel gateway with several outgoing flows starts all of them at once,
+  and one with several incoming flows waits for a token on each of them;
+- an exclusive gateway takes its default flow (else its first flow), since no
+  workflow variables exist to evaluate conditions against;
+- an inclusive gateway takes every outgoing flow;
+- any other element with several outgoing flows starts all of them.
+
+The result compares the measured wall time with the sum of all task
+latencies, i.e. the time the same tasks would take run one after another::
+
+    python -m gia_runtime.bpmn.simulate product_intelligence/product_intelligence_workflow.bpmn \\
+        --latency serviceTask=20 --latency competitor_analysis=45 --scale 0.01
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gia_runtime.bpmn.model import load_process
+
+DEFAULT_LATENCY = {"serviceTask": 1.0, "scriptTask": 0.1, "userTask": 0.0, "manualTask": 0.0}
+
+
+def latency_table(overrides=None):
+    """Build ``latency_for(element)`` from ``{element_id or element_type: seconds}``."""
+    table = dict(DEFAULT_LATENCY)
+    table.update(overrides or {})
+
+    def latency_for(element):
+        if element.id in table:
+            return table[element.id]
+        if not element.is_task:
+            return 0.0
+        return table.get(element.type, 1.0)
+
+    return latency_for
+
+
+def _next_flows(process, element):
+    flows = process.outgoing(element.id)
+    if element.type == "exclusiveGateway" and len(flows) > 1:
+        default = process.default_flow(element.id)
+        return [flow for flow in flows if flow.id == default] or flows[:1]
+    return flows
+
+
+def simulate(process, latency_for=None, scale=1.0, max_workers=32):
+    """Run ``process`` with stub tasks and return a result dict.
+
+    ``latency_for(element)`` gives each element's simulated latency in
+    seconds (see ``latency_table``); sleeps are multiplied by ``scale`` and
+    reported times are divided by it again, so a scaled run reports the
+    unscaled latencies. The result has ``elapsed``, ``sequential`` (the sum of
+    task latencies), ``speedup`` and ``timeline``: one
+    ``{"id", "type", "start", "end"}`` entry per executed element.
+    """
+    latency_for = latency_for or latency_table()
+    lock = threading.Lock()
+    arrived = {}
+    timeline = []
+    pending = []
+    started = time.perf_counter()
+
+    def run(element_id):
+        element = process.elements[element_id]
+        latency = latency_for(element)
+        begin = time.perf_counter()
+        if latency:
+            time.sleep(latency * scale)
+        end = time.perf_counter()
+        with lock:
+            timeline.append({
+                "id": element.id,
+                "type": element.type,
+                "start": (begin - started) / scale,
+                "end": (end - started) / scale,
+                "latency": latency,
+            })
+        for flow in _next_flows(process, element):
+            arrive(flow)
+
+    def arrive(flow):
+        target = process.elements.get(flow.target)
+        if target is None:
+            return
+        if target.type == "parallelGateway" and len(target.incoming) > 1:
+            with lock:
+                tokens = arrived.setdefault(target.id, set())
+                tokens.add(flow.id)
+                if len(tokens) < len(target.incoming):
+                    return
+                del arrived[target.id]
+        with lock:
+            pending.append(executor.submit(run, target.id))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with lock:
+            for start_event in process.start_events():
+                pending.append(executor.submit(run, start_event.id))
+        # Futures are appended while earlier ones run; drain until none are left
+        index = 0
+        while True:
+            with lock:
+                if index >= len(pending):
+                    break
+                future = pending[index]
+            future.result()
+            index += 1
+
+    elapsed = (time.perf_counter() - started) / scale
+    sequential = sum(entry["latency"] for entry in timeline)
+    timeline.sort(key=lambda entry: (entry["start"], entry["id"]))
+    return {
+        "elapsed": elapsed,
+        "sequential": sequential,
+        "speedup": sequential / elapsed if elapsed else None,
+        "timeline": timeline,
+    }
+
+
+def parse_latency(value):
+    key, _, seconds = value.partition("=")
+    if not key or not seconds:
+        raise argparse.ArgumentTypeError(f"expected ID_OR_TYPE=SECONDS, got {value!r}")
+    return key, float(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("bpmn", help="path to a .bpmn file")
+    parser.add_argument("--process", help="process id (default: first with a start event)")
+    parser.add_argument("--latency", action="append", type=parse_latency, default=[], metavar="ID_OR_TYPE=SECONDS",
+                        help="simulated latency for a task id or element type (repeatable)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply sleeps by this factor (e.g. 0.01)")
+    args = parser.parse_args(argv)
+
+    process = load_process(args.bpmn, args.process)
+    result = simulate(process, latency_table(dict(args.latency)), scale=args.scale)
+    for entry in result["timeline"]:
+        if entry["latency"]:
+            print(f"{entry['start']:9.2f} {entry['end']:9.2f}  {entry['id']}")
+    print(f"elapsed {result['elapsed']:.2f}s, sequential {result['sequential']:.2f}s, "
+          f"speedup {result['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Long-lived Chromium pool for script tasks that drive a browser.
+
+Launching Chromium dominates the latency of a one-page scrape. The pool keeps
+one browser per worker process and gives every borrower a fresh browser
+context, closed when it is returned, so no cookies, localStorage,
+sessionStorage, IndexedDB or HTTP cache entries carry over from one scrape
+to the next (a context costs milliseconds, the browser launch seconds). When
+the browser processes grow beyond ``GIA_BROWSER_MAX_RSS_MB`` the browser is
+relaunched once every borrowed context is back; until then no new contexts
+are handed out. The check covers only the Playwright driver and the browser
+processes it started, and runs off the event loop. At most ``GIA_BROWSER_MAX_PAGES`` pages are open at the same
+time; further borrowers wait.
+
+Playwright objects are bound to the event loop that created them, so the pool
+runs the async Playwright API on its own background thread and callers hand
+it a coroutine function that receives a fresh page::
+
+    async def read_title(page, url):
+        await page.goto(url)
+        return await page.title()
+
+    title = get_browser_pool().run(read_title, "https://example.com")
+
+Requests for the resource types in ``GIA_BROWSER_BLOCK`` (default
+``image,font,media``; empty disables blocking) are aborted in every context.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _browser_rss_bytes():
+    """Resident memory of the Playwright driver and its descendants (Linux only, else 0).
+
+    The driver is the child of this process whose command line names
+    Playwright; Chromium and its renderers run below it. Other children of the
+    worker (raster pools, ffmpeg) are not counted.
+    """
+    children = {}
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as stat_file:
+                # The command name may contain spaces; fields resume after the closing paren
+                parent = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(pid)
+
+    stack = []
+    for pid in children.get(os.getpid(), []):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as cmdline_file:
+                if b"playwright" in cmdline_file.read():
+                    stack.append(pid)
+        except OSError:
+            continue
+
+    total = 0
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm") as statm_file:
+                total += int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+class BrowserPool:
+    """Shared Chromium instance handing out a fresh context per borrower."""
+
+    def __init__(self, max_pages=None, max_rss_mb=None, block=None):
+        self.max_pages = max_pages or int(os.environ.get("GIA_BROWSER_MAX_PAGES", "4"))
+        self.max_rss_bytes = (max_rss_mb or int(os.environ.get("GIA_BROWSER_MAX_RSS_MB", "2048"))) * 1024 * 1024
+        if block is None:
+            block = os.environ.get("GIA_BROWSER_BLOCK", "image,font,media")
+        self.blocked_types = frozenset(item.strip() for item in block.split(",") if item.strip())
+
+        self._playwright = None
+        self._browser = None
+        self._borrowed = 0
+        self._restart = False
+        self._slots = None
+        self._ready = None
+        self._launching = None
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="gia-browser-pool", daemon=True)
+        self._thread.start()
+
+    def run(self, page_func, *args, timeout=None):
+        """Run ``await page_func(page, *args)`` on a pooled page and return its result."""
+        return self.submit(self._run(page_func, args)).result(timeout)
+
+    def submit(self, coroutine):
+        """Schedule ``coroutine`` on the pool's event loop and return a concurrent future."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def with_page(self, page_func, *args):
+        """Coroutine form of ``run`` for code already running on the pool's loop."""
+        return await self._run(page_func, args)
+
+    async def _run(self, page_func, args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pages)
+        async with self._slots:
+            context = await self._acquire()
+            page = None
+            try:
+                page = await context.new_page()
+                return await page_func(page, *args)
+            finally:
+                if page is not None:
+                    await page.close()
+                await self._release(context)
+
+    def _connected(self):
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _ensure_browser(self):
+        if self._connected():
+            return self._browser
+        if self._launching is None:
+            self._launching = asyncio.Lock()
+        # Concurrent borrowers would otherwise each start a driver and a browser
+        async with self._launching:
+            if not self._connected():
+                if self._playwright is None:
+                    from playwright.async_api import async_playwright
+
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch()
+        return self._browser
+
+    async def _block_resources(self, route):
+        if route.request.resource_type in self.blocked_types:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _acquire(self):
+        if self._ready is None:
+            self._ready = asyncio.Condition()
+        async with self._ready:
+            # No new contexts while a relaunch waits for the borrowed ones to come back
+            await self._ready.wait_for(lambda: not self._restart)
+            self._borrowed += 1
+        try:
+            browser = await self._ensure_browser()
+            context = await browser.new_context()
+            if self.blocked_types:
+                await context.route("**/*", self._block_resources)
+        except BaseException:
+            await self._returned()
+            raise
+        return context
+
+    async def _release(self, context):
+        try:
+            await context.close()
+        except Exception:
+            pass
+        if self.max_rss_bytes:
+            rss = await asyncio.get_running_loop().run_in_executor(None, _browser_rss_bytes)
+            if rss > self.max_rss_bytes:
+                self._restart = True
+        await self._returned()
+
+    async def _returned(self):
+        self._borrowed -= 1
+        if self._restart and self._borrowed == 0:
+            await self._close_browser()
+            async with self._ready:
+                self._restart = False
+                self._ready.notify_all()
+
+    async def _close_browser(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+
+    def close(self):
+        """Close the browser and stop the pool thread."""
+        async def shutdown():
+            await self._close_browser()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(30)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(30)
+
+
+def get_browser_pool():
+    """Return the worker process's shared browser pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,154 @@
+"""Persistent, size-bounded LRU cache on local disk.
+
+Entries live in a single SQLite file so that concurrent workers on the same
+host share one store. Each ``get``/``put`` updates the entry's last-access time;
+when the stored values exceed ``max_bytes`` the least recently used entries are
+evicted. Hit and miss counters are persisted alongside the entries.
+
+Used by the PDF OCR scripts to avoid paying for vision OCR twice on the same
+rendered page (cover sheets, annexures, DPR resubmissions).
+"""
+
+import hashlib
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class DiskCache:
+    """SQLite-backed string cache with LRU eviction and hit/miss counters."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def increment(self, name, amount=1):
+        """Add ``amount`` to a named counter reported by ``stats()``."""
+        with self._lock, self._conn:
+            self._bump(name, amount)
+
+    def _bump(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None, counting a hit or miss."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._bump("misses")
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._bump("hits")
+            return row[0]
+
+    def put(self, key, value):
+        """Store ``value`` under ``key`` and evict LRU entries beyond ``max_bytes``."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries WHERE key != ? ORDER BY last_access", (key,)
+            ).fetchall()
+            evicted = []
+            for old_key, old_size in rows:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((old_key,))
+                total -= old_size
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+            self._bump("evictions", len(evicted))
+
+    def stats(self):
+        """Return hits, misses, evictions, other counters, entry count and stored bytes."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        stats.update(counters)
+        stats.update(entries=entries, bytes=size)
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def private_dir(name, path=None):
+    """A directory only the current user can write, or None if ``path`` cannot be trusted.
+
+    ``path`` defaults to ``<tmp>/<name>-<uid>``; it is created with mode
+    0700 and rejected when it is a symlink, owned by another user or
+    writable by group or others. Stores holding executable code or
+    per-user data go here rather than in a shared ``<tmp>/<name>``.
+    """
+    getuid = getattr(os, "getuid", None)
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"{name}-{getuid()}" if getuid else name)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if getuid is None:
+        return path
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode) or info.st_uid != getuid() or info.st_mode & 0o022:
+        print(f"Not using {path}: not a private directory of this user")
+        return None
+    return path
+
+
+def ocr_cache_key(image_bytes, prompt, agent_name):
+    """Content address for a page OCR result: rendered page hash + prompt + agent."""
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(image_bytes).digest())
+    digest.update(b"\0" + prompt.encode("utf-8"))
+    digest.update(b"\0" + agent_name.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def open_ocr_cache():
+    """Open the shared OCR result cache, or return None when disabled.
+
+    OCR results hold document text, so the store lives in a directory private
+    to the worker's user (OCR_CACHE_DIR, default <tmp>/gia_ocr_cache-<uid>);
+    the cache is disabled when it is not. OCR_CACHE_MAX_BYTES sets its size
+    bound, and OCR_CACHE=0 disables it.
+    """
+    if os.environ.get("OCR_CACHE", "1").lower() not in ("1", "true", "yes"):
+        return None
+    cache_dir = private_dir("gia_ocr_cache", os.environ.get("OCR_CACHE_DIR") or None)
+    if cache_dir is None:
+        return None
+    max_bytes = int(os.environ.get("OCR_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    return DiskCache(os.path.join(cache_dir, "ocr_results.sqlite3"), max_bytes)
@@ -0,0 +1,132 @@
+"""Per-page OCR checkpoints so a retried task resumes instead of starting over.
+
+The OCR scripts record every page result as soon as it completes, keyed by
+document and page number, and record failed pages in a retry set. When the
+task is executed again for the same document (``content_key``: the hash
+of the downloaded PDF), pages already done are taken from the checkpoint and
+only missing or failed pages are sent to OCR again. The task itself fails
+while any page failed, so the engine's retry is what re-runs it.
+A document's checkpoint is cleared once all of its pages succeeded; leftovers
+from abandoned runs expire after ``OCR_CHECKPOINT_MAX_AGE`` seconds.
+
+Like ``gia_runtime.cache`` the store is one SQLite file, so every worker on
+the host sees the checkpoints of a task that ran on another worker process.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from gia_runtime.cache import private_dir
+
+DONE = "done"
+FAILED = "failed"
+
+
+class OcrCheckpoint:
+    """SQLite-backed page results and retry set per document."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " document TEXT NOT NULL, page INTEGER NOT NULL, status TEXT NOT NULL,"
+                " text TEXT, error TEXT, updated REAL NOT NULL,"
+                " PRIMARY KEY (document, page))"
+            )
+
+    def _write(self, document, page, status, text, error):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (document, page, status, text, error, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (document, page, status, text, error, time.time()),
+            )
+
+    def record(self, document, page, text):
+        """Persist a completed page; removes it from the retry set."""
+        self._write(document, page, DONE, text, None)
+
+    def record_failure(self, document, page, error):
+        """Add a page to the document's retry set."""
+        self._write(document, page, FAILED, None, str(error))
+
+    def completed(self, document):
+        """Return ``{page: text}`` for the pages of ``document`` already done."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page, text FROM pages WHERE document = ? AND status = ?", (document, DONE)
+            ).fetchall()
+        return dict(rows)
+
+    def failed_pages(self, document):
+        """Return the page numbers in the document's retry set."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page FROM pages WHERE document = ? AND status = ? ORDER BY page", (document, FAILED)
+            ).fetchall()
+        return [page for page, in rows]
+
+    def clear(self, document):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE document = ?", (document,))
+
+    def prune(self, max_age):
+        """Drop checkpoints of documents not touched within ``max_age`` seconds."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM pages WHERE document IN ("
+                " SELECT document FROM pages GROUP BY document HAVING MAX(updated) < ?)",
+                (time.time() - max_age,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def document_key(*parts):
+    """Stable checkpoint key for a document from its identifying parts (paths etc.)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def content_key(path, *parts):
+    """Checkpoint key for a downloaded document: a hash of its content plus ``parts``.
+
+    Unlike its storage path, the content identifies the document even when a
+    new upload replaces the file at the same path.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as document_file:
+        for chunk in iter(lambda: document_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return document_key(digest.hexdigest(), *parts)
+
+
+def open_checkpoint():
+    """Open the OCR checkpoint store, or return None when disabled.
+
+    Checkpoints hold page text, so they live in a directory private to the
+    worker's user (OCR_CHECKPOINT_DIR, default <tmp>/gia_ocr_checkpoints-<uid>)
+    and checkpointing is disabled when it is not. OCR_CHECKPOINT=0 disables
+    it, and documents untouched for OCR_CHECKPOINT_MAX_AGE seconds (default
+    one day) are pruned on open.
+    """
+    if os.environ.get("OCR_CHECKPOINT", "1").lower() not in ("1", "true", "yes"):
+        return None
+    checkpoint_dir = private_dir("gia_ocr_checkpoints", os.environ.get("OCR_CHECKPOINT_DIR") or None)
+    if checkpoint_dir is None:
+        return None
+    checkpoint = OcrCheckpoint(os.path.join(checkpoint_dir, "ocr_pages.sqlite3"))
+    checkpoint.prune(int(os.environ.get("OCR_CHECKPOINT_MAX_AGE", 24 * 3600)))
+    return checkpoint
@@ -0,0 +1,284 @@
+"""Claim-check offloading of large workflow variables.
+
+Whole-document results (``ocr_results``, ``pdf_read_results``,
+``page_content``, ``transcription_result``, the product reports) are
+ordinary workflow variables, so every task transition serialises and
+persists them and the UI renders them. With a claim check the engine keeps
+only a small reference in the context and the value itself in a blob store:
+
+- ``ClaimCheckStore.offload(variables)`` is the hook for saving a task's
+  variables. Strings and bytes of at least ``CLAIM_CHECK_MIN_BYTES`` (and lists
+  or dicts whose JSON is) are written once to a content-addressed
+  ``gia_runtime.spool.BlobSpool`` and replaced by a reference, a plain dict
+  that persists like any other variable::
+
+      {"$claim": "<sha256>", "kind": "str", "bytes": 1843201, "preview": "# Annual report ..."}
+
+- ``ClaimCheckStore.load(variables)`` is the hook for starting a task. It returns a
+  ``LazyVariables`` namespace: a dict whose references are materialised
+  from the store the first time a script (``globals()``, names, functions),
+  a gateway condition (``CompiledModel.next_flows``) or the engine reads
+  them, and then kept for the rest of the task. Variables that are never
+  read are never loaded. With ``CLAIM_CHECK_MMAP=1`` bytes values are
+  returned as read-only memory maps instead of copies.
+
+A value that was loaded and not changed keeps its reference when the task's
+variables are offloaded again, without hashing or writing it a second time.
+Reusing or reading a blob refreshes its modification time, so pruning by
+``CLAIM_CHECK_MAX_AGE`` only removes blobs no task has touched for that
+long; it must exceed the longest an instance waits between tasks (e.g. at
+a user task). ``gia_runtime.bpmn.execute --claim-check`` runs every task of
+a local execution through ``load`` and ``offload``.
+``python -m gia_runtime.claimcheck`` times context save/load with and
+without offloading for growing documents.
+
+Configuration (environment):
+
+- ``CLAIM_CHECK``: ``0`` keeps every variable inline
+- ``CLAIM_CHECK_DIR``: blob store location, private to the user
+  (``<tmp>/gia_claims-<uid>``, mode 0700; the store is disabled when the
+  directory is not private)
+- ``CLAIM_CHECK_MIN_BYTES``: size from which a variable is offloaded (64 KB)
+- ``CLAIM_CHECK_MAX_AGE``: seconds after which blobs no task wrote, reused or read are pruned (7 days)
+- ``CLAIM_CHECK_MMAP``: ``1`` returns bytes values as memory maps
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from gia_runtime.cache import private_dir
+from gia_runtime.spool import BlobSpool
+
+DEFAULT_MIN_BYTES = 64 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+PREVIEW_CHARS = 120
+
+REFERENCE_KEY = "$claim"
+
+
+class ClaimCheckError(LookupError):
+    """The blob behind a reference is no longer in the store."""
+
+
+def is_reference(value):
+    """True for a claim-check reference left in place of an offloaded variable."""
+    return isinstance(value, dict) and isinstance(value.get(REFERENCE_KEY), str)
+
+
+def _encode(value):
+    """``(kind, data)`` for a value that can be offloaded, else None."""
+    if isinstance(value, str):
+        return "str", value.encode("utf-8")
+    if isinstance(value, (bytes, bytearray)):
+        return "bytes", bytes(value)
+    if isinstance(value, (list, dict)) and not is_reference(value):
+        try:
+            return "json", json.dumps(value, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _preview(kind, value):
+    if kind == "str":
+        return value[:PREVIEW_CHARS]
+    if kind == "json":
+        return f"{type(value).__name__} of {len(value)} items"
+    return None
+
+
+class LazyVariables(dict):
+    """Workflow variables whose claim-check references load on first read.
+
+    Usable as the globals of a script task and as the variables of a
+    gateway condition; reads through ``[]``, ``get`` and name lookups
+    materialise, iteration and ``in`` do not.
+    """
+
+    def __init__(self, store, variables=()):
+        super().__init__(variables)
+        self._store = store
+        # name -> (materialised value, its reference), to skip re-offloading unchanged values
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        value = dict.__getitem__(self, name)
+        if not is_reference(value):
+            return value
+        with self._lock:
+            value = dict.__getitem__(self, name)
+            if is_reference(value):
+                reference = value
+                value = self._store.materialise(reference)
+                dict.__setitem__(self, name, value)
+                self._loaded[name] = (value, reference)
+        return value
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def reference(self, name):
+        """The reference ``name`` was loaded from, if its value has not been replaced since."""
+        if is_reference(dict.get(self, name)):
+            return dict.get(self, name)
+        loaded = self._loaded.get(name)
+        if loaded is not None and dict.get(self, name) is loaded[0]:
+            return loaded[1]
+        return None
+
+    def materialise_all(self):
+        """Load every reference (e.g. before handing the variables to code that iterates them)."""
+        for name in list(self):
+            self[name]
+        return self
+
+
+class ClaimCheckStore:
+    """Offloads large variables to a ``BlobSpool`` and loads them back."""
+
+    def __init__(self, spool, min_bytes=DEFAULT_MIN_BYTES, use_mmap=False):
+        self.spool = spool
+        self.min_bytes = min_bytes
+        self.use_mmap = use_mmap
+        self._counters = {"offloaded": 0, "offloaded_bytes": 0, "reused": 0, "materialised": 0,
+                          "materialised_bytes": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self._counters[key] += amount
+
+    def put(self, value):
+        """Store ``value`` and return its reference, or None if it stays inline."""
+        if isinstance(value, str) and len(value) * 4 < self.min_bytes:
+            # Too short to reach min_bytes even at four bytes per character
+            return None
+        encoded = _encode(value)
+        if encoded is None:
+            return None
+        kind, data = encoded
+        if len(data) < self.min_bytes:
+            return None
+        digest = self.spool.put(data)
+        self._count(offloaded=1, offloaded_bytes=len(data))
+        reference = {REFERENCE_KEY: digest, "kind": kind, "bytes": len(data)}
+        preview = _preview(kind, value)
+        if preview is not None:
+            reference["preview"] = preview
+        return reference
+
+    def materialise(self, reference):
+        """The value behind ``reference``."""
+        blob = self.spool.open_blob(reference[REFERENCE_KEY])
+        if blob is None:
+            raise ClaimCheckError(f"Claim-checked blob {reference[REFERENCE_KEY]} is missing from the store")
+        self.spool.touch(reference[REFERENCE_KEY])
+        self._count(materialised=1, materialised_bytes=len(blob))
+        kind = reference.get("kind")
+        if kind == "bytes" and self.use_mmap:
+            return blob
+        try:
+            if kind == "str":
+                return str(blob, "utf-8")
+            if kind == "json":
+                return json.loads(str(blob, "utf-8"))
+            return bytes(blob)
+        finally:
+            blob.close()
+
+    def offload(self, variables, names=None):
+        """Variables to persist: large values replaced by references, the rest unchanged.
+
+        References that ``variables`` (a ``LazyVariables``) still holds, or
+        values it loaded and nobody replaced, keep their reference as is,
+        and their blob is marked as in use. ``names`` limits it to those
+        variables.
+        """
+        persisted = {}
+        for name in list(variables) if names is None else names:
+            reference = variables.reference(name) if isinstance(variables, LazyVariables) else None
+            if reference is not None:
+                self.spool.touch(reference[REFERENCE_KEY])
+                self._count(reused=1)
+                persisted[name] = reference
+                continue
+            value = dict.__getitem__(variables, name)
+            persisted[name] = self.put(value) or value
+        return persisted
+
+    def load(self, variables):
+        """A ``LazyVariables`` namespace over persisted variables."""
+        return LazyVariables(self, variables)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+def open_claim_check():
+    """Open the claim-check store, or return None when disabled.
+
+    CLAIM_CHECK_DIR sets the location (default: <tmp>/gia_claims-<uid>,
+    private to the user; the store is disabled when it is not),
+    CLAIM_CHECK_MIN_BYTES the offload threshold, CLAIM_CHECK_MMAP=1 maps
+    bytes values instead of copying them and CLAIM_CHECK=0 disables it.
+    Blobs no task wrote, reused or read for CLAIM_CHECK_MAX_AGE seconds are
+    pruned when the store is opened.
+    """
+    if os.environ.get("CLAIM_CHECK", "1").lower() not in ("1", "true", "yes"):
+        return None
+    root = private_dir("gia_claims", os.environ.get("CLAIM_CHECK_DIR") or None)
+    if root is None:
+        return None
+    spool = BlobSpool(root)
+    spool.prune(int(os.environ.get("CLAIM_CHECK_MAX_AGE", DEFAULT_MAX_AGE)))
+    return ClaimCheckStore(
+        spool,
+        int(os.environ.get("CLAIM_CHECK_MIN_BYTES", DEFAULT_MIN_BYTES)),
+        os.environ.get("CLAIM_CHECK_MMAP", "0").lower() in ("1", "true", "yes"),
+    )
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Time context save/load with and without claim-check offloading.")
+    parser.add_argument("--sizes", default="0.1,1,10,50", help="document sizes in MB (comma-separated)")
+    parser.add_argument("--transitions", type=int, default=10, help="task transitions per document")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        store = ClaimCheckStore(BlobSpool(root))
+        print(f"{'MB':>6} {'inline save+load s':>19} {'claim save+load s':>18} {'context bytes':>14}")
+        for size in (float(value) for value in args.sizes.split(",")):
+            line = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. | a | b |\n"
+            document = line * max(1, int(size * 1024 * 1024 / len(line)))
+            context = {"pdf_name": "report.pdf", "ocr_results": document, "_ocr_retry_pages": []}
+
+            started = time.perf_counter()
+            for _ in range(args.transitions):
+                context = json.loads(json.dumps(context))
+            inline = time.perf_counter() - started
+
+            started = time.perf_counter()
+            persisted = json.dumps(store.offload(context))
+            for _ in range(args.transitions):
+                # A task that only reads a small variable; ocr_results stays a reference
+                variables = store.load(json.loads(persisted))
+                variables["pdf_name"]
+                persisted = json.dumps(store.offload(variables))
+            claimed = time.perf_counter() - started
+            print(f"{size:>6g} {inline:>19.4f} {claimed:>18.4f} {len(persisted):>14}")
+        print(json.dumps(store.stats()))
+
+
+if __name__ == "__main__":
+    main()
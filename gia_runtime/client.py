@@ -0,0 +1,275 @@
+"""Pooled HTTP client for the GIA platform API used by script tasks.
+
+One ``requests.Session`` per API host is kept for the lifetime of the worker
+process, so consecutive requests and consecutive script tasks reuse pooled
+keep-alive connections instead of paying a TCP/TLS handshake each time.
+Every request has a timeout and is retried with exponential backoff
+(honouring ``Retry-After``): idempotent requests (GET, PUT, DELETE, ...) on
+connection and read errors and on 429/502/503/504, POSTs only when the
+server cannot have processed them, i.e. on connection errors and 429/503. A
+POST that timed out or got a 502/504 may have run (an agent call, an
+upload), so it is not sent again.
+
+The client is synchronous and thread-safe: script tasks run synchronously
+inside the engine, so they overlap requests by calling it from worker
+threads (``gia_runtime.scheduler``, thread pools in the PDF scripts) rather
+than through an asyncio front end.
+
+Configuration (environment):
+
+- ``GIA_API_URL`` / ``CLIENT_URL`` / ``API_URL``: API host, first one set wins
+- ``GIA_HTTP_CONNECT_TIMEOUT`` / ``GIA_HTTP_READ_TIMEOUT``: seconds (10 / 120)
+- ``GIA_HTTP_RETRIES``: retry attempts (3), ``GIA_HTTP_BACKOFF``: base delay (0.5)
+- ``GIA_HTTP_POOL_SIZE``: connections kept per host (16)
+- ``GIA_UPLOAD_BATCH_SIZE``: files per multipart upload request (8)
+- ``GIA_KNOWLEDGE_DELETE_ROUTE``: endpoint removing documents from a knowledge
+  collection (``/api/knowledge/delete``); set it empty when the deployment
+  has none, and ``delete_knowledge`` raises ``ConfigurationError``
+"""
+
+import copy
+import json
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from gia_runtime.trace import span
+
+DEFAULT_API_URL = "http://localhost:4000"
+# Not part of the documented upload API; deployments that expose deletion elsewhere set GIA_KNOWLEDGE_DELETE_ROUTE
+DEFAULT_KNOWLEDGE_DELETE_ROUTE = "/api/knowledge/delete"
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def default_api_url():
+    return (
+        os.environ.get("GIA_API_URL")
+        or os.environ.get("CLIENT_URL")
+        or os.environ.get("API_URL")
+        or DEFAULT_API_URL
+    )
+
+
+class ConfigurationError(RuntimeError):
+    """A setting the requested API call depends on is not configured."""
+
+
+# Statuses that mean the server did not process the request, so even a POST can be re-sent
+_UNPROCESSED_STATUSES = (429, 503)
+
+
+class _Retry(Retry):
+    """``Retry`` that re-sends non-idempotent requests only on ``_UNPROCESSED_STATUSES``.
+
+    Read errors are already limited to ``allowed_methods`` by urllib3;
+    connection errors are retried for every method.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if not self._is_method_retryable(method):
+            return status_code in _UNPROCESSED_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _session_for(base_url, retries=None):
+    """Return the process-wide pooled session for ``base_url``.
+
+    ``retries`` overrides ``GIA_HTTP_RETRIES``; each value gets its own session.
+    """
+    if retries is None:
+        retries = int(os.environ.get("GIA_HTTP_RETRIES", "3"))
+    with _sessions_lock:
+        session = _sessions.get((base_url, retries))
+        if session is None:
+            retry = _Retry(
+                total=retries,
+                backoff_factor=float(os.environ.get("GIA_HTTP_BACKOFF", "0.5")),
+                status_forcelist=(429, 502, 503, 504),
+                # Read errors and 502/504 are retried for idempotent methods only; see _Retry
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            pool_size = int(os.environ.get("GIA_HTTP_POOL_SIZE", "16"))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[(base_url, retries)] = session
+        return session
+
+
+def route(path):
+    """Path of an API endpoint without the file path after ``download/``/``upload/`` (span names)."""
+    segments = path.strip("/").split("/")
+    for index, segment in enumerate(segments):
+        if segment in ("download", "upload"):
+            segments = segments[:index + 1]
+            break
+    return "/" + "/".join(segments)
+
+
+def encode_path(path):
+    """Quote each segment of a storage path for use in a URL."""
+    return "/".join(urllib.parse.quote(segment, safe="") for segment in path.split("/"))
+
+
+class GiaClient:
+    """Authenticated client for the GIA API.
+
+    ``files_route`` is the prefix of the file endpoints, which differs between
+    deployments: ``/api`` (``/api/upload``, ``/api/download``) or
+    ``/api/uploads`` (``/api/uploads/upload``, ``/api/uploads/download``).
+    """
+
+    def __init__(self, token, base_url=None, files_route="/api", timeout=None):
+        self.base_url = (base_url or default_api_url()).rstrip("/")
+        self.files_route = "/" + files_route.strip("/")
+        self.timeout = timeout or (
+            float(os.environ.get("GIA_HTTP_CONNECT_TIMEOUT", "10")),
+            float(os.environ.get("GIA_HTTP_READ_TIMEOUT", "120")),
+        )
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.session = _session_for(self.base_url)
+
+    def with_retries(self, retries):
+        """A copy of this client whose requests are retried at most ``retries`` times.
+
+        ``with_retries(0)`` lets a ``gia_runtime.scheduler.Scheduler`` see
+        429/5xx responses and do its own backoff.
+        """
+        client = copy.copy(self)
+        client.session = _session_for(self.base_url, retries)
+        return client
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        """Send a request; inside a ``gia_runtime.trace`` trace it is recorded as a span."""
+        kwargs.setdefault("timeout", self.timeout)
+        headers = dict(self.headers)
+        headers.update(kwargs.pop("headers", None) or {})
+        with span(f"{method} {route(path)}") as http:
+            response = self.session.request(method, self.url(path), headers=headers, **kwargs)
+            http.set("http.status_code", response.status_code)
+            body = response.request.body if response.request is not None else None
+            if isinstance(body, (bytes, str)):
+                http.add("bytes_out", len(body))
+            if kwargs.get("stream"):
+                http.add("bytes_in", int(response.headers.get("Content-Length") or 0))
+            else:
+                http.add("bytes_in", len(response.content))
+        return response
+
+    # Files
+
+    def download(self, path):
+        """Return the bytes of a stored file."""
+        response = self.request("GET", f"{self.files_route}/download/{encode_path(path)}")
+        response.raise_for_status()
+        return response.content
+
+    def download_to_file(self, path, file_obj, chunk_size=1024 * 1024):
+        """Stream a stored file into ``file_obj`` without holding it in memory."""
+        with self.request("GET", f"{self.files_route}/download/{encode_path(path)}", stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                file_obj.write(chunk)
+
+    def download_many(self, paths, max_workers=8):
+        """Download several files concurrently over the pooled connections, in order."""
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(self.download, paths))
+
+    def upload_files(self, folder, files, batch_size=None):
+        """Upload ``files`` into ``folder`` and return their stored paths in input order.
+
+        ``files`` is a list of ``(filename, data, content_type)`` tuples; ``data``
+        may be bytes or a readable file object. Files are sent in multipart
+        batches of ``batch_size`` per request (the endpoint accepts a list).
+        """
+        batch_size = batch_size or int(os.environ.get("GIA_UPLOAD_BATCH_SIZE", "8"))
+        upload_path = f"{self.files_route}/upload/{urllib.parse.quote(folder, safe='')}"
+        paths = []
+        for start in range(0, len(files), batch_size):
+            batch = files[start:start + batch_size]
+            response = self.request(
+                "POST", upload_path, files=[("files", item) for item in batch]
+            )
+            response.raise_for_status()
+            paths.extend(_match_uploaded_paths(batch, response.json().get("files", [])))
+        return paths
+
+    # Agents and tools
+
+    def run_agent(self, agent_name, prompt, files=None, timeout=None):
+        """Run an agent via the agent runtime and return its text content."""
+        kwargs = {"timeout": timeout} if timeout else {}
+        response = self.request(
+            "POST",
+            "/api/agent-runtime/run",
+            data={"agent_name": agent_name, "prompt": prompt},
+            files=[("files", item) for item in files or []],
+            **kwargs,
+        )
+        response.raise_for_status()
+        return response.json().get("content", "")
+
+    def execute_method(self, config_name, method_name, parameters, timeout=None):
+        """Call a tool method; returns the raw response so callers can inspect errors."""
+        payload = {"config_name": config_name, "method_name": method_name, "parameters": parameters}
+        kwargs = {"timeout": timeout} if timeout else {}
+        return self.request("POST", "/api/tools/execute-method", json=payload, **kwargs)
+
+    def upload_knowledge(self, collection, payload, files):
+        """Upload documents into a knowledge collection and return the JSON response."""
+        response = self.request(
+            "POST",
+            "/api/knowledge/upload",
+            params={"collection": collection},
+            data={"payload": json.dumps(payload)},
+            files=[("files", item) for item in files],
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def delete_knowledge(self, collection, filenames):
+        """Remove documents, by file name, from a knowledge collection and return the JSON response.
+
+        The endpoint is ``GIA_KNOWLEDGE_DELETE_ROUTE``, called as ``POST
+        <route>?collection=...`` with ``{"files": [...]}``; with the variable
+        set empty, deletion is unavailable and this raises ``ConfigurationError``.
+        """
+        delete_route = os.environ.get("GIA_KNOWLEDGE_DELETE_ROUTE", DEFAULT_KNOWLEDGE_DELETE_ROUTE).strip()
+        if not delete_route:
+            raise ConfigurationError(
+                "GIA_KNOWLEDGE_DELETE_ROUTE is empty: this deployment has no knowledge delete endpoint"
+            )
+        response = self.request(
+            "POST",
+            delete_route,
+            params={"collection": collection},
+            json={"files": list(filenames)},
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def _match_uploaded_paths(batch, uploaded_files):
+    """Align the upload response with the request order, by filename when available."""
+    by_name = {}
+    for item in uploaded_files:
+        name = item.get("filename") or item.get("originalname") or item.get("name")
+        if name:
+            by_name.setdefault(name, item.get("path", ""))
+    if len(by_name) == len(batch) and all(filename in by_name for filename, *_ in batch):
+        return [by_name[filename] for filename, *_ in batch]
+    return [item.get("path", "") for item in uploaded_files]
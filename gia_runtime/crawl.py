@@ -0,0 +1,144 @@
+"""Concurrent multi-URL crawl on the shared browser pool.
+
+``crawl`` scrapes a list of URLs, or a seed URL followed to ``depth`` links,
+on the async Playwright API of ``gia_runtime.browser``. A deduplicating
+frontier (keyed by normalised URL) feeds a fixed set of crawler tasks, so the
+total time scales with the concurrency limit rather than the URL count:
+
+- ``GIA_CRAWL_CONCURRENCY`` pages are fetched at once across all hosts (the
+  browser pool's ``GIA_BROWSER_MAX_PAGES`` caps open pages on top of that);
+- ``GIA_CRAWL_PER_HOST`` pages at once per host, with at least
+  ``GIA_CRAWL_HOST_DELAY`` seconds between request starts to the same host;
+- at most ``GIA_CRAWL_MAX_PAGES`` pages per crawl.
+
+Page HTML is reduced to its main content off the event loop with
+``gia_runtime.extract.extract_page``, which falls back to the page's plain
+text like the single-URL scrape does. Results are yielded to the calling
+thread per URL as soon as they complete.
+"""
+
+import asyncio
+import os
+import queue
+import time
+import urllib.parse
+
+from gia_runtime.browser import get_browser_pool
+from gia_runtime.extract import extract_page
+from gia_runtime.scrape_cache import normalise_url
+
+_DONE = object()
+
+
+class _HostLimiter:
+    """Per-host concurrency and politeness delay."""
+
+    def __init__(self, per_host, delay):
+        self.per_host = per_host
+        self.delay = delay
+        self._slots = {}
+        self._next_start = {}
+
+    async def __call__(self, host, func):
+        slots = self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with slots:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            return await func()
+
+
+async def _read_page(page, url, follow_links):
+    response = await page.goto(url)
+    result = {
+        "url": url,
+        "status": response.status if response else None,
+        "page_title": await page.title(),
+        "page_content": await page.content(),
+    }
+    if follow_links:
+        result["links"] = await page.eval_on_selector_all("a[href]", "els => els.map(e => e.href)")
+    return result
+
+
+async def _crawl(urls, depth, same_host, results, pool, concurrency, limiter, max_pages, token_budget):
+    loop = asyncio.get_running_loop()
+    frontier = asyncio.Queue()
+    seen = set()
+    seed_hosts = {urllib.parse.urlsplit(url).hostname for url in urls}
+
+    def enqueue(url, level):
+        if not url.startswith(("http://", "https://")) or len(seen) >= max_pages:
+            return
+        if same_host and urllib.parse.urlsplit(url).hostname not in seed_hosts:
+            return
+        key = normalise_url(url)
+        if key in seen:
+            return
+        seen.add(key)
+        frontier.put_nowait((urllib.parse.urldefrag(url)[0], level))
+
+    async def crawler():
+        while True:
+            url, level = await frontier.get()
+            try:
+                host = urllib.parse.urlsplit(url).hostname
+                result = await limiter(host, lambda: pool.with_page(_read_page, url, level < depth))
+                result["depth"] = level
+                result["page_content"], result["extraction"] = await loop.run_in_executor(
+                    None, extract_page, result["page_content"], token_budget
+                )
+                for link in result.pop("links", []):
+                    enqueue(link, level + 1)
+            except Exception as e:
+                result = {"url": url, "depth": level, "error": str(e)}
+            results.put(result)
+            frontier.task_done()
+
+    for url in urls:
+        enqueue(url, 0)
+    tasks = [asyncio.create_task(crawler()) for _ in range(concurrency)]
+    try:
+        await frontier.join()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def crawl(urls, depth=0, same_host=True, concurrency=None, per_host=None, host_delay=None, max_pages=None,
+          token_budget=None):
+    """Yield one result dict per crawled URL, in completion order.
+
+    Each result has ``url``, ``depth`` and either ``status``, ``page_title``,
+    ``page_content`` (main content as markdown, within ``token_budget``) and
+    ``extraction`` (size stats), or ``error``. With ``depth > 0`` links found on a
+    page are followed (only to the seed hosts when ``same_host``).
+    """
+    if isinstance(urls, str):
+        urls = [urls]
+    concurrency = concurrency or int(os.environ.get("GIA_CRAWL_CONCURRENCY", "8"))
+    limiter = _HostLimiter(
+        per_host or int(os.environ.get("GIA_CRAWL_PER_HOST", "2")),
+        host_delay if host_delay is not None else float(os.environ.get("GIA_CRAWL_HOST_DELAY", "0.5")),
+    )
+    max_pages = max_pages or int(os.environ.get("GIA_CRAWL_MAX_PAGES", "100"))
+
+    pool = get_browser_pool()
+    results = queue.Queue()
+    future = pool.submit(
+        _crawl(list(urls), depth, same_host, results, pool, concurrency, limiter, max_pages, token_budget)
+    )
+    future.add_done_callback(lambda _f: results.put(_DONE))
+    try:
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            yield result
+        future.result()
+    finally:
+        # The consumer stopped early: stop crawling
+        future.cancel()
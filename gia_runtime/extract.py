@@ -0,0 +1,394 @@
+"""Main-content extraction from scraped HTML.
+
+Scraped pages used to be passed on as the first 5000 characters of raw HTML,
+which is mostly ``<head>``, scripts and CSS. ``extract_main_content`` turns a
+page into compact markdown instead:
+
+1. the page is parsed with the standard library ``html.parser``; scripts,
+   styles, navigation, footers and form controls are dropped (a ``<form>``
+   itself is kept: ASP.NET and many government sites wrap the whole page
+   in one);
+2. the main content block is ``<main>``/``<article>``/``role="main"`` when
+   present, otherwise the element whose paragraphs score highest on text
+   length and punctuation, adjusted for link density;
+3. page headers (``<header>``, ``role="banner"``) outside the main block are
+   dropped, while an article's own ``<header>`` with its title is kept;
+   elements whose class/id look like menus, sidebars, cookie banners or ads
+   are dropped if they are link-dense or hold little text, and are not the
+   main block or one of its ancestors (``class="site layout-with-sidebar"``
+   on a page wrapper keeps the page);
+4. that block is rendered as markdown (headings, paragraphs, lists, code,
+   tables) and truncated at a block boundary to a token budget
+   (``SCRAPE_TOKEN_BUDGET``, estimated at four characters per token).
+
+Tree walks are iterative, so deeply nested markup does not hit the
+recursion limit. ``extract_page`` falls back to ``page_text``, the page's
+plain text, when the extraction fails or finds nothing. The returned stats
+carry raw and extracted sizes for reporting.
+"""
+
+import os
+import re
+from html.parser import HTMLParser
+
+CHARS_PER_TOKEN = 4
+
+_VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+_DROP = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+    "nav", "footer", "aside", "button", "select", "textarea", "head",
+}
+_BOILERPLATE = re.compile(
+    r"(^|[-_\s])(nav|navbar|menu|breadcrumbs?|sidebar|footer|header|cookie|consent|banner|"
+    r"advert|ads?|promo|social|share|related|subscribe|newsletter|popup|modal)([-_\s]|$)",
+    re.IGNORECASE,
+)
+# A class/id-matched element is only boilerplate below this much text or above this link share
+_BOILERPLATE_MAX_TEXT = 200
+_BOILERPLATE_LINK_DENSITY = 0.5
+_BLOCK = {
+    "p", "div", "section", "article", "main", "blockquote", "figure", "figcaption",
+    "ul", "ol", "li", "dl", "dt", "dd", "table", "tr", "pre", "address", "body",
+}
+_HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Start tags that implicitly close an open element, up to (not past) a boundary element
+_IMPLICIT_CLOSE = {
+    "p": ({"p"}, {"div", "section", "article", "main", "td", "th", "li", "blockquote", "body"}),
+    "li": ({"li"}, {"ul", "ol"}),
+    "dt": ({"dt", "dd"}, {"dl"}),
+    "dd": ({"dt", "dd"}, {"dl"}),
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+    "tr": ({"tr"}, {"table", "thead", "tbody", "tfoot"}),
+    "option": ({"option"}, {"select", "datalist"}),
+}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs or ())
+        self.children = []
+        self.parent = parent
+
+
+class _TreeBuilder(HTMLParser):
+    """Tolerant HTML to node tree, closing unterminated <p>/<li>/<td>/<tr> implicitly."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#root")
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _IMPLICIT_CLOSE:
+            closes, boundaries = _IMPLICIT_CLOSE[tag]
+            for depth in range(len(self._stack) - 1, 0, -1):
+                open_tag = self._stack[depth].tag
+                if open_tag in boundaries:
+                    break
+                if open_tag in closes:
+                    del self._stack[depth:]
+                    break
+        node = _Node(tag, attrs, self._stack[-1])
+        self._stack[-1].children.append(node)
+        if tag not in _VOID:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self._stack[-1].children.append(_Node(tag, attrs, self._stack[-1]))
+
+    def handle_endtag(self, tag):
+        for depth in range(len(self._stack) - 1, 0, -1):
+            if self._stack[depth].tag == tag:
+                del self._stack[depth:]
+                return
+
+    def handle_data(self, data):
+        self._stack[-1].children.append(data)
+
+
+def _is_structural_boilerplate(node, in_main):
+    if node.tag in _DROP:
+        return True
+    if node.attrs.get("aria-hidden") == "true" or "hidden" in node.attrs:
+        return True
+    return node.attrs.get("role") in ("navigation", "contentinfo", "complementary")
+
+
+def _is_page_boilerplate(node, in_main):
+    """A page header outside the main block, or marked boilerplate anywhere."""
+    if not in_main and (node.tag == "header" or node.attrs.get("role") == "banner"):
+        return True
+    return _is_marked_boilerplate(node)
+
+
+def _is_marked_boilerplate(node):
+    """Class/id looks like a menu, banner or ad, and the element is short or mostly links."""
+    marker = f"{node.attrs.get('id') or ''} {node.attrs.get('class') or ''}"
+    if not marker.strip() or node.tag in ("body", "main", "article") or not _BOILERPLATE.search(marker):
+        return False
+    length = len(_text(node))
+    return length < _BOILERPLATE_MAX_TEXT or _link_text_length(node) >= length * _BOILERPLATE_LINK_DENSITY
+
+
+def _prune(root, is_boilerplate, keep=(), main=None):
+    """Remove the elements ``is_boilerplate(node, in_main)`` selects, except those in ``keep`` (ids).
+
+    ``in_main`` is true for ``main`` and the elements inside it.
+    """
+    stack = [(root, root is main)]
+    while stack:
+        node, in_main = stack.pop()
+        kept = []
+        for child in node.children:
+            if isinstance(child, str):
+                kept.append(child)
+                continue
+            child_in_main = in_main or child is main
+            if id(child) in keep or not is_boilerplate(child, child_in_main):
+                kept.append(child)
+                stack.append((child, child_in_main))
+        node.children = kept
+
+
+def _text(node):
+    parts = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, str):
+            parts.append(current)
+        else:
+            stack.extend(reversed(current.children))
+    return re.sub(r"\s+", " ", "".join(parts)).strip()
+
+
+def _link_text_length(node):
+    total = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, str):
+            continue
+        if current.tag == "a":
+            total += len(_text(current))
+        else:
+            stack.extend(current.children)
+    return total
+
+
+def _iter_nodes(node):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, str):
+            continue
+        yield current
+        stack.extend(reversed(current.children))
+
+
+def _main_block(root):
+    """Pick the element most likely to hold the page's main content."""
+    explicit = [
+        node for node in _iter_nodes(root)
+        if node.tag in ("main", "article") or node.attrs.get("role") == "main"
+    ]
+    explicit = [node for node in explicit if len(_text(node)) >= 200]
+    if explicit:
+        return max(explicit, key=lambda node: len(_text(node)))
+
+    scores = {}
+    for node in _iter_nodes(root):
+        if node.tag not in ("p", "pre", "td", "blockquote", "li"):
+            continue
+        text = _text(node)
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        parent = node.parent
+        for weight in (1.0, 0.5):
+            if parent is None or parent.tag == "#root":
+                break
+            scores[id(parent)] = (parent, scores.get(id(parent), (parent, 0))[1] + score * weight)
+            parent = parent.parent
+    if not scores:
+        return root
+
+    def adjusted(entry):
+        node, score = entry
+        length = len(_text(node)) or 1
+        return score * (1 - _link_text_length(node) / length)
+
+    return max(scores.values(), key=adjusted)[0]
+
+
+class _MarkdownWriter:
+    def __init__(self):
+        self.blocks = []
+        self._inline = []
+
+    def text(self, data):
+        self._inline.append(data)
+
+    def flush(self, prefix="", kind="block"):
+        line = re.sub(r"\s+", " ", "".join(self._inline)).strip()
+        self._inline = []
+        if line:
+            self.blocks.append((kind, prefix + line))
+
+    def render(self, node, list_prefix="- "):
+        # An explicit work stack of ("children", node, list prefix), ("text", data),
+        # ("flush", prefix, kind), ("pre", node) and ("table", node) steps
+        stack = [("children", node, list_prefix)]
+        while stack:
+            step = stack.pop()
+            if step[0] == "text":
+                self.text(step[1])
+            elif step[0] == "flush":
+                self.flush(step[1], step[2])
+            elif step[0] == "pre":
+                code = "".join(part if isinstance(part, str) else _text(part) for part in step[1].children)
+                if code.strip():
+                    self.blocks.append(("block", f"```\n{code.strip(chr(10))}\n```"))
+            elif step[0] == "table":
+                for row in (n for n in _iter_nodes(step[1]) if n.tag == "tr"):
+                    cells = [_text(cell) for cell in row.children if not isinstance(cell, str) and cell.tag in ("td", "th")]
+                    if any(cells):
+                        self.blocks.append(("row", "| " + " | ".join(cells) + " |"))
+            else:
+                stack.extend(reversed(self._steps(step[1], step[2])))
+
+    @staticmethod
+    def _steps(node, list_prefix):
+        steps = []
+        for child in node.children:
+            if isinstance(child, str):
+                steps.append(("text", child))
+                continue
+            tag = child.tag
+            if tag == "br":
+                steps.append(("text", "\n"))
+            elif tag in _HEADINGS:
+                steps += [("flush", "", "block"), ("children", child, "- "), ("flush", "#" * _HEADINGS[tag] + " ", "block")]
+            elif tag in ("pre", "table"):
+                steps += [("flush", "", "block"), (tag, child)]
+            elif tag in ("ul", "ol"):
+                steps += [("flush", "", "block"), ("children", child, "1. " if tag == "ol" else "- ")]
+            elif tag == "li":
+                steps += [("flush", "", "block"), ("children", child, list_prefix), ("flush", list_prefix, "item")]
+            elif tag in _BLOCK:
+                steps += [("flush", "", "block"), ("children", child, list_prefix), ("flush", "", "block")]
+            else:
+                steps.append(("children", child, list_prefix))
+        return steps
+
+
+def _truncate(blocks, token_budget):
+    if not token_budget:
+        return blocks, False
+    budget = token_budget * CHARS_PER_TOKEN
+    kept = []
+    used = 0
+    for kind, block in blocks:
+        if used + len(block) > budget:
+            if not kept:
+                kept.append((kind, block[:budget].rstrip() + " …"))
+            return kept, True
+        kept.append((kind, block))
+        used += len(block) + 2
+    return kept, False
+
+
+def _join(blocks):
+    """Join blocks with blank lines, keeping list items and table rows together."""
+    parts = []
+    previous = None
+    for kind, block in blocks:
+        if parts:
+            parts.append("\n" if kind == previous and kind in ("item", "row") else "\n\n")
+        parts.append(block)
+        previous = kind
+    return "".join(parts)
+
+
+def extract_main_content(html, token_budget=None):
+    """Return ``(markdown, stats)`` for the main content of an HTML page.
+
+    ``stats`` has ``raw_bytes``, ``extracted_bytes``, ``ratio`` (extracted /
+    raw), ``tokens`` (estimated) and ``truncated``.
+    """
+    if token_budget is None:
+        token_budget = int(os.environ.get("SCRAPE_TOKEN_BUDGET", "1500"))
+
+    builder = _TreeBuilder()
+    builder.feed(html or "")
+    builder.close()
+    _prune(builder.root, _is_structural_boilerplate)
+    main = _main_block(builder.root)
+    ancestors = set()
+    node = main
+    while node is not None:
+        ancestors.add(id(node))
+        node = node.parent
+    _prune(builder.root, _is_page_boilerplate, ancestors, main)
+
+    writer = _MarkdownWriter()
+    writer.render(main)
+    writer.flush()
+    blocks, truncated = _truncate(writer.blocks, token_budget)
+    return _result(html, _join(blocks), truncated)
+
+
+_TEXT_DROP = re.compile(r"<(script|style|noscript|template|svg|head)\b.*?</\1\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+_TAG = re.compile(r"<[^>]*>")
+
+
+def page_text(html, token_budget=None):
+    """Return ``(text, stats)``: all visible text of a page, for when ``extract_main_content`` fails.
+
+    Tags are stripped with regular expressions rather than parsed, so any
+    input yields a result; ``stats`` are as for ``extract_main_content``.
+    """
+    import html as html_module
+
+    if token_budget is None:
+        token_budget = int(os.environ.get("SCRAPE_TOKEN_BUDGET", "1500"))
+    text = _TAG.sub(" ", _TEXT_DROP.sub(" ", html or ""))
+    text = re.sub(r"\s+", " ", html_module.unescape(text)).strip()
+    budget = token_budget * CHARS_PER_TOKEN if token_budget else len(text)
+    truncated = len(text) > budget
+    if truncated:
+        text = text[:budget].rsplit(" ", 1)[0] + " …"
+    return _result(html, text, truncated)
+
+
+def extract_page(html, token_budget=None):
+    """``extract_main_content``, or ``page_text`` when that raises or finds no content.
+
+    The stats of a fallback carry ``"fallback": True``.
+    """
+    try:
+        markdown, stats = extract_main_content(html, token_budget)
+    except Exception as e:
+        print(f"Content extraction failed ({e}); using the page text")
+        markdown = ""
+    if markdown.strip():
+        return markdown, stats
+    markdown, stats = page_text(html, token_budget)
+    stats["fallback"] = True
+    return markdown, stats
+
+
+def _result(html, markdown, truncated):
+    raw_bytes = len((html or "").encode("utf-8"))
+    extracted_bytes = len(markdown.encode("utf-8"))
+    return markdown, {
+        "raw_bytes": raw_bytes,
+        "extracted_bytes": extracted_bytes,
+        "ratio": round(extracted_bytes / raw_bytes, 4) if raw_bytes else None,
+        "tokens": -(-len(markdown) // CHARS_PER_TOKEN),
+        "truncated": truncated,
+    }
@@ -0,0 +1,154 @@
+"""Adaptive page rasterisation and compact image encoding for OCR uploads.
+
+Pages used to be rendered at a fixed scale of 2 and saved as uncompressed RGB
+PNG, several megabytes per page that are uploaded, downloaded and sent to the
+vision agent again. With ``OCR_COMPACT_IMAGES=1`` ``encode_page`` instead:
+
+1. picks the render scale from the page size: ``OCR_RENDER_DPI`` for normal
+   pages, capped so the longest side stays within ``OCR_MAX_SIDE_PX`` (vision
+   models downscale larger images anyway);
+2. reduces the image to grayscale when the page has no colour, and to
+   bilevel when it is already (almost) pure black and white;
+3. encodes an optimised PNG, trying JPEG when that exceeds the per-page
+   budget ``OCR_PAGE_MAX_BYTES``, and lowers the resolution step by step
+   (down to ``OCR_MIN_DPI``) while the page is still over budget.
+
+Compact encoding is off by default (scale-2 PNG, as before) until its OCR
+accuracy has been validated on a sample set; enable it per deployment with
+``OCR_COMPACT_IMAGES=1``. Callers pass a stats dict to collect the baseline
+and encoded sizes per document; see ``summarise``.
+"""
+
+import io
+import os
+
+from gia_runtime.trace import span
+
+BASELINE_SCALE = 2
+
+
+def encoding_options():
+    """Page encoding settings from the environment."""
+    return {
+        "compact": os.environ.get("OCR_COMPACT_IMAGES", "0").lower() in ("1", "true", "yes"),
+        "dpi": float(os.environ.get("OCR_RENDER_DPI", "144")),
+        "min_dpi": float(os.environ.get("OCR_MIN_DPI", "100")),
+        "max_side": int(os.environ.get("OCR_MAX_SIDE_PX", "2048")),
+        "max_bytes": int(os.environ.get("OCR_PAGE_MAX_BYTES", str(1024 * 1024))),
+        "jpeg_quality": int(os.environ.get("OCR_JPEG_QUALITY", "85")),
+    }
+
+
+def image_type(data):
+    """Return ``(extension, mime type)`` of encoded page bytes."""
+    if data[:2] == b"\xff\xd8":
+        return "jpg", "image/jpeg"
+    return "png", "image/png"
+
+
+def baseline_size(page):
+    """Size of the page as the previous scale-2 RGB PNG without compression."""
+    width, height = page.get_size()
+    width_px = round(width * BASELINE_SCALE)
+    height_px = round(height * BASELINE_SCALE)
+    # Raw RGB samples plus one filter byte per row
+    return width_px * height_px * 3 + height_px
+
+
+def _page_scale(page, options):
+    width, height = page.get_size()
+    scale = options["dpi"] / 72
+    longest = max(width, height) or 1
+    if longest * scale > options["max_side"]:
+        scale = options["max_side"] / longest
+    return scale
+
+
+def _reduce_colour(image):
+    """Return ``image`` as RGB, grayscale ("L") or bilevel ("1") depending on its content."""
+    sample = image.copy()
+    sample.thumbnail((256, 256))
+    hsv = sample.convert("HSV")
+    # Saturated pixels that are not near-black (dark pixels have noisy hue/saturation)
+    coloured = sum(1 for _, s, v in hsv.getdata() if s > 48 and v > 64)
+    total = (hsv.width * hsv.height) or 1
+    hsv.close()
+    sample.close()
+    if coloured / total > 0.002:
+        return image
+
+    gray = image.convert("L")
+    histogram = gray.histogram()
+    near_binary = sum(histogram[:32]) + sum(histogram[224:])
+    if near_binary / ((gray.width * gray.height) or 1) < 0.97:
+        return gray
+    bilevel = gray.point([0] * 128 + [255] * 128, "1")
+    gray.close()
+    return bilevel
+
+
+def _save(image, image_format, **save_options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **save_options)
+    return buffer.getvalue()
+
+
+def _encode(image, options):
+    data = _save(image, "PNG", optimize=True)
+    if len(data) > options["max_bytes"] and image.mode != "1":
+        jpeg = _save(image, "JPEG", quality=options["jpeg_quality"], optimize=True)
+        if len(jpeg) < len(data):
+            data = jpeg
+    return data
+
+
+def encode_page(page, options=None, stats=None):
+    """Render a pdfium page and return its encoded image bytes.
+
+    ``stats``, if given, accumulates ``pages``, ``baseline_bytes`` and
+    ``encoded_bytes`` for the document.
+    """
+    options = options or encoding_options()
+
+    if not options["compact"]:
+        with span("pdfium.render", scale=BASELINE_SCALE):
+            bitmap = page.render(scale=BASELINE_SCALE, rotation=0)
+            image = bitmap.to_pil()
+        with span("image.encode") as encode:
+            data = _save(image, "PNG", optimize=False, compress_level=0)
+            encode.add("bytes_out", len(data))
+        image.close()
+        bitmap.close()
+    else:
+        min_scale = options["min_dpi"] / 72
+        scale = _page_scale(page, options)
+        while True:
+            with span("pdfium.render", scale=round(scale, 3)):
+                bitmap = page.render(scale=scale, rotation=0)
+                image = bitmap.to_pil()
+            with span("image.encode") as encode:
+                reduced = _reduce_colour(image)
+                data = _encode(reduced, options)
+                encode.add("bytes_out", len(data))
+            if reduced is not image:
+                reduced.close()
+            image.close()
+            bitmap.close()
+            if len(data) <= options["max_bytes"] or scale <= min_scale:
+                break
+            scale = max(min_scale, scale * 0.8)
+
+    if stats is not None:
+        stats["pages"] = stats.get("pages", 0) + 1
+        stats["baseline_bytes"] = stats.get("baseline_bytes", 0) + baseline_size(page)
+        stats["encoded_bytes"] = stats.get("encoded_bytes", 0) + len(data)
+    return data
+
+
+def summarise(stats):
+    """Add ``bytes_saved`` and ``ratio`` to collected encoding stats and return them."""
+    baseline = stats.get("baseline_bytes", 0)
+    encoded = stats.get("encoded_bytes", 0)
+    stats["bytes_saved"] = baseline - encoded
+    stats["ratio"] = round(encoded / baseline, 4) if baseline else None
+    return stats
@@ -0,0 +1,272 @@
+"""Incremental knowledge-base upload of OCR documents.
+
+``create_knowledge_config`` used to post the whole OCR markdown as one
+``memory_doc.md`` with ``"overwrite": True``, so a one-character correction
+in ``validate_ocr`` made the knowledge service re-chunk and re-embed the
+whole document. ``sync_document`` uploads it as separate chunk documents
+instead, and only the chunks that changed:
+
+- ``chunk_markdown`` splits the markdown into chunks at content-defined
+  boundaries: before headings, and after paragraphs whose hash selects them
+  (about one in ``KNOWLEDGE_CHUNK_SPREAD``), within ``KNOWLEDGE_CHUNK_MIN_CHARS``
+  and ``KNOWLEDGE_CHUNK_MAX_CHARS``. Boundaries depend only on the nearby
+  text, so an edit changes the chunk it falls in (and at most its
+  neighbour) while every other chunk keeps its content and hash;
+- each chunk is uploaded as ``memory_doc_<hash>.md`` (the document title
+  first, for retrieval context);
+- a ``KnowledgeManifest`` records per collection which chunk hashes were
+  indexed, under which knowledge config. The next sync uploads the new
+  hashes with ``"overwrite": False`` and deletes the files of the hashes
+  that disappeared (``GiaClient.delete_knowledge``, at
+  ``GIA_KNOWLEDGE_DELETE_ROUTE``: deletion is not part of the documented
+  upload API, so the route is configurable).
+
+If the delete request fails, the sync stays incremental: the new chunks
+are indexed and the removed ones stay in the manifest, so the next sync
+tries to delete them again (until then the collection also holds their
+outdated text). With no manifest for the collection, a changed config
+(model, category, chunking) or a failed upload, the collection is rebuilt
+in full: every chunk is uploaded, the first batch with ``"overwrite": True``.
+``python -m gia_runtime.knowledge old.md new.md`` shows what a sync from
+one version to the next would upload and delete.
+
+Configuration (environment):
+
+- ``KNOWLEDGE_INCREMENTAL``: ``0`` always rebuilds the collection in full
+- ``KNOWLEDGE_MANIFEST_DIR``: manifest location, private to the user
+  (``<tmp>/gia_knowledge-<uid>``, mode 0700; uploads are full rebuilds when
+  the directory is not private)
+- ``KNOWLEDGE_CHUNK_MIN_CHARS`` / ``KNOWLEDGE_CHUNK_MAX_CHARS``: chunk size bounds (1500 / 6000)
+- ``KNOWLEDGE_CHUNK_SPREAD``: average paragraphs per content-defined boundary (6)
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from gia_runtime.cache import private_dir
+
+DEFAULT_MIN_CHARS = 1500
+DEFAULT_MAX_CHARS = 6000
+DEFAULT_SPREAD = 6
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n+")
+
+
+def chunk_settings():
+    """Chunking settings from the environment."""
+    return {
+        "min_chars": int(os.environ.get("KNOWLEDGE_CHUNK_MIN_CHARS", DEFAULT_MIN_CHARS)),
+        "max_chars": int(os.environ.get("KNOWLEDGE_CHUNK_MAX_CHARS", DEFAULT_MAX_CHARS)),
+        "spread": max(1, int(os.environ.get("KNOWLEDGE_CHUNK_SPREAD", DEFAULT_SPREAD))),
+    }
+
+
+def _is_boundary(block, spread):
+    digest = hashlib.sha256(block.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % spread == 0
+
+
+def chunk_markdown(text, min_chars=DEFAULT_MIN_CHARS, max_chars=DEFAULT_MAX_CHARS, spread=DEFAULT_SPREAD):
+    """Split markdown into chunks at content-defined paragraph boundaries."""
+    blocks = [block.rstrip() for block in _PARAGRAPH_BREAK.split(text.replace("\r\n", "\n").strip())]
+    chunks = []
+    current, size = [], 0
+    for block in blocks:
+        if not block.strip():
+            continue
+        if current and (size + len(block) > max_chars or (block.startswith("#") and size >= min_chars)):
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 2
+        if size >= min_chars and _is_boundary(block, spread):
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def chunk_document(title, markdown, settings=None):
+    """``[{"id", "filename", "content"}]`` for a document, in document order.
+
+    Identical chunks are kept once: they would index the same text twice.
+    """
+    settings = settings or chunk_settings()
+    documents, seen = [], set()
+    for text in chunk_markdown(markdown or "", **settings) or [""]:
+        content = f"# {title}\n\n{text}".rstrip() + "\n"
+        chunk_id = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        documents.append({"id": chunk_id, "filename": f"memory_doc_{chunk_id[:16]}.md", "content": content})
+    return documents
+
+
+def config_key(payload, settings=None):
+    """Fingerprint of a knowledge config and the chunking; a change forces a full rebuild."""
+    config = {key: value for key, value in payload.items() if key != "overwrite"}
+    return hashlib.sha256(json.dumps([config, settings or chunk_settings()], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class KnowledgeManifest:
+    """SQLite-backed record of the chunks indexed per knowledge collection."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " collection TEXT NOT NULL, chunk TEXT NOT NULL, filename TEXT NOT NULL,"
+                " config TEXT NOT NULL, updated REAL NOT NULL,"
+                " PRIMARY KEY (collection, chunk))"
+            )
+
+    def chunks(self, collection, config):
+        """``{chunk id: filename}`` indexed for ``collection``, or None when nothing is known under ``config``."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk, filename, config FROM chunks WHERE collection = ?", (collection,)
+            ).fetchall()
+        if not rows or any(row_config != config for _, _, row_config in rows):
+            return None
+        return {chunk: filename for chunk, filename, _ in rows}
+
+    def add(self, collection, config, documents):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (collection, chunk, filename, config, updated) VALUES (?, ?, ?, ?, ?)",
+                [(collection, document["id"], document["filename"], config, now) for document in documents],
+            )
+
+    def remove(self, collection, chunk_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE collection = ? AND chunk = ?",
+                [(collection, chunk_id) for chunk_id in chunk_ids],
+            )
+
+    def clear(self, collection):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE collection = ?", (collection,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def plan(documents, indexed):
+    """``(added documents, removed {chunk id: filename}, unchanged count)`` against the indexed chunks."""
+    current = {document["id"] for document in documents}
+    added = [document for document in documents if document["id"] not in indexed]
+    removed = {chunk_id: filename for chunk_id, filename in indexed.items() if chunk_id not in current}
+    return added, removed, len(documents) - len(added)
+
+
+def _upload(client, collection, payload, documents, batch_size, overwrite_first, manifest, config):
+    responses = []
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        files = [(document["filename"], document["content"], "text/markdown") for document in batch]
+        batch_payload = dict(payload, overwrite=overwrite_first and start == 0)
+        responses.append(client.upload_knowledge(collection, batch_payload, files))
+        if manifest is not None:
+            # Recorded per batch, so an interrupted sync resumes with what is missing
+            manifest.add(collection, config, batch)
+    return responses
+
+
+def sync_document(client, collection, payload, title, markdown, manifest=None, batch_size=None):
+    """Bring a knowledge collection up to date with a markdown document.
+
+    Returns ``{"mode": "incremental" | "full", "chunks", "uploaded",
+    "deleted", "stale", "unchanged", "responses"}``; ``stale`` counts removed
+    chunks whose deletion failed and is retried by the next sync.
+    """
+    settings = chunk_settings()
+    batch_size = batch_size or int(os.environ.get("GIA_UPLOAD_BATCH_SIZE", "8"))
+    documents = chunk_document(title, markdown, settings)
+    config = config_key(payload, settings)
+
+    indexed = manifest.chunks(collection, config) if manifest is not None else None
+    if indexed is not None:
+        added, removed, unchanged = plan(documents, indexed)
+        try:
+            # Upload before deleting, so the collection never lacks the edited section
+            responses = _upload(client, collection, payload, added, batch_size, False, manifest, config)
+        except Exception as e:
+            print(f"Incremental knowledge upload to {collection} failed ({e}); rebuilding it in full")
+        else:
+            deleted = 0
+            if removed:
+                try:
+                    responses.append(client.delete_knowledge(collection, sorted(removed.values())))
+                    manifest.remove(collection, removed)
+                    deleted = len(removed)
+                except Exception as e:
+                    # Kept in the manifest, so the next sync deletes them
+                    print(f"Could not delete {len(removed)} outdated chunks from {collection} ({e}); "
+                          f"retrying on the next sync")
+            return {"mode": "incremental", "chunks": len(documents), "uploaded": len(added),
+                    "deleted": deleted, "stale": len(removed) - deleted, "unchanged": unchanged,
+                    "responses": responses}
+
+    if manifest is not None:
+        manifest.clear(collection)
+    responses = _upload(client, collection, payload, documents, batch_size, True, manifest, config)
+    return {"mode": "full", "chunks": len(documents), "uploaded": len(documents),
+            "deleted": 0, "stale": 0, "unchanged": 0, "responses": responses}
+
+
+def open_manifest():
+    """Open the knowledge manifest, or return None when incremental upload is disabled.
+
+    KNOWLEDGE_MANIFEST_DIR sets the location (default: <tmp>/gia_knowledge-<uid>,
+    private to the user) and KNOWLEDGE_INCREMENTAL=0 disables it.
+    """
+    if os.environ.get("KNOWLEDGE_INCREMENTAL", "1").lower() not in ("1", "true", "yes"):
+        return None
+    manifest_dir = private_dir("gia_knowledge", os.environ.get("KNOWLEDGE_MANIFEST_DIR") or None)
+    if manifest_dir is None:
+        return None
+    return KnowledgeManifest(os.path.join(manifest_dir, "manifest.sqlite3"))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show which chunks a knowledge sync from OLD to NEW would upload.")
+    parser.add_argument("old", help="markdown indexed previously")
+    parser.add_argument("new", help="markdown to index now")
+    parser.add_argument("--title", default="document.pdf", help="document title heading each chunk")
+    args = parser.parse_args(argv)
+
+    documents = {}
+    for name in ("old", "new"):
+        with open(getattr(args, name), "r", encoding="utf-8") as markdown_file:
+            documents[name] = chunk_document(args.title, markdown_file.read())
+    indexed = {document["id"]: document["filename"] for document in documents["old"]}
+    added, removed, unchanged = plan(documents["new"], indexed)
+    sizes = [len(document["content"]) for document in documents["new"]]
+    print(f"{len(documents['new'])} chunks ({min(sizes)}-{max(sizes)} chars): "
+          f"{len(added)} to upload, {len(removed)} to delete, {unchanged} unchanged")
+    for document in added:
+        body = document["content"].split("\n\n", 1)[-1]
+        print(f"+ {document['filename']}  {body.strip()[:60]!r}")
+    for filename in sorted(removed.values()):
+        print(f"- {filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Memoization of deterministic service-task calls.
+
+Some service tasks are pure for a given input, such as the product reports
+generated from analysis bullets with ``tools=[]``. Calling them again costs
+the full LLM latency for the same answer.
+
+Only tasks whose parameters carry all the content the result depends on
+qualify. A storage path does not: a re-upload overwrites what it names. Nor
+does a task redone after a human rejects its result (the tender notice after
+``review_notice``): with the same inputs the memo would replay the rejected
+draft.
+
+A task opts in from its definition, next to ``<function>``::
+
+    <serviceConfiguration xmlns="http://example.org/service">
+      <function>...</function>
+      <memoize ttl="86400"/>
+    </serviceConfiguration>
+
+(``ttl`` in seconds; without it ``SERVICE_MEMO_TTL`` applies).
+``gia_runtime.bpmn.compiled`` keeps the setting as ``service["memoize"]``, and
+the engine runs the task through ``ServiceMemo.call_service``. Functions can also be
+opted in without editing definitions with ``SERVICE_MEMO_FUNCTIONS``, e.g.
+``AI Agent:execute_agent_advanced=3600,TenderNoticeAgent:prepare_notice``.
+
+Results are keyed by module, function and the resolved parameters after
+normalisation (key order, line endings, surrounding whitespace, literal
+lists/dicts written as strings such as ``"[]"``), and stored as JSON in a
+``gia_runtime.cache.DiskCache`` (size-bounded LRU). Failed calls and
+results that are not JSON are never stored. Hits, misses, expiries and
+the call time saved by hits are counted per function; ``stats()`` and
+``python -m gia_runtime.memo`` report them.
+
+Configuration (environment):
+
+- ``SERVICE_MEMO``: ``0`` disables memoization
+- ``SERVICE_MEMO_DIR``: store location, private to the user (``<tmp>/gia_service_memo-<uid>``)
+- ``SERVICE_MEMO_MAX_BYTES``: size bound of the store (256 MB)
+- ``SERVICE_MEMO_TTL``: default time to live in seconds (86400)
+- ``SERVICE_MEMO_FUNCTIONS``: extra ``module:function[=ttl]`` opt-ins
+"""
+
+import ast
+import hashlib
+import json
+import os
+import time
+
+from gia_runtime.cache import DEFAULT_MAX_BYTES, DiskCache, private_dir
+
+DEFAULT_TTL = 86400
+
+_MISSING = object()
+
+
+def normalise(value):
+    """Canonical form of a parameter value for keying."""
+    if isinstance(value, dict):
+        return {str(key): normalise(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalise(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        text = value.replace("\r\n", "\n").strip()
+        if text[:1] in ("[", "{"):
+            try:
+                return normalise(ast.literal_eval(text))
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                pass
+        return text
+    return value
+
+
+def memo_key(module, function, parameters):
+    """Cache key of one call: SHA-256 over module, function and normalised parameters."""
+    payload = json.dumps([module, function, normalise(parameters or {})], sort_keys=True,
+                         ensure_ascii=False, default=repr)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def failed(result):
+    """True for results that report an error and must not be memoized."""
+    if result is None:
+        return True
+    if isinstance(result, dict):
+        return result.get("success") is False or bool(result.get("error"))
+    return False
+
+
+def _configured_functions():
+    functions = {}
+    for item in os.environ.get("SERVICE_MEMO_FUNCTIONS", "").split(","):
+        name, _, ttl = item.strip().partition("=")
+        module, _, function = name.partition(":")
+        if module.strip() and function.strip():
+            functions[(module.strip(), function.strip())] = float(ttl) if ttl.strip() else None
+    return functions
+
+
+class ServiceMemo:
+    """Memoized service calls on a ``DiskCache`` store."""
+
+    def __init__(self, store, default_ttl=DEFAULT_TTL, functions=None):
+        self.store = store
+        self.default_ttl = default_ttl
+        self.functions = dict(functions or {})
+
+    def ttl_for(self, service):
+        """TTL in seconds for a compiled service task, or None if it has not opted in.
+
+        ``service`` is a ``CompiledModel.services`` entry (``module``,
+        ``function``, ``memoize``, ``placeholders``). Tasks whose parameters
+        reference no ``{var}`` are never memoized: their key is the same for
+        every instance, so one instance's result would be served to all.
+        """
+        if not service.get("placeholders"):
+            return None
+        memoize = service.get("memoize")
+        if memoize is not None:
+            return memoize.get("ttl") or self.default_ttl
+        key = (service.get("module"), service.get("function"))
+        if key in self.functions:
+            return self.functions[key] or self.default_ttl
+        return None
+
+    def _lookup(self, key, counter_prefix):
+        """Cached result for ``key``, or ``_MISSING`` when absent or expired."""
+        value = self.store.get(key)
+        if value is None:
+            self.store.increment(f"misses:{counter_prefix}")
+            return _MISSING
+        entry = json.loads(value)
+        if time.time() - entry["stored_at"] >= entry["ttl"]:
+            self.store.increment("expired")
+            self.store.increment(f"misses:{counter_prefix}")
+            return _MISSING
+        self.store.increment(f"hits:{counter_prefix}")
+        self.store.increment("saved_ms", int(entry["elapsed"] * 1000))
+        return entry["result"]
+
+    def call(self, module, function, parameters, invoke, ttl=None):
+        """Return ``invoke()`` for the call, or its memoized result.
+
+        ``parameters`` are the resolved parameters the call is made with.
+        ``ttl`` is the lifetime of a new entry (``default_ttl`` when None).
+        """
+        name = f"{module}:{function}"
+        key = memo_key(module, function, parameters)
+        cached = self._lookup(key, name)
+        if cached is not _MISSING:
+            return cached
+
+        started = time.perf_counter()
+        result = invoke()
+        elapsed = time.perf_counter() - started
+        if failed(result):
+            return result
+        try:
+            value = json.dumps({
+                "stored_at": time.time(),
+                "ttl": float(ttl or self.default_ttl),
+                "elapsed": elapsed,
+                "result": result,
+            }, ensure_ascii=False)
+        except (TypeError, ValueError):
+            self.store.increment("uncacheable")
+            return result
+        self.store.put(key, value)
+        return result
+
+    def call_service(self, service, parameters, invoke):
+        """Run a compiled service task through the memo when it has opted in."""
+        ttl = self.ttl_for(service)
+        if ttl is None:
+            return invoke()
+        return self.call(service["module"], service["function"], parameters, invoke, ttl)
+
+    def stats(self):
+        """Totals plus ``{"functions": {"module:function": {"hits", "misses"}}}``."""
+        raw = self.store.stats()
+        functions = {}
+        totals = {"hits": 0, "misses": 0}
+        for counter, value in raw.items():
+            kind, _, name = counter.partition(":")
+            if kind in totals and name:
+                functions.setdefault(name, {"hits": 0, "misses": 0})[kind] += value
+                totals[kind] += value
+        calls = totals["hits"] + totals["misses"]
+        return {
+            "hits": totals["hits"],
+            "misses": totals["misses"],
+            "hit_rate": round(totals["hits"] / calls, 4) if calls else None,
+            "expired": raw.get("expired", 0),
+            "evictions": raw.get("evictions", 0),
+            "uncacheable": raw.get("uncacheable", 0),
+            "saved_seconds": round(raw.get("saved_ms", 0) / 1000, 3),
+            "entries": raw["entries"],
+            "bytes": raw["bytes"],
+            "functions": functions,
+        }
+
+
+def open_service_memo():
+    """Open the service-call memo, or return None when disabled.
+
+    Memoized results can hold patient or customer data, so the store lives
+    in a directory private to the worker's user (SERVICE_MEMO_DIR, default
+    <tmp>/gia_service_memo-<uid>); the memo is disabled when it is not.
+    SERVICE_MEMO_MAX_BYTES sets its size bound, SERVICE_MEMO_TTL the default TTL
+    and SERVICE_MEMO=0 disables it.
+    """
+    if os.environ.get("SERVICE_MEMO", "1").lower() not in ("1", "true", "yes"):
+        return None
+    memo_dir = private_dir("gia_service_memo", os.environ.get("SERVICE_MEMO_DIR") or None)
+    if memo_dir is None:
+        return None
+    max_bytes = int(os.environ.get("SERVICE_MEMO_MAX_BYTES", DEFAULT_MAX_BYTES))
+    store = DiskCache(os.path.join(memo_dir, "service_calls.sqlite3"), max_bytes)
+    return ServiceMemo(store, float(os.environ.get("SERVICE_MEMO_TTL", DEFAULT_TTL)), _configured_functions())
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show service-call memo statistics and memoized tasks.")
+    parser.add_argument("bpmn", nargs="*", help=".bpmn files whose opted-in service tasks to list")
+    args = parser.parse_args(argv)
+
+    memo = open_service_memo()
+    if memo is None:
+        print("service memo disabled (SERVICE_MEMO=0)")
+        return
+    if args.bpmn:
+        from gia_runtime.bpmn.compiled import load_models
+
+        for path in args.bpmn:
+            for model in load_models(path).values():
+                for element_id, service in model.services.items():
+                    ttl = memo.ttl_for(service)
+                    if ttl is not None:
+                        print(f"{path}: {element_id} ({service['module']}:{service['function']}) ttl {ttl:.0f}s")
+    print(json.dumps(memo.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
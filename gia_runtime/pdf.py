@@ -0,0 +1,162 @@
+"""PDF download and page streaming shared by the PDF OCR and DPR scripts.
+
+``downloaded_pdf`` spools a PDF from the file API to a temporary file and
+removes it when the ``with`` block ends, however it ends; callers keep
+everything that reads the file (checkpoint keys, ``render_pages``) inside
+the block. ``render_pages`` yields one page at a time: born-digital pages
+as markdown from their text layer (``extract_page_text``), the others as an
+encoded page image (``gia_runtime.imaging``), rendered in-process or by a
+process pool (``gia_runtime.raster``). Peak memory is one page regardless
+of document length.
+
+pypdfium2 is imported where it is used, so importing this module stays
+cheap.
+"""
+
+import contextlib
+import os
+import tempfile
+
+from gia_runtime.imaging import encode_page, encoding_options
+from gia_runtime.trace import span
+
+_BULLETS = "\u2022\u00b7\u25aa\u25cf\u25e6"
+_MIN_TEXT_CHARS = 50
+_MIN_READABLE_RATIO = 0.9
+_MAX_IMAGE_COVERAGE = 0.5
+
+
+def download_pdf(client, file_path):
+    """Stream the PDF at ``file_path`` into a temporary file and return its local path.
+
+    The caller owns the file; it is removed here only if the download fails.
+    """
+    with span("download", path=file_path) as phase, \
+            tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+        try:
+            # Spool to disk in chunks instead of holding the whole PDF in memory
+            client.download_to_file(file_path, tmp_file)
+        except BaseException:
+            tmp_file.close()
+            os.remove(tmp_file.name)
+            raise
+        phase.add("bytes_in", tmp_file.tell())
+    return tmp_file.name
+
+
+@contextlib.contextmanager
+def downloaded_pdf(client, file_path):
+    """``download_pdf`` as a context manager: yields the local path and removes the file on exit."""
+    local_pdf_path = download_pdf(client, file_path)
+    try:
+        yield local_pdf_path
+    finally:
+        try:
+            os.remove(local_pdf_path)
+        except FileNotFoundError:
+            pass
+
+
+def text_to_markdown(text):
+    """Convert a pdfium text layer to light markdown (headings, bullets, paragraphs)."""
+    blocks = []
+    for raw_line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        line = raw_line.rstrip()
+        stripped = line.strip()
+        if not stripped:
+            if blocks and blocks[-1] != "":
+                blocks.append("")
+            continue
+        if stripped[0] in _BULLETS and len(stripped) > 1:
+            blocks.append(f"- {stripped[1:].strip()}")
+        elif len(stripped) < 80 and stripped.isupper() and any(c.isalpha() for c in stripped):
+            blocks.extend(["", f"## {stripped.title()}", ""])
+        else:
+            blocks.append(line)
+    return "\n".join(blocks).strip()
+
+
+def extract_page_text(page):
+    """Return markdown for a born-digital page, or None if it needs vision OCR.
+
+    Born-digital means the text layer has enough readable characters and
+    embedded images cover only a minor part of the page; scanned pages are a
+    full-page image, possibly with a hidden OCR layer.
+    """
+    textpage = page.get_textpage()
+    try:
+        if textpage.count_chars() < _MIN_TEXT_CHARS:
+            return None
+        text = textpage.get_text_range()
+    finally:
+        textpage.close()
+
+    visible = [c for c in text if not c.isspace()]
+    if len(visible) < _MIN_TEXT_CHARS:
+        return None
+    readable = sum(1 for c in visible if c.isprintable() and c != "\ufffd")
+    if readable / len(visible) < _MIN_READABLE_RATIO:
+        return None
+
+    import pypdfium2.raw as pdfium_c
+
+    page_width, page_height = page.get_size()
+    page_area = (page_width * page_height) or 1
+    image_area = 0
+    for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]):
+        left, bottom, right, top = obj.get_pos()
+        image_area += max(0, right - left) * max(0, top - bottom)
+    if image_area / page_area > _MAX_IMAGE_COVERAGE:
+        return None
+
+    return text_to_markdown(text)
+
+
+def plan_pages(pdf, text_fast_path=True):
+    """Yield ``(page_index, markdown)`` per page; markdown is None when the page must be rendered."""
+    for i in range(len(pdf)):
+        page = pdf[i]
+        page_text = extract_page_text(page) if text_fast_path else None
+        page.close()
+        yield i, page_text
+
+
+def render_pages(local_pdf_path, text_fast_path=True, processes=1, encode_stats=None):
+    """Yield ``(page_index, kind, payload)`` for each page of a PDF on disk.
+
+    ``kind`` is "text" with markdown from the text layer for born-digital
+    pages (these are never rasterised), or "image" with the encoded page
+    image for pages that need vision OCR (resolution and format are chosen
+    per page by ``gia_runtime.imaging``; ``encode_stats`` collects the
+    sizes). Each bitmap is released before its image is yielded. With
+    ``processes > 1`` pages are rasterised by a process pool and still
+    yielded in order. The file is not removed; see ``downloaded_pdf``.
+    """
+    import pypdfium2 as pdfium
+
+    options = encoding_options()
+    pdf = pdfium.PdfDocument(local_pdf_path)
+    try:
+        if processes > 1:
+            from gia_runtime.raster import render_in_processes
+
+            yield from render_in_processes(
+                local_pdf_path, plan_pages(pdf, text_fast_path), processes, options, encode_stats
+            )
+            return
+        for i in range(len(pdf)):
+            page = pdf[i]
+            # Spans close before each yield, so they never stay open in the consumer
+            with span("text_layer", page=i + 1):
+                page_text = extract_page_text(page) if text_fast_path else None
+            if page_text is not None:
+                page.close()
+                yield i, "text", page_text
+                continue
+            with span("render", page=i + 1) as phase:
+                img_bytes = encode_page(page, options, encode_stats)
+                phase.add("bytes_out", len(img_bytes))
+            page.close()
+            yield i, "image", img_bytes
+    finally:
+        pdf.close()
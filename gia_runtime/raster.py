@@ -0,0 +1,225 @@
+"""Multi-process PDF page rasterisation.
+
+pdfium rendering and image encoding (``gia_runtime.imaging``) are CPU-bound
+and hold the GIL, so a single script task renders on one core.
+``render_in_processes`` spreads the pages of a document over a process pool
+instead, handing workers short runs of consecutive page indices. Every
+worker opens the PDF on its own (pdfium handles are not shareable across
+processes) and keeps it open for further runs of the same file.
+
+The pool is started once per worker process (and size) and reused by every
+document, so only the first document of a worker pays for starting the
+render processes. Workers are started with the ``spawn`` method because the
+calling task may already run upload threads, which makes ``fork`` unsafe.
+
+Encoded pages come back through ``multiprocessing.shared_memory`` slots
+rather than pickled bytes. The calling process owns the slots: it creates
+them, names the slots a run should fill when it submits the run, copies
+each page out once, reuses the slot for a later run and closes and unlinks
+every slot when the document is done. Render processes only attach to the
+slots they are given. A page larger than its slot comes back pickled.
+
+Configuration (environment):
+
+- ``OCR_RENDER_PROCESSES``: render processes per task; 1 renders in-process
+  (default), 0 uses one process per CPU core
+- ``OCR_RENDER_PAGES_PER_TASK``: consecutive pages handed to a worker at once (2)
+- ``OCR_RENDER_SLOT_MB``: shared memory per rendered page (8); larger pages are pickled
+"""
+
+import collections
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from gia_runtime.imaging import encode_page, encoding_options
+
+_document = None
+_document_key = None
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def render_processes():
+    """Number of render processes requested through OCR_RENDER_PROCESSES."""
+    processes = int(os.environ.get("OCR_RENDER_PROCESSES", "1"))
+    if processes <= 0:
+        processes = os.cpu_count() or 1
+    return processes
+
+
+def _open_document(pdf_path):
+    """This worker's pdfium handle on ``pdf_path``, reopened when a run names another file."""
+    global _document, _document_key
+    info = os.stat(pdf_path)
+    # Temporary PDFs are deleted after their document; a later one may get the same name
+    key = (pdf_path, info.st_ino, info.st_mtime_ns)
+    if key != _document_key:
+        import pypdfium2 as pdfium
+
+        if _document is not None:
+            _document.close()
+            _document, _document_key = None, None
+        _document = pdfium.PdfDocument(pdf_path)
+        _document_key = key
+    return _document
+
+
+def _attach(name):
+    """Attach to a slot owned by the calling process."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the slot as well; spawned workers
+        # share the owner's resource tracker, so that registration is the owner's own
+        return shared_memory.SharedMemory(name=name)
+
+
+def _render_range(pdf_path, indices, slot_names, encode_options):
+    """Render and encode ``indices`` into ``slot_names``; return ``(index, size, data, stats)`` per page.
+
+    ``data`` is None when the page was written to its slot, or the encoded
+    bytes of a page too large for it.
+    """
+    document = _open_document(pdf_path)
+    rendered = []
+    for i, name in zip(indices, slot_names):
+        page = document[i]
+        page_stats = {}
+        try:
+            data = encode_page(page, encode_options, page_stats)
+        finally:
+            page.close()
+
+        slot = _attach(name)
+        try:
+            if len(data) <= slot.size:
+                slot.buf[:len(data)] = data
+                rendered.append((i, len(data), None, page_stats))
+            else:
+                rendered.append((i, len(data), data, page_stats))
+        finally:
+            slot.close()
+    return rendered
+
+
+def _get_pool(processes):
+    """The process-wide render pool with ``processes`` workers, started on first use."""
+    with _pools_lock:
+        pool = _pools.get(processes)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+            _pools[processes] = pool
+        return pool
+
+
+def _discard_pool(processes, pool):
+    """Forget a broken pool so the next document starts a new one."""
+    with _pools_lock:
+        if _pools.get(processes) is pool:
+            del _pools[processes]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_in_processes(pdf_path, plan, processes, encode_options=None, stats=None, pages_per_task=None):
+    """Yield ``(page_index, kind, payload)`` in page order, rasterising in a process pool.
+
+    ``plan`` yields ``(page_index, page_text)`` in page order, where
+    ``page_text`` is markdown for pages that need no rendering and None for
+    pages to rasterise. Text pages come back as ``(i, "text", page_text)``,
+    rendered pages as ``(i, "image", encoded_bytes)`` (see
+    ``gia_runtime.imaging.encode_page``; ``stats`` collects its sizes). At
+    most two runs per process are rendered ahead of the consumer, bounding
+    shared memory use.
+    """
+    encode_options = encode_options or encoding_options()
+    if pages_per_task is None:
+        pages_per_task = int(os.environ.get("OCR_RENDER_PAGES_PER_TASK", "2"))
+    pages_per_task = max(1, pages_per_task)
+    slot_bytes = max(1, int(float(os.environ.get("OCR_RENDER_SLOT_MB", "8")) * 1024 * 1024))
+    max_ahead = processes * 2
+
+    pool = _get_pool(processes)
+    slots = {}
+    free_slots = []
+    pending = collections.deque()
+    run = []
+
+    def take_slots(count):
+        names = []
+        while len(names) < count:
+            if free_slots:
+                names.append(free_slots.pop())
+                continue
+            slot = shared_memory.SharedMemory(create=True, size=slot_bytes)
+            slots[slot.name] = slot
+            names.append(slot.name)
+        return names
+
+    def submit_run():
+        names = take_slots(len(run))
+        future = pool.submit(_render_range, pdf_path, list(run), names, encode_options)
+        pending.append((None, (future, names)))
+        run.clear()
+
+    def in_flight():
+        return sum(1 for _, entry in pending if not isinstance(entry, str))
+
+    def drain(final=False):
+        while pending:
+            i, entry = pending[0]
+            if isinstance(entry, str):
+                pending.popleft()
+                yield i, "text", entry
+                continue
+            future, names = entry
+            if not (final or future.done() or in_flight() > max_ahead):
+                return
+            rendered = future.result()
+            pending.popleft()
+            for (page_index, size, data, page_stats), name in zip(rendered, names):
+                if data is None:
+                    data = bytes(slots[name].buf[:size])
+                free_slots.append(name)
+                if stats is not None:
+                    for key, value in page_stats.items():
+                        stats[key] = stats.get(key, 0) + value
+                yield page_index, "image", data
+
+    try:
+        for i, page_text in plan:
+            if page_text is None:
+                run.append(i)
+                if len(run) >= pages_per_task:
+                    submit_run()
+            else:
+                # A text page ends the current run so results stay in page order
+                if run:
+                    submit_run()
+                pending.append((i, page_text))
+            yield from drain()
+        if run:
+            submit_run()
+        yield from drain(final=True)
+    except BrokenProcessPool:
+        _discard_pool(processes, pool)
+        raise
+    finally:
+        # Consumer stopped early or a page failed: let runs still rendering finish
+        # before their slots go away
+        for _, entry in pending:
+            if isinstance(entry, str):
+                continue
+            future, _ = entry
+            if not future.cancel():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        for slot in slots.values():
+            slot.close()
+            slot.unlink()
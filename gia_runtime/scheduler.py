@@ -0,0 +1,403 @@
+"""Adaptive, rate-limit-aware scheduling of calls to rate-limited upstreams.
+
+Page OCR sends one vision or agent request per page. One request at a time
+leaves most of the upstream quota unused, while a fixed pool of parallel
+requests runs into 429s that used to end up as ``Error: HTTP 429`` in the
+OCR text. A ``Scheduler`` per upstream (the tool config or agent name) runs
+calls at an adaptive concurrency instead:
+
+- AIMD: each success raises the concurrency limit by ``1 / limit`` (about one
+  per round of requests); a 429, 5xx or timeout multiplies it by
+  ``decrease`` (0.7), at most once per round (only failures of requests
+  started after the last decrease count);
+- ``Retry-After`` pauses every caller of the upstream until it has passed;
+- a token bucket caps the request rate (``rate`` per second, ``burst``);
+- every call has a deadline: it is not started or retried past it, and the
+  remaining time is passed to the call as its timeout;
+- failures that mean the request was not processed (429, 503, a
+  connection that could not be established) are retried with jittered
+  exponential backoff (or the ``Retry-After`` delay). Other 5xx responses
+  and timeouts still lower the limit, but the request may have run (an
+  agent call, a vision call), so it is only re-sent when the caller marks
+  it ``idempotent``. Other errors and exhausted retries are raised to the
+  caller.
+
+Calls must see 429/5xx themselves, so requests should be made with
+``GiaClient.with_retries(0)`` rather than the retrying default session.
+``python -m gia_runtime.scheduler`` runs a local ``StandInUpstream`` with a
+fixed quota and compares sequential, fixed-pool and scheduled throughput.
+
+Configuration (environment):
+
+- ``GIA_RATE_LIMIT``: requests per second per upstream (4; 0 = unlimited),
+  ``GIA_RATE_LIMITS``: per-upstream overrides, e.g. ``OpenAI Vision=2,Image to Markdown=1.5``
+- ``GIA_SCHED_INITIAL`` / ``GIA_SCHED_MAX_CONCURRENCY``: starting and largest limit (2 / 16)
+- ``GIA_SCHED_RETRIES``: retries per call (5)
+- ``GIA_SCHED_DEADLINE``: seconds per call including retries (600)
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_schedulers = {}
+_registry_lock = threading.Lock()
+
+
+class TransientError(Exception):
+    """An upstream in trouble: throttling, a 5xx, or a timeout."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """A call ran out of time before it could complete."""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a ``Retry-After`` header (delta seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def check_response(response):
+    """Return ``response`` if it succeeded; raise ``TransientError`` for 429/5xx.
+
+    Other error statuses raise the usual ``raise_for_status`` error.
+    """
+    if response.status_code == 429 or response.status_code >= 500:
+        raise TransientError(
+            f"HTTP {response.status_code}",
+            status=response.status_code,
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+    response.raise_for_status()
+    return response
+
+
+# Statuses that mean the upstream did not process the request, so it can always be re-sent
+_UNPROCESSED_STATUSES = (429, 503)
+
+
+def _not_connected(error):
+    """True if ``error`` means no connection was made, so the request was never sent."""
+    if isinstance(error, ConnectionRefusedError):
+        return True
+    try:
+        import requests
+        from urllib3.exceptions import ConnectTimeoutError
+    except ImportError:
+        return False
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        # requests wraps urllib3's MaxRetryError, whose reason says where the attempt failed
+        return isinstance(getattr(error.args[0], "reason", None), (ConnectTimeoutError, ConnectionRefusedError))
+    return False
+
+
+def _is_timeout_or_disconnect(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        import requests
+    except ImportError:
+        return False
+    return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+def _transient(error, idempotent=False):
+    """``(status, retry_after, retry)`` if ``error`` shows upstream trouble, else None.
+
+    ``retry`` is true when the request can be sent again: always for
+    ``_UNPROCESSED_STATUSES`` and failed connections, for other 5xx
+    responses and timeouts only if the call is ``idempotent``.
+    """
+    if isinstance(error, TransientError):
+        status, retry_after = error.status, error.retry_after
+    else:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+        if status is not None:
+            if status != 429 and status < 500:
+                return None
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        elif _not_connected(error):
+            return None, None, True
+        elif _is_timeout_or_disconnect(error):
+            return None, None, idempotent
+        else:
+            return None
+    return status, retry_after, idempotent or status in _UNPROCESSED_STATUSES
+
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``burst`` banked; ``rate`` 0 means unlimited."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """Take one token, waiting for it; raises ``DeadlineExceeded`` if it would arrive too late."""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if deadline is not None and now + wait > deadline:
+                raise DeadlineExceeded("rate limit leaves no time before the deadline")
+            # Reserve the token now; waiters queue up behind each other
+            self._tokens -= 1
+        if wait:
+            time.sleep(wait)
+
+
+class Scheduler:
+    """Adaptive concurrency, rate limiting and retries for one upstream."""
+
+    def __init__(self, name, rate=4.0, burst=None, initial=2, max_concurrency=16,
+                 retries=5, deadline=600.0, backoff=0.5, decrease=0.7):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.limit = float(min(max(1, initial), self.max_concurrency))
+        self.retries = retries
+        self.deadline = deadline
+        self.backoff = backoff
+        self.decrease = decrease
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._stats = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "throttled": 0,
+                       "server_errors": 0, "timeouts": 0, "decreases": 0, "peak_in_flight": 0,
+                       "queued_seconds": 0.0}
+
+    def _acquire_slot(self, deadline):
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise DeadlineExceeded(f"{self.name}: no free slot before the deadline")
+                if now >= self._paused_until and self._in_flight < int(self.limit):
+                    break
+                wait = self._paused_until - now if now < self._paused_until else 0.5
+                self._cond.wait(min(wait, deadline - now))
+            self._in_flight += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+            self._stats["queued_seconds"] += time.monotonic() - started
+
+    def _release_slot(self, started, outcome, retry_after=None):
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if outcome == "ok":
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif outcome == "transient" and started >= self._last_decrease:
+                self.limit = max(1.0, self.limit * self.decrease)
+                self._last_decrease = now
+                self._stats["decreases"] += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            self._cond.notify_all()
+
+    def call(self, func, deadline=None, idempotent=False):
+        """Run ``func(timeout)`` under the schedule and return its result.
+
+        ``timeout`` is the time left before the deadline (``deadline``
+        seconds from now, ``GIA_SCHED_DEADLINE`` by default). Requests the
+        upstream did not process (429, 503, no connection) are retried; other
+        5xx responses and timeouts only when ``idempotent`` is true. The last
+        failure is raised when retries or time run out, and other exceptions
+        are raised at once.
+        """
+        deadline = time.monotonic() + (self.deadline if deadline is None else deadline)
+        with self._cond:
+            self._stats["calls"] += 1
+        attempt = 0
+        while True:
+            try:
+                self._acquire_slot(deadline)
+                self.bucket.acquire(deadline)
+            except DeadlineExceeded:
+                self._count("failed")
+                raise
+            started = time.monotonic()
+            try:
+                result = func(max(0.001, deadline - started))
+            except Exception as error:
+                transient = _transient(error, idempotent)
+                if transient is None:
+                    self._release_slot(started, "error")
+                    self._count("failed")
+                    raise
+                status, retry_after, retry = transient
+                self._count("throttled" if status == 429 else "server_errors" if status else "timeouts")
+                self._release_slot(started, "transient", retry_after)
+                if not retry:
+                    # The upstream may have run it; sending it again could do the work twice
+                    self._count("failed")
+                    raise
+                attempt += 1
+                delay = retry_after if retry_after is not None else (
+                    self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                if attempt > self.retries or time.monotonic() + delay >= deadline:
+                    self._count("failed")
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            self._release_slot(started, "ok")
+            self._count("succeeded")
+            return result
+
+    def _count(self, name):
+        with self._cond:
+            self._stats[name] += 1
+
+    def map(self, func, items, deadline=None, idempotent=False):
+        """Run ``func(item, timeout)`` for every item; returns ``[(result, error)]`` in input order."""
+        def run(item):
+            try:
+                return self.call(lambda timeout: func(item, timeout), deadline, idempotent), None
+            except Exception as error:
+                return None, error
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(run, items))
+
+    def stats(self):
+        """Counters plus the current concurrency ``limit``."""
+        with self._cond:
+            stats = dict(self._stats, limit=round(self.limit, 2), in_flight=self._in_flight)
+        stats["queued_seconds"] = round(stats["queued_seconds"], 3)
+        return stats
+
+
+def _rate_for(name):
+    for item in os.environ.get("GIA_RATE_LIMITS", "").split(","):
+        key, _, value = item.partition("=")
+        if key.strip() == name and value.strip():
+            return float(value)
+    return float(os.environ.get("GIA_RATE_LIMIT", "4"))
+
+
+def get_scheduler(name):
+    """The process-wide ``Scheduler`` for an upstream, created from the environment."""
+    with _registry_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            scheduler = Scheduler(
+                name,
+                rate=_rate_for(name),
+                initial=int(os.environ.get("GIA_SCHED_INITIAL", "2")),
+                max_concurrency=int(os.environ.get("GIA_SCHED_MAX_CONCURRENCY", "16")),
+                retries=int(os.environ.get("GIA_SCHED_RETRIES", "5")),
+                deadline=float(os.environ.get("GIA_SCHED_DEADLINE", "600")),
+            )
+            _schedulers[name] = scheduler
+        return scheduler
+
+
+class StandInUpstream:
+    """Local stand-in for a rate-limited service.
+
+    Accepts ``capacity`` concurrent requests, each taking ``latency``
+    seconds; requests beyond that are rejected at once with a 429
+    ``TransientError`` carrying ``retry_after`` (when set).
+    """
+
+    def __init__(self, capacity=6, latency=0.2, retry_after=None):
+        self.capacity = capacity
+        self.latency = latency
+        self.retry_after = retry_after
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, item, timeout=None):
+        with self._lock:
+            if self.active >= self.capacity:
+                self.rejected += 1
+                raise TransientError("HTTP 429", status=429, retry_after=self.retry_after)
+            self.active += 1
+        try:
+            time.sleep(min(self.latency, timeout or self.latency))
+            return f"page {item}"
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare sequential, fixed-pool and scheduled calls to a stand-in upstream.")
+    parser.add_argument("--requests", type=int, default=120, help="calls to make")
+    parser.add_argument("--capacity", type=int, default=6, help="upstream concurrent-request quota")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per upstream call")
+    parser.add_argument("--pool", type=int, default=16, help="threads of the fixed pool")
+    parser.add_argument("--rate", type=float, default=0.0, help="token bucket rate for the scheduler (0 = unlimited)")
+    args = parser.parse_args(argv)
+
+    items = list(range(args.requests))
+    ceiling = args.capacity / args.latency
+
+    upstream = StandInUpstream(args.capacity, args.latency)
+    started = time.perf_counter()
+    for item in items:
+        upstream(item)
+    sequential = time.perf_counter() - started
+    print(f"sequential: {args.requests / sequential:6.1f} calls/s, 0 errors")
+
+    upstream = StandInUpstream(args.capacity, args.latency)
+
+    def attempt(item):
+        try:
+            return upstream(item)
+        except TransientError as e:
+            return f"Error: {e}"
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.pool) as pool:
+        results = list(pool.map(attempt, items))
+    fixed = time.perf_counter() - started
+    errors = sum(result.startswith("Error") for result in results)
+    print(f"fixed pool of {args.pool}: {(args.requests - errors) / fixed:6.1f} successful calls/s, "
+          f"{errors} error results")
+
+    upstream = StandInUpstream(args.capacity, args.latency)
+    scheduler = Scheduler("stand-in", rate=args.rate, max_concurrency=args.pool, backoff=args.latency)
+    started = time.perf_counter()
+    results = scheduler.map(upstream, items)
+    scheduled = time.perf_counter() - started
+    errors = sum(error is not None for _, error in results)
+    print(f"scheduled: {args.requests / scheduled:6.1f} calls/s, {errors} error results, "
+          f"{upstream.rejected} upstream 429s retried (quota ceiling {ceiling:.1f} calls/s)")
+    print(scheduler.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""HTTP-aware cache of scraped pages for ``website_scraper``.
+
+Entries are keyed by normalised URL and hold the scraped title and content
+together with the ``ETag``/``Last-Modified`` validators of the navigation
+response. Within ``SCRAPE_CACHE_TTL`` seconds an entry is served directly.
+Past the TTL it is revalidated with a conditional GET (``If-None-Match`` /
+``If-Modified-Since``): a 304 answer, or a 200 answer with the same validators,
+renews the entry without a browser render; anything else means the page is
+rendered again.
+
+Storage is a ``gia_runtime.cache.DiskCache`` (size-bounded LRU), whose
+counters also record fresh hits, revalidations and renders for ``stats()``.
+"""
+
+import json
+import os
+import time
+import urllib.parse
+
+from gia_runtime.cache import DiskCache, private_dir
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalise_url(url):
+    """Canonical form of ``url`` used as the cache key."""
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def validators(headers):
+    """Pick the cache validators out of response headers."""
+    headers = {key.lower(): value for key, value in (headers or {}).items()}
+    return {"etag": headers.get("etag"), "last_modified": headers.get("last-modified")}
+
+
+class ScrapeCache:
+    """Scraped pages with TTL and conditional revalidation."""
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def lookup(self, url):
+        """Return ``(entry, fresh)`` for ``url``; entry is None on a miss."""
+        value = self.store.get(normalise_url(url))
+        if value is None:
+            return None, False
+        entry = json.loads(value)
+        return entry, time.time() - entry["fetched_at"] < self.ttl
+
+    def revalidate(self, url, entry, timeout=5):
+        """Ask the origin whether ``entry`` is still current; renew it if so."""
+        import requests
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                current = validators(response.headers)
+                unchanged = response.status_code == 304 or (
+                    response.ok and (current["etag"] or current["last_modified"])
+                    and current["etag"] == entry.get("etag")
+                    and current["last_modified"] == entry.get("last_modified")
+                )
+        except requests.RequestException:
+            return False
+        if unchanged:
+            self.store.increment("revalidated")
+            self.put(url, entry["page_title"], entry["page_content"], entry)
+        return bool(unchanged)
+
+    def put(self, url, page_title, page_content, response_validators=None):
+        response_validators = response_validators or {}
+        entry = {
+            "url": url,
+            "page_title": page_title,
+            "page_content": page_content,
+            "etag": response_validators.get("etag"),
+            "last_modified": response_validators.get("last_modified"),
+            "fetched_at": time.time(),
+        }
+        self.store.put(normalise_url(url), json.dumps(entry))
+
+    def record_render(self):
+        self.store.increment("renders")
+
+    def stats(self):
+        """Store stats plus ``revalidated``, ``renders`` and the overall ``hit_rate``."""
+        stats = self.store.stats()
+        stats.setdefault("revalidated", 0)
+        stats.setdefault("renders", 0)
+        lookups = stats["hits"] + stats["misses"]
+        # Fresh hits and successful revalidations both avoid a browser render
+        stats["hit_rate"] = round((lookups - stats["renders"]) / lookups, 4) if lookups else None
+        return stats
+
+    def close(self):
+        self.store.close()
+
+
+def open_scrape_cache():
+    """Open the scrape cache, or return None when disabled.
+
+    Cached pages can hold what a user scraped behind a login, so the store
+    lives in a directory private to the worker's user (SCRAPE_CACHE_DIR,
+    default <tmp>/gia_scrape_cache-<uid>) and the cache is disabled when it
+    is not. SCRAPE_CACHE=0 disables it, SCRAPE_CACHE_TTL sets the freshness
+    window in seconds (default one hour) and SCRAPE_CACHE_MAX_BYTES its size
+    bound.
+    """
+    if os.environ.get("SCRAPE_CACHE", "1").lower() not in ("1", "true", "yes"):
+        return None
+    cache_dir = private_dir("gia_scrape_cache", os.environ.get("SCRAPE_CACHE_DIR") or None)
+    if cache_dir is None:
+        return None
+    max_bytes = int(os.environ.get("SCRAPE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    store = DiskCache(os.path.join(cache_dir, "pages.sqlite3"), max_bytes)
+    return ScrapeCache(store, int(os.environ.get("SCRAPE_CACHE_TTL", 3600)))
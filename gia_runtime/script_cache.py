@@ -0,0 +1,272 @@
+"""Compiled code-object cache and warm start for script tasks.
+
+Script tasks used to be compiled from source on every execution, and heavy
+modules (Playwright, pypdfium2, requests) were imported by the first task
+that needed them in each worker. This module lets a worker:
+
+- ``load_code(path)``: get a script's code object, compiled once per content.
+  Code objects are kept in memory keyed by path, modification time and size,
+  and marshalled to ``GIA_SCRIPT_CACHE_DIR/<sha256 of the source>.pyc``
+  (behind the interpreter's bytecode magic) for other workers and restarts;
+- ``run_script(path, namespace)``: execute a script in the namespace holding
+  the workflow variables, timing compilation, the script's own ``import``
+  statements (including imports inside its functions) and the rest of its
+  execution separately;
+- ``prewarm()``: import the modules in ``GIA_PREWARM_MODULES`` and compile
+  every script under the given directories when the worker starts, so the
+  first task does not pay for them.
+
+Marshalled code is executed, so the disk cache lives in a directory only the
+worker's user can write (``GIA_SCRIPT_CACHE_DIR``, default
+``<tmp>/gia_script_cache-<uid>``, mode 0700; see ``gia_runtime.cache.private_dir``),
+and a cache file is only loaded when that user owns it and nobody else can
+write it. ``GIA_SCRIPT_CACHE=0`` disables the disk cache. ``script_stats()`` returns the
+accumulated timings per script, and ``python -m gia_runtime.script_cache``
+measures cold and warm runs of scripts.
+"""
+
+import builtins
+import hashlib
+import importlib
+import importlib.util
+import marshal
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from gia_runtime.cache import private_dir
+
+DEFAULT_PREWARM_MODULES = "requests,dotenv,pypdfium2,PIL.Image,playwright.sync_api,playwright.async_api"
+
+_memory = {}
+_timings = {}
+_lock = threading.Lock()
+
+
+def _trusted(cache_file):
+    """True if the open file is a regular file of this user that no one else can write."""
+    info = os.fstat(cache_file.fileno())
+    if not stat.S_ISREG(info.st_mode) or info.st_mode & 0o022:
+        return False
+    return not hasattr(os, "getuid") or info.st_uid == os.getuid()
+
+
+def read_marshalled(path):
+    """Load a value written by ``write_marshalled``, or None if missing, stale, corrupt or not trusted.
+
+    The file must belong to this user and not be writable by anyone else:
+    marshalled code objects run with the worker's privileges.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        with os.fdopen(fd, "rb") as cache_file:
+            if not _trusted(cache_file):
+                return None
+            if cache_file.read(len(importlib.util.MAGIC_NUMBER)) != importlib.util.MAGIC_NUMBER:
+                return None
+            return marshal.loads(cache_file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def write_marshalled(path, value):
+    """Atomically marshal ``value`` to ``path``, stamped with the bytecode magic; errors are ignored."""
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as cache_file:
+            cache_file.write(importlib.util.MAGIC_NUMBER)
+            cache_file.write(marshal.dumps(value))
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _cache_dir():
+    if os.environ.get("GIA_SCRIPT_CACHE", "1").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        return private_dir("gia_script_cache", os.environ.get("GIA_SCRIPT_CACHE_DIR") or None)
+    except OSError:
+        return None
+
+
+def load_code(path):
+    """Return ``(code, source)`` for a script, where source is "memory", "disk" or "compiled"."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _memory.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1], "memory"
+
+    with open(path, "rb") as script_file:
+        data = script_file.read()
+    cache_dir = _cache_dir()
+    cache_path = os.path.join(cache_dir, f"{hashlib.sha256(data).hexdigest()}.pyc") if cache_dir else None
+    code = read_marshalled(cache_path) if cache_path else None
+    if code is not None and getattr(code, "co_filename", None) == path:
+        origin = "disk"
+    else:
+        code = compile(data, path, "exec", dont_inherit=True)
+        origin = "compiled"
+        if cache_path:
+            write_marshalled(cache_path, code)
+    with _lock:
+        _memory[path] = (signature, code)
+    return code, origin
+
+
+def _timed_builtins(counter):
+    """A builtins dict whose ``__import__`` adds the time of each import to ``counter[0]``.
+
+    Only imports on the calling thread are counted. Worker threads the script
+    starts share its builtins, but their imports overlap the script's own
+    execution, so they belong to ``exec``; counting them would also make the
+    unlocked ``+=`` a race.
+    """
+    real_import = builtins.__import__
+    owner = threading.get_ident()
+
+    def timed_import(*args, **kwargs):
+        if threading.get_ident() != owner:
+            return real_import(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return real_import(*args, **kwargs)
+        finally:
+            counter[0] += time.perf_counter() - started
+
+    scoped = dict(builtins.__dict__)
+    scoped["__import__"] = timed_import
+    return scoped
+
+
+def run_script(path, namespace):
+    """Execute the script at ``path`` with ``namespace`` as its globals.
+
+    Variables the script defines are left in ``namespace``, as with the
+    engine's own execution. Returns the timings of this run in seconds:
+    ``compile`` (0 when the code object was cached), ``imports`` (on the
+    thread running the script) and ``exec`` (everything else), plus
+    ``code_source``.
+    """
+    started = time.perf_counter()
+    code, origin = load_code(path)
+    loaded = time.perf_counter()
+
+    import_time = [0.0]
+    namespace.setdefault("__name__", "__main__")
+    namespace.setdefault("__file__", os.path.abspath(path))
+    namespace["__builtins__"] = _timed_builtins(import_time)
+    try:
+        exec(code, namespace)
+    finally:
+        namespace["__builtins__"] = builtins
+        finished = time.perf_counter()
+        timings = {
+            "code_source": origin,
+            "compile": loaded - started,
+            "imports": import_time[0],
+            "exec": finished - loaded - import_time[0],
+        }
+        with _lock:
+            totals = _timings.setdefault(os.path.abspath(path), {"runs": 0, "compile": 0.0, "imports": 0.0, "exec": 0.0})
+            totals["runs"] += 1
+            for key in ("compile", "imports", "exec"):
+                totals[key] += timings[key]
+    return timings
+
+
+def prewarm(modules=None, script_dirs=()):
+    """Import heavy modules and compile scripts ahead of the first task.
+
+    ``modules`` defaults to the comma-separated ``GIA_PREWARM_MODULES``;
+    modules that are not installed are skipped. Returns the import time per
+    module (None when missing) and the number of scripts compiled.
+    """
+    if modules is None:
+        modules = os.environ.get("GIA_PREWARM_MODULES", DEFAULT_PREWARM_MODULES).split(",")
+    imported = {}
+    for name in (module.strip() for module in modules):
+        if not name:
+            continue
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception:
+            imported[name] = None
+            continue
+        imported[name] = time.perf_counter() - started
+
+    compiled = 0
+    for script_dir in script_dirs:
+        for root, dirs, files in os.walk(script_dir):
+            dirs[:] = [d for d in dirs if not d.startswith((".", "__"))]
+            for name in files:
+                if name.endswith(".py"):
+                    try:
+                        load_code(os.path.join(root, name))
+                        compiled += 1
+                    except (OSError, SyntaxError, ValueError):
+                        continue
+    return {"modules": imported, "scripts": compiled}
+
+
+def script_stats():
+    """Accumulated ``{path: {"runs", "compile", "imports", "exec"}}`` for scripts run in this process."""
+    with _lock:
+        return {path: dict(totals) for path, totals in _timings.items()}
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Time cold and warm runs of script tasks.")
+    parser.add_argument("scripts", nargs="+", help="script files")
+    parser.add_argument("--var", action="append", default=[], metavar="NAME=JSON",
+                        help="workflow variable passed to every script (repeatable)")
+    parser.add_argument("--prewarm", action="store_true", help="run prewarm() before the first run")
+    parser.add_argument("--repeat", type=int, default=100, help="warm runs per script")
+    args = parser.parse_args(argv)
+
+    variables = {}
+    for item in args.var:
+        name, _, value = item.partition("=")
+        try:
+            variables[name] = json.loads(value)
+        except ValueError:
+            variables[name] = value
+    if args.prewarm:
+        warmed = prewarm()
+        print("prewarmed: " + ", ".join(
+            f"{name} {seconds * 1000:.0f} ms" if seconds is not None else f"{name} missing"
+            for name, seconds in warmed["modules"].items()
+        ))
+
+    for path in args.scripts:
+        try:
+            cold = run_script(path, dict(variables))
+        except Exception as e:
+            print(f"{path}: {type(e).__name__}: {e}")
+            continue
+        warm_total = 0.0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            run_script(path, dict(variables))
+            warm_total += time.perf_counter() - started
+        print(f"{path}: cold compile {cold['compile'] * 1000:.2f} ms, imports {cold['imports'] * 1000:.2f} ms, "
+              f"exec {cold['exec'] * 1000:.2f} ms; warm {warm_total / args.repeat * 1e6:.0f} us/run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Local content-addressed blob spool shared by the script tasks on a worker.
+
+A task that produces page images (``convert_pdf_to_images``) stores each blob
+once under its SHA-256 digest and passes the digest on with the MinIO path it
+was uploaded to (``_page_sources``). Downstream tasks
+(``process_images_with_agent``) open the blob by digest as a read-only memory
+map instead of downloading it again, and fall back to the HTTP download only
+when the blob is not spooled on this worker. Blobs are never looked up by
+path: a path can be overwritten by a later upload, a digest always names the
+same bytes.
+
+Layout under the spool root::
+
+    blobs/<sha256>          blob contents, written atomically
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+
+from gia_runtime.cache import private_dir
+
+
+class BlobSpool:
+    """Content-addressed blob store."""
+
+    def __init__(self, root):
+        self.root = root
+        self._blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self._blob_dir, exist_ok=True)
+
+    def _write_atomic(self, target, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def blob_path(self, digest):
+        return os.path.join(self._blob_dir, digest)
+
+    def put(self, data):
+        """Store ``data`` (if not already present) and return its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.blob_path(digest)
+        if os.path.exists(target):
+            # Refresh mtime so prune() keeps blobs that are still being reused
+            os.utime(target)
+        else:
+            self._write_atomic(target, data)
+        return digest
+
+    def touch(self, digest):
+        """Mark the blob ``digest`` as in use so prune() keeps it; False if it is missing."""
+        try:
+            os.utime(self.blob_path(digest))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def open_blob(self, digest):
+        """Return a read-only memory map of the blob, or None if it is missing."""
+        try:
+            with open(self.blob_path(digest), "rb") as blob_file:
+                if os.fstat(blob_file.fileno()).st_size == 0:
+                    return None
+                return mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+    def prune(self, max_age):
+        """Remove blobs not modified within ``max_age`` seconds."""
+        cutoff = time.time() - max_age
+        for name in os.listdir(self._blob_dir):
+            path = os.path.join(self._blob_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def open_spool():
+    """Open the worker's blob spool, or return None when disabled.
+
+    The spool holds page images, so it lives in a directory private to the
+    worker's user (GIA_SPOOL_DIR, default <tmp>/gia_spool-<uid>) and is
+    disabled when it is not. GIA_SPOOL=0 disables it, and blobs older than
+    GIA_SPOOL_MAX_AGE seconds (default one day) are pruned when the spool is
+    opened.
+    """
+    if os.environ.get("GIA_SPOOL", "1").lower() not in ("1", "true", "yes"):
+        return None
+    root = private_dir("gia_spool", os.environ.get("GIA_SPOOL_DIR") or None)
+    if root is None:
+        return None
+    spool = BlobSpool(root)
+    spool.prune(int(os.environ.get("GIA_SPOOL_MAX_AGE", 24 * 3600)))
+    return spool
@@ -0,0 +1,315 @@
+"""Lightweight tracing of script-task phases.
+
+A script starts a trace for its run and wraps each phase (download, render,
+upload, vision call, ...) and each page in a span::
+
+    from gia_runtime.trace import span, start_trace
+
+    tracer = start_trace("dpr", task="ScriptTask_D09062")
+    with span("download", path=pdf_path) as phase:
+        data = client.download(pdf_path)
+        phase.add("bytes_in", len(data))
+    _metrics = tracer.finish()
+
+Spans nest through a context variable, so ``span()`` called anywhere below
+(``GiaClient.request`` records one span per HTTP request with its status,
+``gia_runtime.imaging.encode_page`` separates pdfium rendering from image
+encoding) attaches to the innermost open span. Outside a trace ``span()``
+does nothing. Thread pools do not inherit context variables; wrap the
+function handed to the pool with ``in_context`` to keep its spans under the
+span that was open when the work was submitted.
+
+``finish()`` appends the trace to ``GIA_TRACE_FILE`` as one line of
+OpenTelemetry's OTLP/JSON trace format (``resourceSpans``, as written by the
+collector's file exporter), and returns a per-phase summary (count,
+seconds, bytes in/out, errors) for the ``_metrics`` workflow variable.
+``python -m gia_runtime.trace`` aggregates p50/p95 per phase across runs.
+
+Configuration (environment):
+
+- ``GIA_TRACE``: ``0`` disables tracing (``finish()`` then returns None)
+- ``GIA_TRACE_FILE``: JSON lines file (``<tmp>/gia_traces/spans.jsonl``)
+- ``GIA_TRACE_MAX_BYTES``: size at which the file is rotated to ``.1`` (64 MB)
+"""
+
+import contextvars
+import json
+import math
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_current_tracer = contextvars.ContextVar("gia_tracer", default=None)
+_current_span = contextvars.ContextVar("gia_span", default=None)
+_write_lock = threading.Lock()
+
+
+def trace_file():
+    return os.environ.get("GIA_TRACE_FILE") or os.path.join(tempfile.gettempdir(), "gia_traces", "spans.jsonl")
+
+
+class Span:
+    """One timed operation; use as a context manager."""
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    def set(self, key, value):
+        """Set an attribute (e.g. ``http.status_code``)."""
+        if value is not None:
+            self.attributes[key] = value
+
+    def add(self, key, amount):
+        """Add to a numeric attribute (e.g. ``bytes_in``)."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def seconds(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def end(self, error=None):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.error = error
+            self.tracer._record(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.end(f"{exc_type.__name__}: {exc}" if exc_type is not None else None)
+        return False
+
+
+class _NoSpan:
+    """Stand-in returned by ``span()`` outside a trace."""
+
+    name = None
+    attributes = {}
+    seconds = 0.0
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount):
+        pass
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Spans of one script-task run, under a root span named after the service."""
+
+    def __init__(self, service, attributes=None):
+        self.service = service
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self._lock = threading.Lock()
+        self.root = Span(self, service, None, dict(attributes or {}))
+
+    def _record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def span(self, name, parent=None, **attributes):
+        return Span(self, name, parent or _current_span.get() or self.root, attributes)
+
+    def finish(self, path=None):
+        """End the root span, append the trace to the trace file and return the summary."""
+        self.root.end()
+        with self._lock:
+            spans = list(self.spans)
+        try:
+            write_otlp(self, spans, path or trace_file())
+        except OSError as e:
+            print(f"Could not write trace: {e}")
+        _current_tracer.set(None)
+        _current_span.set(None)
+        return summarise(self, spans)
+
+
+def start_trace(service, **attributes):
+    """Start tracing this task run; returns the ``Tracer``, or None with ``GIA_TRACE=0``."""
+    if os.environ.get("GIA_TRACE", "1").lower() not in ("1", "true", "yes"):
+        return None
+    tracer = Tracer(service, attributes)
+    _current_tracer.set(tracer)
+    _current_span.set(tracer.root)
+    return tracer
+
+
+def span(name, **attributes):
+    """A child span of the current span, or a no-op outside a trace."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, **attributes)
+
+
+def in_context(func):
+    """Wrap ``func`` to run in a copy of the caller's context (for thread pools)."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(tracer, span):
+    record = {
+        "traceId": tracer.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        record["parentSpanId"] = span.parent_id
+    return record
+
+
+def write_otlp(tracer, spans, path):
+    """Append ``spans`` as one OTLP/JSON ``resourceSpans`` line to ``path``."""
+    line = json.dumps({"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": tracer.service}}]},
+        "scopeSpans": [{
+            "scope": {"name": "gia_runtime.trace"},
+            "spans": [_otlp_span(tracer, span) for span in spans],
+        }],
+    }]}, default=str)
+    max_bytes = int(os.environ.get("GIA_TRACE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    with _write_lock:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+            os.replace(path, path + ".1")
+        with open(path, "a", encoding="utf-8") as trace:
+            trace.write(line + "\n")
+
+
+def summarise(tracer, spans):
+    """Per-phase count, seconds, bytes and errors of a finished trace (the ``_metrics`` value)."""
+    phases = {}
+    for span in spans:
+        if span is tracer.root:
+            continue
+        phase = phases.setdefault(span.name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                              "bytes_in": 0, "bytes_out": 0, "errors": 0})
+        phase["count"] += 1
+        phase["seconds"] += span.seconds
+        phase["max_seconds"] = max(phase["max_seconds"], span.seconds)
+        phase["bytes_in"] += span.attributes.get("bytes_in", 0)
+        phase["bytes_out"] += span.attributes.get("bytes_out", 0)
+        phase["errors"] += span.error is not None
+    for phase in phases.values():
+        phase["seconds"] = round(phase["seconds"], 4)
+        phase["max_seconds"] = round(phase["max_seconds"], 4)
+    return {
+        "trace_id": tracer.trace_id,
+        "service": tracer.service,
+        "seconds": round(tracer.root.seconds, 4),
+        "phases": phases,
+    }
+
+
+def read_spans(path):
+    """Yield ``(service, span)`` for every span in an OTLP/JSON lines file."""
+    with open(path, "r", encoding="utf-8") as trace:
+        for line in trace:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line).get("resourceSpans", []):
+                service = next((attribute["value"].get("stringValue")
+                                for attribute in resource_spans.get("resource", {}).get("attributes", [])
+                                if attribute["key"] == "service.name"), None)
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        yield service, span
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def aggregate(paths, service=None):
+    """``{(service, phase): {"count", "p50", "p95", "max", "errors"}}`` (seconds) over trace files."""
+    durations, errors = {}, {}
+    for path in paths:
+        for span_service, span in read_spans(path):
+            if service and span_service != service:
+                continue
+            key = (span_service, span["name"])
+            seconds = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e9
+            durations.setdefault(key, []).append(seconds)
+            errors[key] = errors.get(key, 0) + (span.get("status", {}).get("code") == 2)
+    result = {}
+    for key, values in durations.items():
+        values.sort()
+        result[key] = {
+            "count": len(values),
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "max": values[-1],
+            "errors": errors[key],
+        }
+    return result
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Aggregate p50/p95 span durations per phase across traced runs.")
+    parser.add_argument("files", nargs="*", help="OTLP/JSON lines files (default: GIA_TRACE_FILE)")
+    parser.add_argument("--service", help="only spans of this service (e.g. dpr)")
+    args = parser.parse_args(argv)
+
+    paths = args.files or [path for path in (trace_file() + ".1", trace_file()) if os.path.exists(path)]
+    rows = aggregate(paths, args.service)
+    print(f"{'service':<16} {'phase':<32} {'count':>6} {'p50 s':>9} {'p95 s':>9} {'max s':>9} {'errors':>6}")
+    for (service, phase), row in sorted(rows.items(), key=lambda item: (item[0][0] or "", -item[1]["p95"])):
+        print(f"{service or '-':<16} {phase:<32} {row['count']:>6} {row['p50']:>9.3f} {row['p95']:>9.3f} "
+              f"{row['max']:>9.3f} {row['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
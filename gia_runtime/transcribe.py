@@ -0,0 +1,257 @@
+"""Chunked, parallel speech transcription for uploaded recordings.
+
+Sending a whole patient video to Whisper as one request takes minutes and
+returns nothing until the very end. ``transcribe_media`` instead:
+
+1. extracts mono 16 kHz 16-bit audio with ``ffmpeg`` (a WAV file in that
+   format is used as is), typically a small fraction of the video's size;
+2. finds silences from per-frame amplitude and plans chunks of at most
+   ``WHISPER_CHUNK_SECONDS`` cut in the middle of a silence, falling back to a
+   hard cut when a stretch has no pause; chunks that are silent throughout
+   are skipped;
+3. transcribes up to ``WHISPER_CONCURRENCY`` chunks at a time with the given
+   ``transcriber(wav_bytes, chunk)`` callable, reporting each chunk as it
+   completes, and joins the texts in audio order.
+
+``StandInTranscriber`` replaces the remote service for local runs::
+
+    python -m gia_runtime.transcribe recording.mp4 --realtime-factor 0.05
+
+Configuration (environment):
+
+- ``WHISPER_CHUNK_SECONDS``: maximum chunk length (120)
+- ``WHISPER_MIN_CHUNK_SECONDS``: shortest chunk worth cutting at a silence (20)
+- ``WHISPER_SILENCE_DB``: frames quieter than this dBFS are silence (-40)
+- ``WHISPER_MIN_SILENCE``: shortest pause, in seconds, used as a cut point (0.3)
+- ``WHISPER_CONCURRENCY``: chunks transcribed at once (4)
+"""
+
+import array
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.02
+
+
+def settings():
+    """Chunking settings from the environment."""
+    return {
+        "max_chunk": float(os.environ.get("WHISPER_CHUNK_SECONDS", "120")),
+        "min_chunk": float(os.environ.get("WHISPER_MIN_CHUNK_SECONDS", "20")),
+        "silence_db": float(os.environ.get("WHISPER_SILENCE_DB", "-40")),
+        "min_silence": float(os.environ.get("WHISPER_MIN_SILENCE", "0.3")),
+        "concurrency": int(os.environ.get("WHISPER_CONCURRENCY", "4")),
+    }
+
+
+def _is_speech_wav(path):
+    try:
+        with wave.open(path, "rb") as wav:
+            return (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, SAMPLE_RATE)
+    except (wave.Error, EOFError, OSError):
+        return False
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def extract_audio(media_path, wav_path):
+    """Write ``media_path``'s audio to ``wav_path`` as mono 16 kHz 16-bit PCM."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is required to extract audio from media files")
+    subprocess.run(
+        [ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-i", media_path,
+         "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-acodec", "pcm_s16le", wav_path],
+        check=True,
+    )
+
+
+def frame_levels(wav_path):
+    """Mean absolute amplitude per ``FRAME_SECONDS`` frame of a mono 16-bit WAV file."""
+    levels = []
+    with wave.open(wav_path, "rb") as wav:
+        frame_samples = int(wav.getframerate() * FRAME_SECONDS)
+        while True:
+            data = wav.readframes(frame_samples * 500)
+            if not data:
+                break
+            samples = array.array("h")
+            samples.frombytes(data[:len(data) - len(data) % 2])
+            if sys.byteorder == "big":
+                samples.byteswap()
+            for start in range(0, len(samples), frame_samples):
+                frame = samples[start:start + frame_samples]
+                levels.append(sum(map(abs, frame)) / len(frame))
+    return levels
+
+
+def _threshold(silence_db):
+    return 32768 * 10 ** (silence_db / 20)
+
+
+def find_silences(levels, silence_db, min_silence):
+    """``(start, end)`` seconds of runs of quiet frames lasting at least ``min_silence``."""
+    threshold = _threshold(silence_db)
+    silences = []
+    run_start = None
+    for index, level in enumerate(levels + [threshold + 1]):
+        if level <= threshold:
+            if run_start is None:
+                run_start = index
+        elif run_start is not None:
+            if (index - run_start) * FRAME_SECONDS >= min_silence:
+                silences.append((run_start * FRAME_SECONDS, index * FRAME_SECONDS))
+            run_start = None
+    return silences
+
+
+def plan_chunks(duration, silences, max_chunk, min_chunk):
+    """Split ``[0, duration)`` into ``(start, end)`` chunks of at most ``max_chunk`` seconds.
+
+    Each chunk ends in the middle of the last silence that keeps it within
+    ``max_chunk`` and at least ``min_chunk`` long, or at ``max_chunk`` when
+    there is none. Silences covering a chunk boundary are not split further.
+    """
+    cuts = [(start + end) / 2 for start, end in silences]
+    chunks = []
+    start = 0.0
+    while duration - start > max_chunk:
+        candidates = [cut for cut in cuts if start + min_chunk <= cut <= start + max_chunk]
+        end = candidates[-1] if candidates else start + max_chunk
+        chunks.append((start, end))
+        start = end
+    if duration - start > 0:
+        chunks.append((start, duration))
+    return chunks
+
+
+def read_chunk(wav_path, start, end):
+    """WAV bytes of ``[start, end)`` seconds of ``wav_path``."""
+    with wave.open(wav_path, "rb") as wav:
+        rate = wav.getframerate()
+        wav.setpos(int(start * rate))
+        data = wav.readframes(int((end - start) * rate))
+        params = wav.getparams()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setparams(params)
+        out.writeframes(data)
+    return buffer.getvalue()
+
+
+class StandInTranscriber:
+    """Local stand-in for the speech service: sleeps ``realtime_factor`` x chunk length.
+
+    Returns ``[start-end s]`` markers, so ordering and coverage can be checked
+    without network access.
+    """
+
+    def __init__(self, realtime_factor=0.0):
+        self.realtime_factor = realtime_factor
+        self.calls = 0
+
+    def __call__(self, wav_bytes, chunk):
+        self.calls += 1
+        if self.realtime_factor:
+            time.sleep((chunk["end"] - chunk["start"]) * self.realtime_factor)
+        return f"[{chunk['start']:.1f}-{chunk['end']:.1f}s]"
+
+
+def transcribe_media(media_path, transcriber, options=None, on_chunk=None):
+    """Transcribe a recording chunk by chunk; returns ``(text, stats)``.
+
+    ``transcriber(wav_bytes, chunk)`` returns the text of one chunk, where
+    ``chunk`` has ``index``, ``start`` and ``end`` (seconds). ``on_chunk(chunk,
+    text)`` is called as each chunk completes, in completion order. A chunk
+    whose transcription fails fails the whole call after the others finish.
+    """
+    options = dict(settings(), **(options or {}))
+    started = time.perf_counter()
+    tmp_dir = tempfile.mkdtemp(prefix="gia_transcribe_")
+    try:
+        if _is_speech_wav(media_path):
+            wav_path = media_path
+        else:
+            wav_path = os.path.join(tmp_dir, "audio.wav")
+            extract_audio(media_path, wav_path)
+        with wave.open(wav_path, "rb") as wav:
+            duration = wav.getnframes() / wav.getframerate()
+
+        levels = frame_levels(wav_path)
+        silences = find_silences(levels, options["silence_db"], options["min_silence"])
+        chunks = [
+            {"index": index, "start": start, "end": end}
+            for index, (start, end) in enumerate(plan_chunks(duration, silences, options["max_chunk"], options["min_chunk"]))
+        ]
+        threshold = _threshold(options["silence_db"])
+        voiced = [
+            chunk for chunk in chunks
+            if any(level > threshold for level in levels[int(chunk["start"] / FRAME_SECONDS):int(chunk["end"] / FRAME_SECONDS)])
+        ]
+
+        texts = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as pool:
+            futures = {
+                pool.submit(lambda c: transcriber(read_chunk(wav_path, c["start"], c["end"]), c), chunk): chunk
+                for chunk in voiced
+            }
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    texts[chunk["index"]] = (future.result() or "").strip()
+                except Exception as e:
+                    errors[chunk["index"]] = e
+                    continue
+                if on_chunk is not None:
+                    on_chunk(chunk, texts[chunk["index"]])
+        if errors:
+            index, error = min(errors.items())
+            raise RuntimeError(f"Transcription failed for {len(errors)} of {len(voiced)} chunks "
+                               f"(chunk {index}: {error})") from error
+
+        stats = {
+            "duration": round(duration, 2),
+            "chunks": len(chunks),
+            "transcribed_chunks": len(voiced),
+            "audio_bytes": os.path.getsize(wav_path),
+            "media_bytes": os.path.getsize(media_path),
+            "elapsed": round(time.perf_counter() - started, 2),
+        }
+        return " ".join(texts[chunk["index"]] for chunk in voiced if texts[chunk["index"]]), stats
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chunk and transcribe a recording with a local stand-in transcriber.")
+    parser.add_argument("media", help="media or WAV file")
+    parser.add_argument("--realtime-factor", type=float, default=0.0,
+                        help="stand-in seconds per second of audio (e.g. 0.05)")
+    args = parser.parse_args(argv)
+
+    transcriber = StandInTranscriber(args.realtime_factor)
+    text, stats = transcribe_media(
+        args.media, transcriber,
+        on_chunk=lambda chunk, text: print(f"chunk {chunk['index']}: {text}", flush=True),
+    )
+    print(text)
+    print(stats)
+    if args.realtime_factor:
+        print(f"single request would take ~{stats['duration'] * args.realtime_factor:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
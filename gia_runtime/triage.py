@@ -0,0 +1,244 @@
+"""Local specialist triage for patient transcripts.
+
+The recording workflows used to ask the agent which specialist a patient
+should see, which costs a full LLM round trip even when the transcript says
+"itchy rash on my arm". ``classify`` scores a transcript with a small linear
+model instead: each specialist has weighted keyword patterns, a specialist's
+score is the sum of the weights of its patterns that occur (once each, and
+not after a negation such as "no fever"), and a softmax over the scores plus
+a fixed "unsure" score gives the confidence. Above ``TRIAGE_THRESHOLD`` the
+specialist is returned; otherwise ``specialist`` is None and the workflow
+falls back to the agent.
+
+The weights live in ``DEFAULT_MODEL``; ``TRIAGE_MODEL`` names a JSON file of
+the same shape (``{specialist: {pattern: weight}}``) to replace them.
+The workflows' ``triage_specialist`` script tasks call ``triage_transcript``.
+``python -m gia_runtime.triage transcripts.txt`` classifies one transcript
+per line and reports the fast-path rate and latency.
+
+Configuration (environment):
+
+- ``TRIAGE``: ``0`` sends every transcript to the agent
+- ``TRIAGE_THRESHOLD``: minimum confidence for the fast path (0.8)
+- ``TRIAGE_MODEL``: JSON weights replacing ``DEFAULT_MODEL``
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+
+# Score of the "none of the specialists" outcome; one strong keyword or a
+# few weak ones are needed to beat it.
+UNSURE_SCORE = 1.0
+
+DEFAULT_MODEL = {
+    "Dr. Priya": {
+        r"fever\w*|temperature": 2.5,
+        r"cough\w*": 2.0,
+        r"flu|common cold|caught a cold": 2.5,
+        r"body (?:ache|aches|pain)": 2.5,
+        r"chills|shivering": 2.0,
+        r"vomit\w*|nausea|diarrh\w*|stomach\w*": 2.0,
+        r"blood pressure": 2.0,
+        r"headaches?": 1.5,
+        r"fatigue|tired\w*|weak\w*": 1.0,
+    },
+    "Dr. Philip": {
+        r"diabet\w*": 4.0,
+        r"hba1c|a1c": 4.0,
+        r"thyroid|goit(?:er|re)": 4.0,
+        r"blood sugar|sugar levels?|glucose": 3.0,
+        r"insulin": 3.0,
+        r"pcos|polycystic": 3.0,
+        r"hormon\w*": 2.0,
+        r"thirst\w*": 2.0,
+        r"urinat\w*|peeing": 2.0,
+        r"metabolism": 1.5,
+        r"(?:gaining|losing|gain(?:ed)?|lost|los(?:s|ing)) (?:of )?weight|weight (?:gain|loss)": 1.5,
+    },
+    "Dr. Eleena": {
+        r"eczema|psoriasis": 4.0,
+        r"acne": 4.0,
+        r"pimples?": 3.0,
+        r"rash\w*": 3.0,
+        r"hives": 3.0,
+        r"warts?": 3.0,
+        r"fungal|ringworm": 3.0,
+        r"hair ?(?:loss|fall)|losing (?:my )?hair|bald\w*": 3.0,
+        r"moles?": 2.5,
+        r"skin": 2.0,
+        r"itch\w*": 2.0,
+        r"blisters?": 2.0,
+        r"dandruff|scalp": 2.0,
+        r"pigment\w*|dark spots": 2.0,
+    },
+    "Dr. Hima": {
+        r"cataracts?|glaucoma": 4.0,
+        r"conjunctivitis|pink eye": 4.0,
+        r"vision|eyesight": 3.0,
+        r"floaters": 3.0,
+        r"eyelids?|styes?": 3.0,
+        r"glasses|spectacles|contact lens\w*": 2.5,
+        r"eyes?": 2.0,
+        r"blurr\w*": 2.0,
+        r"squint\w*": 2.0,
+        r"watery|watering": 1.5,
+    },
+    "Dr. Eliyaz": {
+        r"tinnitus|ringing in (?:my |the )?ears?": 4.0,
+        r"tonsil\w*": 4.0,
+        r"ear ?aches?|ear pain|ear infections?": 3.0,
+        r"hearing": 3.0,
+        r"sinus\w*": 3.0,
+        r"nose ?bleeds?": 3.0,
+        r"ears?": 2.5,
+        r"throat": 2.5,
+        r"nose|nasal": 2.0,
+        r"swallow\w*": 2.0,
+        r"hoarse\w*|lost my voice": 2.0,
+        r"snor\w*": 2.0,
+        r"vertigo|dizz\w*": 1.5,
+    },
+}
+
+_NEGATIONS = frozenset((
+    "no", "not", "never", "without", "denies", "deny", "none",
+    "don't", "dont", "didn't", "didnt", "doesn't", "doesnt", "haven't", "havent", "hasn't", "hasnt",
+))
+_CLAUSE_END = re.compile(r"[.!?;,\n]|\bbut\b")
+_WORD = re.compile(r"[a-z']+")
+
+_models = {}
+_lock = threading.Lock()
+
+
+def settings():
+    """Triage settings from the environment."""
+    return {
+        "enabled": os.environ.get("TRIAGE", "1").lower() in ("1", "true", "yes"),
+        "threshold": float(os.environ.get("TRIAGE_THRESHOLD", "0.8")),
+        "model_path": os.environ.get("TRIAGE_MODEL") or None,
+    }
+
+
+def load_model(path=None):
+    """Compiled ``{specialist: [(regex, weight)]}`` for ``path`` (``DEFAULT_MODEL`` when None)."""
+    with _lock:
+        model = _models.get(path)
+    if model is not None:
+        return model
+    if path is None:
+        weights = DEFAULT_MODEL
+    else:
+        with open(path, "r", encoding="utf-8") as model_file:
+            weights = json.load(model_file)
+    model = {
+        specialist: [(re.compile(rf"\b(?:{pattern})\b"), float(weight)) for pattern, weight in patterns.items()]
+        for specialist, patterns in weights.items()
+    }
+    with _lock:
+        _models[path] = model
+    return model
+
+
+def _negated(text, position):
+    """True when one of the three words before ``position`` in the same clause negates it."""
+    clause_start = 0
+    for match in _CLAUSE_END.finditer(text, 0, position):
+        clause_start = match.end()
+    return any(word in _NEGATIONS for word in _WORD.findall(text, clause_start, position)[-3:])
+
+
+def score(text, specialists=None, model=None):
+    """``({specialist: score}, {specialist: [matched terms]})`` for a transcript.
+
+    ``specialists`` restricts the result to the workflow's own doctors.
+    """
+    model = model if model is not None else load_model(settings()["model_path"])
+    text = (text or "").lower()
+    scores, evidence = {}, {}
+    for specialist in specialists if specialists is not None else model:
+        total, matched = 0.0, []
+        for regex, weight in model.get(specialist, ()):
+            for match in regex.finditer(text):
+                if not _negated(text, match.start()):
+                    total += weight
+                    matched.append(match.group(0))
+                    break
+        scores[specialist] = total
+        evidence[specialist] = matched
+    return scores, evidence
+
+
+def classify(text, specialists=None, threshold=None, model=None):
+    """Pick a specialist for a transcript, if the model is confident enough.
+
+    Returns ``{"specialist", "best", "confidence", "scores", "evidence"}``:
+    ``best`` is the top-scoring specialist and ``confidence`` its softmax
+    probability against the others and the "unsure" outcome; ``specialist``
+    is ``best`` when ``confidence >= threshold`` (``TRIAGE_THRESHOLD`` by
+    default) and None otherwise, or always None with ``TRIAGE=0``.
+    """
+    options = settings()
+    threshold = options["threshold"] if threshold is None else threshold
+    scores, evidence = score(text, specialists, model)
+    best = max(scores, key=scores.get) if scores else None
+    if best is not None and not scores[best]:
+        best = None
+    confidence = 0.0
+    if best is not None:
+        top = max(max(scores.values()), UNSURE_SCORE)
+        total = math.exp(UNSURE_SCORE - top) + sum(math.exp(value - top) for value in scores.values())
+        confidence = math.exp(scores[best] - top) / total
+    return {
+        "specialist": best if options["enabled"] and confidence >= threshold else None,
+        "best": best,
+        "confidence": round(confidence, 4),
+        "scores": scores,
+        "evidence": evidence[best] if best is not None else [],
+    }
+
+
+def triage_transcript(text, specialists):
+    """``(specialist, confidence)`` for the ``triage_specialist`` script tasks, logging the evidence.
+
+    ``specialist`` is None when the workflow should ask the agent.
+    """
+    result = classify(text, specialists)
+    if result["best"]:
+        print(f"Triage: {result['best']} ({result['confidence']:.2f}) from {', '.join(result['evidence'])}")
+    return result["specialist"], result["confidence"]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Classify transcripts (one per line) with the local triage model.")
+    parser.add_argument("transcripts", help="text file with one transcript per line")
+    parser.add_argument("--specialists", help="comma-separated specialists to choose from (default: all)")
+    parser.add_argument("--threshold", type=float, help="confidence threshold (default: TRIAGE_THRESHOLD)")
+    args = parser.parse_args(argv)
+
+    specialists = [name.strip() for name in args.specialists.split(",")] if args.specialists else None
+    with open(args.transcripts, "r", encoding="utf-8") as transcripts_file:
+        transcripts = [line.strip() for line in transcripts_file if line.strip()]
+
+    load_model(settings()["model_path"])
+    fast = 0
+    started = time.perf_counter()
+    for transcript in transcripts:
+        result = classify(transcript, specialists, args.threshold)
+        fast += result["specialist"] is not None
+        label = result["specialist"] or f"agent (best {result['best']})"
+        print(f"{result['confidence']:.2f}  {label:<28}  {transcript[:70]}")
+    elapsed = time.perf_counter() - started
+    if transcripts:
+        print(f"fast path {fast}/{len(transcripts)} ({fast / len(transcripts):.0%}), "
+              f"{elapsed / len(transcripts) * 1e6:.0f} us/transcript")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,112 +1,378 @@
-"""Converts uploaded PDF to images. | Inputs: pdf_file, token | Outputs: images_data, pdf_name"""
+"""Converts uploaded PDF to images. | Inputs: pdf_file, token | Outputs: images_data, pdf_name, ocr_results (pipelined mode), _page_sources, _ocr_document, _metrics"""
 
-def convert_pdf(pdf_input, auth_token):
-    import pypdfium2 as pdfium
-    import io
+def get_file_info(data):
+    path = None
+    name = "document.pdf"
+
+    if isinstance(data, list) and len(data) > 0:
+        data = data[0]
+
+    if isinstance(data, dict):
+        path = data.get('file_path') or data.get('path')
+        name = data.get('filename') or data.get('name') or name
+    else:
+        try:
+            path = getattr(data, 'file_path', None) or getattr(data, 'path', None)
+            name = getattr(data, 'filename', None) or getattr(data, 'name', None) or name
+        except Exception:
+            pass
+    return path, name
+
+def checkpoint_key(local_pdf_path):
+    """OCR checkpoint key of the downloaded PDF: a hash of its content, not of its path."""
+    from gia_runtime.checkpoint import content_key
+
+    return content_key(local_pdf_path, "pdf_ocr")
+
+def open_pdf(client, file_path):
+    """Download the PDF; use as ``with open_pdf(...) as local_pdf_path``, the file is removed afterwards."""
+    from gia_runtime.pdf import downloaded_pdf
+
+    return downloaded_pdf(client, file_path)
+
+def convert_pdf(local_pdf_path, text_fast_path=True, render_processes=1, encode_stats=None):
+    """Returns a lazy iterator over the pages of the downloaded PDF (see gia_runtime.pdf.render_pages)."""
+    from gia_runtime.pdf import render_pages
+
+    return render_pages(local_pdf_path, text_fast_path, render_processes, encode_stats)
+
+def page_upload_target(pdf_name, origin_path, page_index, extension="png"):
+    """Folder next to the PDF where page images go, and the page's file name."""
     import os
-    import requests
-    import urllib.parse
-
-    def get_file_info(data):
-        path = None
-        name = "document.pdf"
-        
-        if isinstance(data, list) and len(data) > 0:
-            data = data[0]
-        
-        if isinstance(data, dict):
-            path = data.get('file_path') or data.get('path')
-            name = data.get('filename') or data.get('name') or name
+
+    # Get the folder where the PDF is located
+    extracted_folder = f"{os.path.dirname(origin_path)}/extracted_files"
+    safe_name = os.path.splitext(pdf_name)[0]
+    return extracted_folder, f"{safe_name}_page_{page_index+1}.{extension}"
+
+def page_file(pdf_name, origin_path, page_index, img_bytes):
+    """Multipart ``(filename, data, content_type)`` for a page image."""
+    from gia_runtime.imaging import image_type
+
+    extension, content_type = image_type(img_bytes)
+    return page_upload_target(pdf_name, origin_path, page_index, extension)[1], img_bytes, content_type
+
+def upload_page(client, img_bytes, page_index, pdf_name, origin_path):
+    """Upload a single page image to MinIO and return its path."""
+    from gia_runtime.trace import span
+
+    folder = page_upload_target(pdf_name, origin_path, page_index)[0]
+    with span("upload", page=page_index + 1, bytes_out=len(img_bytes)):
+        uploaded = client.upload_files(folder, [page_file(pdf_name, origin_path, page_index, img_bytes)])
+    return uploaded[0] if uploaded else None
+
+def upload_images_to_minio(client, pages, pdf_name, origin_path, cache=None, spool=None, concurrency=4):
+    """Upload extracted images to MinIO.
+
+    Returns the list of uploaded paths and the ordered page sources, one
+    ``{"page": n, "image": path}`` or ``{"page": n, "text": markdown}`` per page.
+    Pages whose OCR result is already cached are not uploaded.
+
+    Pages are uploaded in multipart batches by a background pool while
+    rendering continues. With a spool, each page is written to the local blob
+    spool first (so the pool reads it from disk rather than holding it in
+    memory) and its source carries the blob's ``digest``, letting the next
+    task read exactly these bytes without downloading them again.
+    """
+    import os
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from gia_runtime.trace import in_context, span
+
+    batch_size = max(1, int(os.environ.get("GIA_UPLOAD_BATCH_SIZE", "8")))
+    in_flight = threading.BoundedSemaphore((concurrency + 1) * batch_size)
+
+    def upload_batch(batch):
+        folder = page_upload_target(pdf_name, origin_path, 0)[0]
+        blobs = []
+        files = []
+        try:
+            for i, img_bytes, digest in batch:
+                if digest is not None:
+                    img_bytes = spool.open_blob(digest)
+                    blobs.append(img_bytes)
+                files.append(page_file(pdf_name, origin_path, i, img_bytes))
+            with span("upload", pages=len(files)) as phase:
+                phase.add("bytes_out", sum(len(data) for _, data, _ in files))
+                uploaded = client.upload_files(folder, files, batch_size=len(files))
+        finally:
+            for blob in blobs:
+                blob.close()
+        return {i: (uploaded_path, digest) for (i, _, digest), uploaded_path in zip(batch, uploaded)}
+
+    def release(batch_len):
+        for _ in range(batch_len):
+            in_flight.release()
+
+    pending = []
+    batch_futures = []
+    batch = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def submit_batch():
+            if batch:
+                future = pool.submit(in_context(upload_batch), list(batch))
+                future.add_done_callback(lambda _f, n=len(batch): release(n))
+                batch_futures.append(future)
+                batch.clear()
+
+        for i, kind, payload in pages:
+            if kind == "text":
+                pending.append((i, payload))
+                continue
+            cached_text = lookup_cached_ocr(cache, payload)
+            if cached_text is not None:
+                pending.append((i, cached_text))
+                continue
+            digest = spool.put(payload) if spool is not None else None
+            in_flight.acquire()
+            batch.append((i, None if digest else payload, digest))
+            pending.append((i, None))
+            if len(batch) >= batch_size:
+                submit_batch()
+        submit_batch()
+
+    uploaded_by_page = {}
+    for future in batch_futures:
+        uploaded_by_page.update(future.result())
+
+    uploaded_paths = []
+    page_sources = []
+    for i, page_text in pending:
+        if page_text is not None:
+            page_sources.append({"page": i + 1, "text": page_text})
+            continue
+        uploaded_path, digest = uploaded_by_page.get(i, (None, None))
+        if uploaded_path:
+            uploaded_paths.append(uploaded_path)
         else:
-            try:
-                path = getattr(data, 'file_path', None) or getattr(data, 'path', None)
-                name = getattr(data, 'filename', None) or getattr(data, 'name', None) or name
-            except Exception:
-                pass
-        return path, name
+            print(f"Upload of page {i + 1} returned no file path")
+        # Kept without a path too: process_images_with_agent OCRs it from the spool or reports it failed
+        source = {"page": i + 1, "image": uploaded_path or ""}
+        if digest is not None:
+            source["digest"] = digest
+        page_sources.append(source)
+
+    return uploaded_paths, page_sources
+
+def get_ocr_request():
+    """Agent name and prompt used for page OCR (also part of the cache key)."""
+    return {
+        "agent_name": "Image to Markdown",
+        "prompt": "Perform OCR on the attached image. Return only the result text in markdown format without any comments. Preserve tabular formats if any."
+    }
+
+def open_cache():
+    """Open the shared OCR result cache, or None when disabled (OCR_CACHE=0)."""
+    from gia_runtime.cache import open_ocr_cache
+
+    return open_ocr_cache()
+
+def open_local_spool():
+    """Open the worker's blob spool, or None when disabled (GIA_SPOOL=0)."""
+    from gia_runtime.spool import open_spool
+
+    return open_spool()
+
+def lookup_cached_ocr(cache, img_bytes):
+    """Return the cached OCR markdown for this rendered page, or None."""
+    if cache is None:
+        return None
+    from gia_runtime.cache import ocr_cache_key
+
+    data = get_ocr_request()
+    return cache.get(ocr_cache_key(img_bytes, data["prompt"], data["agent_name"]))
+
+def ocr_page(client, img_bytes, page_index, cache=None):
+    """Send one page image to the OCR agent and return its markdown.
+
+    The call goes through the agent's shared scheduler (gia_runtime.scheduler),
+    which bounds concurrent calls adaptively and retries 429/503 responses and
+    refused connections (a call that may have run is not sent again).
+    """
+    from gia_runtime.imaging import image_type
+    from gia_runtime.scheduler import get_scheduler
+    from gia_runtime.trace import span
+
+    data = get_ocr_request()
+    extension, content_type = image_type(img_bytes)
+    files = [(f'page_{page_index+1}.{extension}', img_bytes, content_type)]
+    # No transport-level retries: the scheduler has to see 429s to back off
+    agent_client = client.with_retries(0)
+    connect_timeout, read_timeout = client.timeout
+    with span("ocr", page=page_index + 1) as phase:
+        markdown_text = get_scheduler(data["agent_name"]).call(lambda timeout: agent_client.run_agent(
+            data["agent_name"], data["prompt"], files, timeout=(connect_timeout, min(read_timeout, timeout))
+        ))
+        phase.add("bytes_in", len(markdown_text.encode("utf-8")))
+
+    if cache is not None:
+        from gia_runtime.cache import ocr_cache_key
+
+        cache.put(ocr_cache_key(img_bytes, data["prompt"], data["agent_name"]), markdown_text)
+    return markdown_text
+
+def run_pipeline(client, pdf_input, concurrency, text_fast_path=True, cache=None, spool=None, render_processes=1, encode_stats=None):
+    """Render, upload and OCR pages as overlapping stages.
+
+    The main thread renders pages (pdfium is not thread-safe) while a bounded
+    pool uploads and OCRs the pages already rendered, so page N is being OCR'd
+    while page N+1 uploads and page N+2 renders. At most ``2 * concurrency``
+    rendered pages wait in memory. Born-digital pages and pages with a cached
+    OCR result skip upload and OCR. Page order is preserved in the results.
+    Returns the uploaded paths, page sources, markdown, PDF name and path,
+    checkpoint key and the page numbers whose OCR failed.
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from gia_runtime.trace import in_context
 
     file_path, pdf_name = get_file_info(pdf_input)
-    images_data = []
-
-    if file_path:
-        # Download from MinIO via API
-        api_host = os.environ.get("CLIENT_URL", "http://localhost:4000")
-        headers = {"Authorization": f"Bearer {auth_token}"}
-        
-        encoded_path = '/'.join(urllib.parse.quote(segment, safe='') for segment in file_path.split('/'))
-        url = f"{api_host.rstrip('/')}/api/download/{encoded_path}"
-        response = requests.get(url, headers=headers, stream=True)
-        response.raise_for_status()
-
-        # Load PDF from bytes
-        pdf = pdfium.PdfDocument(response.content)
-        for i in range(len(pdf)):
-            page = pdf[i]
-            # scale=1 is ~72 DPI, scale=2 is ~144 DPI
-            bitmap = page.render(
-                scale=2,  # Higher resolution
-                rotation=0,
-            )
-            pil_image = bitmap.to_pil()
-            img_byte_arr = io.BytesIO()
-            # Save with maximum quality and no compression
-            pil_image.save(img_byte_arr, format='PNG', optimize=False, compress_level=0)
-            images_data.append(img_byte_arr.getvalue())
-            
-    return images_data, pdf_name, file_path
-
-def upload_images_to_minio(images_data, pdf_name, origin_path, auth_token):
-    """Upload extracted images to MinIO and return the list of uploaded paths."""
-    import os
-    import requests
-    import urllib.parse
-    
+    if not file_path:
+        return [], [], "", pdf_name, file_path, None, []
+
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+
+    def process_page(img_bytes, index):
+        cached_text = lookup_cached_ocr(cache, img_bytes)
+        if cached_text is not None:
+            return None, None, cached_text, False
+        uploaded_path = upload_page(client, img_bytes, index, pdf_name, file_path)
+        digest = spool.put(img_bytes) if uploaded_path and spool is not None else None
+        try:
+            markdown_text = ocr_page(client, img_bytes, index, cache)
+        except Exception as e:
+            print(f"Error processing page {index+1} ({uploaded_path}): {e}")
+            return uploaded_path, digest, f"<!-- Error processing page {index+1}: {str(e)} -->", True
+        return uploaded_path, digest, markdown_text, False
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, open_pdf(client, file_path) as local_pdf_path:
+        document = checkpoint_key(local_pdf_path)
+        for i, kind, payload in convert_pdf(local_pdf_path, text_fast_path, render_processes, encode_stats):
+            if kind == "text":
+                futures.append((i, None, payload))
+                continue
+            in_flight.acquire()
+            future = pool.submit(in_context(process_page), payload, i)
+            future.add_done_callback(lambda _f: in_flight.release())
+            futures.append((i, future, None))
+
     uploaded_paths = []
-    
-    # Get the folder where the PDF is located
-    pdf_folder = os.path.dirname(origin_path)
-    extracted_folder = f"{pdf_folder}/extracted_files"
-    
-    # API endpoint for upload (use the path-based endpoint)
-    api_host = os.environ.get("CLIENT_URL", "http://localhost:4000")
-    headers = {"Authorization": f"Bearer {auth_token}"}
-    
-    for i, img_bytes in enumerate(images_data):
-        safe_name = os.path.splitext(pdf_name)[0]
-        img_filename = f"{safe_name}_page_{i+1}.png"
-        
-        # Encode the path for the URL
-        encoded_path = urllib.parse.quote(extracted_folder, safe='')
-        upload_url = f"{api_host.rstrip('/')}/api/upload/{encoded_path}"
-        
-        # Prepare multipart form data (just the file)
-        files = {
-            'files': (img_filename, img_bytes, 'image/png')
-        }
-        response = requests.post(upload_url, headers=headers, files=files)
-        response.raise_for_status()
-        result = response.json()
-        uploaded_files = result.get('files', [])
-        if uploaded_files:
-            uploaded_path = uploaded_files[0].get('path', '')
+    page_sources = []
+    results = []
+    failed = []
+    for i, future, page_text in futures:
+        if future is None:
+            page_sources.append({"page": i + 1, "text": page_text})
+            results.append(page_text)
+            continue
+        uploaded_path, digest, markdown_text, page_failed = future.result()
+        if page_failed:
+            failed.append(i + 1)
+        if uploaded_path:
             uploaded_paths.append(uploaded_path)
-    
-    return uploaded_paths
+            page_sources.append({"page": i + 1, "image": uploaded_path, "digest": digest} if digest
+                                else {"page": i + 1, "image": uploaded_path})
+        else:
+            page_sources.append({"page": i + 1, "text": markdown_text})
+        results.append(markdown_text)
+
+    return uploaded_paths, page_sources, "\n\n".join(results), pdf_name, file_path, document, failed
+
+def get_pipeline_config():
+    """Read OCR settings from the environment.
+
+    OCR_PIPELINE=1 overlaps render, upload and OCR in this task;
+    OCR_CONCURRENCY bounds the number of pages uploaded/OCR'd at once;
+    OCR_TEXT_FAST_PATH=0 sends born-digital pages to vision OCR as well;
+    OCR_RENDER_PROCESSES rasterises pages in a process pool (see gia_runtime.raster).
+    """
+    import os
+    from gia_runtime.raster import render_processes
+
+    enabled = os.environ.get("OCR_PIPELINE", "0").lower() in ("1", "true", "yes")
+    concurrency = max(1, int(os.environ.get("OCR_CONCURRENCY", "4")))
+    text_fast_path = os.environ.get("OCR_TEXT_FAST_PATH", "1").lower() in ("1", "true", "yes")
+    return enabled, concurrency, text_fast_path, render_processes()
+
+def summarise_encoding(stats):
+    """Log and return the bytes saved by compact page encoding for this document."""
+    from gia_runtime.imaging import summarise
+
+    stats = summarise(stats)
+    if stats.get("pages"):
+        print(
+            f"Encoded {stats['pages']} page images: {stats['encoded_bytes']} bytes "
+            f"instead of {stats['baseline_bytes']} ({stats['bytes_saved']} bytes saved)"
+        )
+    return stats
+
+def start_tracing():
+    """Phase and page timings of this run (see gia_runtime.trace), or None when disabled."""
+    from gia_runtime.trace import start_trace
+
+    return start_trace("pdf_ocr", task="convert_pdf_to_images")
+
+def get_client(auth_token):
+    """Pooled GIA API client (keep-alive, timeouts, retries) shared across tasks."""
+    from gia_runtime.client import GiaClient
+
+    return GiaClient(auth_token, files_route="/api")
 
 # Main block
+_tracer = start_tracing()
 try:
     current_token = user["token"]
-    
-    # 1. Convert PDF to List of Bytes
-    raw_images, pdf_filename, pdf_path = convert_pdf(pdf_file, current_token)
-    
-    # 2. Upload those bytes to MinIO so they have paths
-    images_data = upload_images_to_minio(raw_images, pdf_filename, pdf_path, current_token)
-    
+    _client = get_client(current_token)
+    _pipeline_enabled, _concurrency, _text_fast_path, _render_processes = get_pipeline_config()
+    _cache = open_cache()
+    _spool = open_local_spool()
+    _encode_stats = {}
+
+    if _pipeline_enabled:
+        images_data, _page_sources, ocr_results, pdf_filename, pdf_path, _ocr_document, _failed = run_pipeline(
+            _client, pdf_file, _concurrency, _text_fast_path, _cache, _spool, _render_processes, _encode_stats
+        )
+        # Lets process_images_with_agent reuse these results instead of re-running OCR;
+        # with failed pages it OCRs the document itself (and fails while pages keep failing)
+        _ocr_results_for = None if _failed else images_data
+        if _failed:
+            print(f"OCR failed for pages {_failed}; process_images_with_agent retries them")
+        del _failed
+    else:
+        pdf_path, pdf_filename = get_file_info(pdf_file)
+        images_data, _page_sources, _ocr_document = [], [], None
+        if pdf_path:
+            # The local copy is removed when this block ends, whether or not rendering started
+            with open_pdf(_client, pdf_path) as _local_pdf:
+                _ocr_document = checkpoint_key(_local_pdf)
+                # 1. Convert PDF to a lazy stream of pages (text layer or page image)
+                raw_images = convert_pdf(_local_pdf, _text_fast_path, _render_processes, _encode_stats)
+
+                # 2. Spool each page image locally and upload it to MinIO in batches in the
+                # background while rendering continues. _page_sources tells
+                # process_images_with_agent which pages already have text.
+                images_data, _page_sources = upload_images_to_minio(
+                    _client, raw_images, pdf_filename, pdf_path, _cache, _spool, _concurrency
+                )
+                raw_images.close()
+                del raw_images
+            del _local_pdf
+        _ocr_results_for = None
+
+    if _cache is not None:
+        _ocr_cache_stats = _cache.stats()
+        _cache.close()
+    _image_encoding_stats = summarise_encoding(_encode_stats)
+    del _cache, _spool, _client, _encode_stats
+
     # Provide pdf_name for downstream
     pdf_name = pdf_filename
-    
+
 except Exception as e:
     import traceback
     traceback.print_exc()
     raise
+finally:
+    _metrics = _tracer.finish() if _tracer is not None else None
+    del _tracer
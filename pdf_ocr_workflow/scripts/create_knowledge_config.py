@@ -1,10 +1,6 @@
 """Creates knowledge config from OCR results. | Inputs: ocr_results, pdf_name, token | Outputs: upload_response"""
 
-def create_config(results, name, auth_token_val):
-    import requests
-    import json
-    import io
-
+def create_config(client, results, name):
     # results is now a single markdown string
     markdown_content = f"# {name}\n\n{results}"
 
@@ -16,54 +12,53 @@ def create_config(results, name, auth_token_val):
         "overwrite": True
     }
 
-    base_url = "http://localhost:8000"
-    
     # Safe collection name
     collection_name = name.replace(" ", "_").replace(".", "_") 
 
-    files = {
-        'files': ('memory_doc.md', markdown_content, 'text/markdown')
-    }
-
-    data = {
-        'payload': json.dumps(config_payload)
-    }
+    # Upload only the chunks that changed since the collection was last indexed
+    # (a reviewer's correction in validate_ocr re-embeds one chunk, not the document)
+    manifest = open_manifest()
+    if manifest is not None:
+        from gia_runtime.knowledge import sync_document
 
-    params = {
-        'collection': collection_name
-    }
+        try:
+            sync = sync_document(client, collection_name, config_payload, name, results, manifest)
+            print(f"Knowledge sync ({sync['mode']}): {sync['uploaded']} of {sync['chunks']} chunks uploaded, "
+                  f"{sync['deleted']} deleted, {sync['unchanged']} unchanged, {sync['stale']} outdated left for the next sync")
+            return sync
+        except Exception as e:
+            return f"Error: {e}"
+        finally:
+            manifest.close()
 
-    headers = {
-        'Authorization': f'Bearer {auth_token_val}'
-    }
+    files = [('memory_doc.md', markdown_content, 'text/markdown')]
 
-    try:       
-        import os
-        api_host = os.environ.get("CLIENT_URL", "http://localhost:4000")
-        
-        # Override base_url to be safe and consistent with the "complete" script reference
-        url = f"{api_host.rstrip('/')}/api/knowledge/upload"
-        
-        response = requests.post(
-            url,
-            params=params,
-            headers=headers,
-            data=data,
-            files=files
-        )
-        response.raise_for_status()
-        return response.json()
+    try:
+        return client.upload_knowledge(collection_name, config_payload, files)
     except Exception as e:
         return f"Error: {e}"
 
+def open_manifest():
+    """Open the knowledge manifest for incremental uploads, or None when disabled (KNOWLEDGE_INCREMENTAL=0)."""
+    from gia_runtime.knowledge import open_manifest as open_knowledge_manifest
+
+    return open_knowledge_manifest()
+
+def get_client(auth_token):
+    """Pooled GIA API client (keep-alive, timeouts, retries) shared across tasks."""
+    from gia_runtime.client import GiaClient
+
+    return GiaClient(auth_token, files_route="/api")
+
 # Main block
 try:
     current_token = user["token"]
 
     # ocr_results is the markdown string from the User Task (or previous step)
     # pdf_name is passed through
-    
-    upload_response = create_config(ocr_results, pdf_name, current_token)
+    _client = get_client(current_token)
+    upload_response = create_config(_client, ocr_results, pdf_name)
+    del _client
     
 except Exception as e:
     import traceback
@@ -1,62 +1,199 @@
-"""Processes images with AI agent. | Inputs: images_data, token | Outputs: ocr_results"""
+"""Processes images with AI agent. | Inputs: images_data, _page_sources, _ocr_document, token | Outputs: ocr_results, _ocr_retry_pages, _metrics"""
 
-def process_images(image_paths, auth_token_val):
-    import requests
-    import io
+OCR_AGENT_NAME = "Image to Markdown"
+
+def process_images(client, image_paths, page_sources=None, cache=None, spool=None, checkpoint=None, document=None):
+    """OCR the page images and return the assembled markdown and the failed page numbers.
+
+    With a checkpoint, each page result is persisted as soon as it completes
+    and failed pages go to the retry set, so a re-executed task only OCRs the
+    pages that are missing or failed last time. ``document`` is the
+    checkpoint key convert_pdf_to_images derived from the PDF's content;
+    without it the key falls back to the page image paths.
+    """
     import os
-    import urllib.parse
-    
-    results = []
-    
-    # Get API host from environment variable
-    api_host = os.environ.get("CLIENT_URL", "http://localhost:4000")
-    
-    # Agent Runtime URL
-    run_url = f"{api_host.rstrip('/')}/api/agent-runtime/run"
-    
-    headers = {"Authorization": f"Bearer {auth_token_val}"}
-
-    for i, img_path in enumerate(image_paths):
-        # 1. Download the image first to get bytes
-        encoded_path = '/'.join(urllib.parse.quote(segment, safe='') for segment in img_path.split('/'))
-        download_url = f"{api_host.rstrip('/')}/api/download/{encoded_path}"
-        
+    from concurrent.futures import ThreadPoolExecutor
+    from gia_runtime.imaging import image_type
+    from gia_runtime.scheduler import get_scheduler
+    from gia_runtime.trace import in_context, span
+
+    # Agent calls run at the scheduler's adaptive concurrency for this agent;
+    # the pool only needs enough threads to keep it busy
+    scheduler = get_scheduler(OCR_AGENT_NAME)
+    concurrency = max(1, int(os.environ.get("OCR_CONCURRENCY", "4")), scheduler.max_concurrency)
+    # No transport-level retries: the scheduler has to see 429s to back off
+    agent_client = client.with_retries(0)
+    connect_timeout, read_timeout = client.timeout
+
+    def process_page(i, img_path, digest=None):
+        # 1. Get the page bytes: local spool first (by content digest, never by the
+        # reusable MinIO path), HTTP download on a miss
+        blob = spool.open_blob(digest) if spool is not None and digest else None
         try:
-            dl_response = requests.get(download_url, headers=headers)
-            dl_response.raise_for_status()
-            image_bytes = dl_response.content
-            
-            # 2. Send bytes to Agent
+            if blob is not None:
+                # Spooled locally by convert_pdf_to_images: read it zero-copy, no download
+                image_bytes = blob
+            elif not img_path:
+                raise RuntimeError("page image was not uploaded")
+            else:
+                with span("download", page=i + 1) as phase:
+                    image_bytes = client.download(img_path)
+                    phase.add("bytes_in", len(image_bytes))
+
+            # 2. Send bytes to Agent, unless this exact page was OCR'd before
             data = {
-                "agent_name": "Image to Markdown", 
+                "agent_name": OCR_AGENT_NAME,
                 "prompt": "Perform OCR on the attached image. Return only the result text in markdown format without any comments. Preserve tabular formats if any."
             }
-            
-            files = {
-                'files': (f'page_{i+1}.png', io.BytesIO(image_bytes), 'image/png')
-            }
-            
-            response = requests.post(run_url, headers=headers, data=data, files=files, stream=False)
-            response.raise_for_status()
-            json_data = response.json()
-            markdown_text = json_data.get("content", "")
-            results.append(markdown_text)
-            
+            cache_key = None
+            if cache is not None:
+                from gia_runtime.cache import ocr_cache_key
+
+                cache_key = ocr_cache_key(image_bytes, data["prompt"], data["agent_name"])
+                cached_text = cache.get(cache_key)
+                if cached_text is not None:
+                    return cached_text
+
+            extension, content_type = image_type(image_bytes)
+
+            def run_agent(timeout):
+                # A fresh payload per attempt: requests read()s a spooled page's memory
+                # map to its end, so a reused one would upload nothing on a retry
+                files = [(f'page_{i+1}.{extension}', bytes(image_bytes), content_type)]
+                return agent_client.run_agent(
+                    data["agent_name"], data["prompt"], files, timeout=(connect_timeout, min(read_timeout, timeout))
+                )
+
+            with span("ocr", page=i + 1) as phase:
+                markdown_text = scheduler.call(run_agent)
+                phase.add("bytes_in", len(markdown_text.encode("utf-8")))
+            if cache_key is not None:
+                cache.put(cache_key, markdown_text)
+            return markdown_text
+
+        finally:
+            if blob is not None:
+                blob.close()
+
+    # Born-digital pages already carry markdown from the PDF text layer;
+    # only the remaining page images are sent to the vision agent.
+    if page_sources is None:
+        page_sources = [{"page": i + 1, "image": path} for i, path in enumerate(image_paths)]
+
+    completed = {}
+    if checkpoint is not None:
+        from gia_runtime.checkpoint import document_key
+
+        document = document or document_key(*(source.get("image", "") for source in page_sources))
+        completed = checkpoint.completed(document)
+        if completed:
+            print(f"Resuming from checkpoint: {len(completed)} pages already done")
+
+    failed = []
+
+    def process_source(source):
+        if "text" in source:
+            return source["text"]
+        page = source["page"]
+        if page in completed:
+            return completed[page]
+        try:
+            markdown_text = process_page(page - 1, source["image"], source.get("digest"))
         except Exception as e:
-            print(f"Error processing page {i+1} ({img_path}): {e}")
-            results.append(f"<!-- Error processing page {i+1}: {str(e)} -->")
-            
+            print(f"Error processing page {page} ({source['image']}): {e}")
+            failed.append(page)
+            if checkpoint is not None:
+                checkpoint.record_failure(document, page, e)
+            return f"<!-- Error processing page {page}: {str(e)} -->"
+        if checkpoint is not None:
+            checkpoint.record(document, page, markdown_text)
+        return markdown_text
+
+    # map() yields results in submission order, so page order is preserved
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(in_context(process_source), page_sources))
+
+    # Final assembly: every page is done, so the checkpoint is no longer needed
+    if checkpoint is not None and not failed:
+        checkpoint.clear(document)
+
     # Join all pages with newlines
-    return "\n\n".join(results)
+    return "\n\n".join(results), sorted(failed)
+
+def get_client(auth_token):
+    """Pooled GIA API client (keep-alive, timeouts, retries) shared across tasks."""
+    from gia_runtime.client import GiaClient
+
+    return GiaClient(auth_token, files_route="/api")
+
+def start_tracing():
+    """Page download and OCR timings of this run (see gia_runtime.trace), or None when disabled."""
+    from gia_runtime.trace import start_trace
+
+    return start_trace("pdf_ocr", task="process_images_with_agent")
+
+def scheduler_stats():
+    """Retries, 429s and concurrency limit of the OCR agent's scheduler."""
+    from gia_runtime.scheduler import get_scheduler
+
+    return get_scheduler(OCR_AGENT_NAME).stats()
+
+def open_cache():
+    """Open the shared OCR result cache, or None when disabled (OCR_CACHE=0)."""
+    from gia_runtime.cache import open_ocr_cache
+
+    return open_ocr_cache()
+
+def open_page_checkpoint():
+    """Open the per-page OCR checkpoint store, or None when disabled (OCR_CHECKPOINT=0)."""
+    from gia_runtime.checkpoint import open_checkpoint
+
+    return open_checkpoint()
+
+def open_local_spool():
+    """Open the worker's blob spool, or None when disabled (GIA_SPOOL=0)."""
+    from gia_runtime.spool import open_spool
+
+    return open_spool()
 
 # Main block
+_tracer = start_tracing()
 try:
     current_token = user["token"]
-    
+
     # images_data is passed from the previous step (List of strings/paths)
-    ocr_results = process_images(images_data, current_token)
-    
+    # In pipelined mode convert_pdf_to_images has already OCR'd these pages
+    if globals().get("_ocr_results_for") and globals().get("_ocr_results_for") == images_data:
+        print("Reusing OCR results from pipelined conversion")
+        _ocr_retry_pages = []
+    else:
+        # _page_sources is only trusted while it still describes the current images_data
+        _sources = globals().get("_page_sources")
+        if _sources is not None and [s["image"] for s in _sources if "image" in s] != list(images_data):
+            _sources = None
+        # Set by the same conversion as _page_sources, so trusted only along with it
+        _document = globals().get("_ocr_document") if _sources is not None else None
+        _client = get_client(current_token)
+        _cache = open_cache()
+        _checkpoint = open_page_checkpoint()
+        ocr_results, _ocr_retry_pages = process_images(
+            _client, images_data, _sources, _cache, open_local_spool(), _checkpoint, _document
+        )
+        _agent_scheduler_stats = scheduler_stats()
+        if _cache is not None:
+            _ocr_cache_stats = _cache.stats()
+            _cache.close()
+        if _checkpoint is not None:
+            _checkpoint.close()
+        del _cache, _checkpoint, _client, _document
+        if _ocr_retry_pages:
+            # Fail the task: its retry resumes from the checkpoint and only redoes these pages
+            raise RuntimeError(f"OCR failed for pages {_ocr_retry_pages}; re-run the task to retry only these")
+
 except Exception as e:
     import traceback
     traceback.print_exc()
     raise
+finally:
+    _metrics = _tracer.finish() if _tracer is not None else None
+    del _tracer
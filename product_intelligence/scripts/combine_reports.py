@@ -0,0 +1,27 @@
+"""Combines the three analysis reports into one document. | Inputs: company_name, competitor_report_result, sentiment_report_result, metrics_report_result | Outputs: combined_report"""
+
+def report_text(result):
+    # Agent results arrive either as plain text or as a response dict
+    if isinstance(result, dict):
+        for key in ("response", "result", "output", "content"):
+            if result.get(key):
+                return str(result[key]).strip()
+    return str(result or "").strip() or "_No report was produced._"
+
+
+def combine(company, sections):
+    parts = [f"# Product Intelligence Report: {company}"]
+    for title, result in sections:
+        parts.append(f"## {title}\n\n{report_text(result)}")
+    return "\n\n".join(parts) + "\n"
+
+
+# Main block: Variables defined here are GLOBAL and VISIBLE in UI
+combined_report = combine(
+    globals().get("company_name", ""),
+    [
+        ("Competitor Intelligence", globals().get("competitor_report_result")),
+        ("Market Sentiment", globals().get("sentiment_report_result")),
+        ("Launch Metrics", globals().get("metrics_report_result")),
+    ],
+)
@@ -0,0 +1,13 @@
+"""Picks the specialist locally when the transcription is clear-cut. | Inputs: transcription_result | Outputs: specialist_name, triage_confidence"""
+
+KNOWN_SPECIALISTS = ["Dr. Priya", "Dr. Philip", "Dr. Eleena", "Dr. Hima", "Dr. Eliyaz"]
+
+def triage(transcription):
+    """(specialist_name, confidence); specialist_name is None when the agent should decide."""
+    # gia_runtime is required here; TRIAGE=0 sends every transcription to the agent
+    from gia_runtime.triage import triage_transcript
+
+    return triage_transcript(transcription, KNOWN_SPECIALISTS)
+
+# Main block: Variables defined here are GLOBAL and VISIBLE in UI
+specialist_name, triage_confidence = triage(transcription_result)
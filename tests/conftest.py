@@ -0,0 +1,66 @@
+import glob
+import os
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKFLOWS = sorted(glob.glob(os.path.join(REPO, "*", "*.bpmn")))
+
+
+def workflow(relative_path):
+    """Absolute path of a shipped workflow file."""
+    return os.path.join(REPO, relative_path)
+
+
+@pytest.fixture(autouse=True)
+def private_caches(tmp_path, monkeypatch):
+    """Keep compiled models and scripts out of the user's real caches."""
+    monkeypatch.setenv("BPMN_CACHE_DIR", str(tmp_path / "bpmn_cache"))
+    monkeypatch.setenv("GIA_SCRIPT_CACHE_DIR", str(tmp_path / "script_cache"))
+
+
+def definition(body, process_id="test_process"):
+    """A BPMN document with one executable process holding ``body``."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" id="Definitions_test">\n'
+        f'  <process id="{process_id}" isExecutable="true">\n{body}\n  </process>\n'
+        '</definitions>\n'
+    )
+
+
+def service_task(element_id, result_variable, memoize=False, module="AI Agent", **parameters):
+    """A service task calling ``module.execute_agent`` with ``parameters``."""
+    values = "".join(f'<parameter name="{name}" value="{value}"/>' for name, value in parameters.items())
+    opt_in = '<memoize ttl="60"/>' if memoize else ""
+    return (
+        f'<serviceTask id="{element_id}"><extensionElements>'
+        f'<serviceConfiguration xmlns="http://example.org/service"><function>'
+        f'<moduleName>{module}</moduleName><functionName>execute_agent</functionName>'
+        f'<parameters>{values}</parameters></function>{opt_in}</serviceConfiguration>'
+        f'<resultVariable name="{result_variable}"/></extensionElements></serviceTask>'
+    )
+
+
+def flows(*pairs):
+    """Sequence flows ``source -> target`` for ``(source, target)`` or ``(source, target, condition)``."""
+    xml = []
+    for i, pair in enumerate(pairs):
+        source, target = pair[0], pair[1]
+        condition = f'<conditionExpression xsi:type="tFormalExpression">{pair[2]}</conditionExpression>' \
+            if len(pair) > 2 else ""
+        xml.append(f'<sequenceFlow id="f{i}_{source}_{target}" sourceRef="{source}" targetRef="{target}">'
+                   f'{condition}</sequenceFlow>')
+    return "\n".join(xml)
+
+
+@pytest.fixture
+def write_definition(tmp_path):
+    """Write a BPMN document to a file in the test's directory and return its path."""
+    def write(body, name="test.bpmn"):
+        path = tmp_path / name
+        path.write_text(definition(body), encoding="utf-8")
+        return str(path)
+
+    return write
@@ -0,0 +1,90 @@
+from conftest import flows, service_task, workflow
+from gia_runtime.bpmn.analyze import analyze_file, script_io
+
+
+def parallel_sets(path):
+    [result] = analyze_file(path)
+    return [sorted(members) for members in result["parallel_sets"]]
+
+
+def chain(*tasks):
+    """Start -> enter topic -> ``tasks`` in sequence -> end."""
+    ids = [task[0] for task in tasks]
+    body = ['<startEvent id="start"/>',
+            '<userTask id="enter"><extensionElements><formData>'
+            '<formField id="topic" type="String" required="true"/></formData></extensionElements></userTask>']
+    body += [task[1] for task in tasks]
+    body.append('<endEvent id="end"/>')
+    steps = ["start", "enter"] + ids + ["end"]
+    return "".join(body) + flows(*zip(steps, steps[1:]))
+
+
+def test_independent_chained_tasks_are_reported(write_definition):
+    path = write_definition(chain(
+        ("news", service_task("news", "news_result", prompt="News about {topic}")),
+        ("prices", service_task("prices", "prices_result", prompt="Prices of {topic}")),
+        ("report", service_task("report", "report_result", prompt="{news_result} {prices_result}")),
+    ))
+
+    [result] = analyze_file(path)
+
+    assert [sorted(members) for members in result["parallel_sets"]] == [["news", "prices"]]
+    assert result["dependencies"]["prices"] == ["enter"]
+    assert result["dependencies"]["report"] == ["enter", "news", "prices"]
+    assert result["saving"] > 0
+
+
+def test_data_dependent_tasks_are_not_reported(write_definition):
+    path = write_definition(chain(
+        ("news", service_task("news", "news_result", prompt="News about {topic}")),
+        ("summary", service_task("summary", "summary_result", prompt="Summarise {news_result}")),
+    ))
+
+    assert parallel_sets(path) == []
+
+
+def test_write_after_read_keeps_the_order(write_definition):
+    path = write_definition(chain(
+        ("draft", service_task("draft", "draft_result", prompt="Draft on {topic}")),
+        ("retopic", service_task("retopic", "topic", prompt="Refine {news}")),
+    ))
+
+    assert parallel_sets(path) == []
+
+
+def test_tasks_on_either_side_of_a_user_task_are_not_reported(write_definition):
+    path = write_definition(chain(
+        ("news", service_task("news", "news_result", prompt="News about {topic}")),
+        ("review", '<userTask id="review"/>'),
+        ("prices", service_task("prices", "prices_result", prompt="Prices of {topic}")),
+    ))
+
+    assert parallel_sets(path) == []
+
+
+def test_scripts_are_read_from_their_docstrings(tmp_path, write_definition):
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    (scripts / "clean.py").write_text('"""Clean up. | Inputs: topic | Outputs: clean_topic"""\n', encoding="utf-8")
+    (scripts / "stamp.py").write_text('"""Stamp. | Inputs: topic | Outputs: stamp"""\n', encoding="utf-8")
+    (scripts / "legacy.py").write_text("stamp = 1\n", encoding="utf-8")
+    independent = write_definition(chain(
+        ("clean", '<scriptTask id="clean"/>'),
+        ("stamp", '<scriptTask id="stamp"/>'),
+    ), "independent.bpmn")
+    opaque = write_definition(chain(
+        ("clean", '<scriptTask id="clean"/>'),
+        ("legacy", '<scriptTask id="legacy"/>'),
+    ), "opaque.bpmn")
+
+    assert script_io(str(scripts / "clean.py")) == ({"topic"}, {"clean_topic"})
+    assert parallel_sets(independent) == [["clean", "stamp"]]
+    assert parallel_sets(opaque) == []
+
+
+def test_shipped_workflows():
+    assert parallel_sets(workflow("tender_process/tender_process.bpmn")) == [["draft_agreement", "notify_stakeholders"]]
+    # The three analysis chains already run in parallel branches
+    [result] = analyze_file(workflow("product_intelligence/product_intelligence_workflow.bpmn"))
+    assert result["parallel_sets"] == []
+    assert result["saving"] == 0
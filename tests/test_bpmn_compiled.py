@@ -0,0 +1,130 @@
+import ast
+import itertools
+import os
+
+import pytest
+
+from conftest import WORKFLOWS, flows
+from gia_runtime.bpmn import compiled
+from gia_runtime.bpmn.compiled import ConditionError, load_model
+from gia_runtime.bpmn.model import load_process
+
+VALUES = [True, False, None, 0, 1, "Approved", "Rejected", "50", "100", "150", "abc",
+          "Dr. Priya", "Dr. Philip", "Dr. Eleena", "Dr. Hima", "Dr. Eliyaz", "Dr. Unknown"]
+
+
+def interpreted_next_flows(process, element_id, variables):
+    """The routing ``next_flows`` compiles, evaluating each condition from the parsed XML text."""
+    element = process.elements[element_id]
+    default = process.default_flow(element_id)
+    candidates = [flow for flow in process.outgoing(element_id) if flow.id != default]
+
+    def holds(flow):
+        if not flow.condition:
+            return True
+        text = flow.condition
+        if text.startswith("${") and text.endswith("}"):
+            text = text[2:-1].strip()
+        return bool(eval(text, {}, dict(variables)))
+
+    if element.type == "exclusiveGateway":
+        taken = next(([flow.id] for flow in candidates if holds(flow)), [])
+    else:
+        taken = [flow.id for flow in candidates if holds(flow)]
+    if not taken and default is not None:
+        return [default]
+    return taken
+
+
+def outcome(route):
+    try:
+        return route()
+    except Exception as e:
+        return type(e)
+
+
+def assert_same_routing(path, element_id, variables):
+    model = load_model(path)
+    process = load_process(path)
+    expected = outcome(lambda: interpreted_next_flows(process, element_id, variables))
+    actual = outcome(lambda: [model.flow_ids[flow] for flow in model.next_flows(element_id, variables)])
+    if expected == [] and model.types[model.index[element_id]].endswith("Gateway"):
+        expected = ConditionError
+    assert actual == expected, (element_id, variables)
+
+
+def conditional_elements(path):
+    process = load_process(path)
+    found = {}
+    for flow in process.flows.values():
+        if flow.condition:
+            tree = ast.parse(flow.condition.strip("${}"), mode="eval")
+            names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id != "int"}
+            found.setdefault(flow.source, set()).update(names)
+    return sorted((element_id, sorted(names)) for element_id, names in found.items())
+
+
+@pytest.mark.parametrize("path", WORKFLOWS, ids=lambda path: os.path.basename(path))
+def test_shipped_conditions_route_like_the_interpreted_path(path):
+    for element_id, names in conditional_elements(path):
+        for values in itertools.product(VALUES, repeat=len(names)):
+            assert_same_routing(path, element_id, dict(zip(names, values)))
+
+
+def test_gateway_kinds_defaults_and_wrapped_conditions(write_definition):
+    path = write_definition(
+        '<startEvent id="start"/>'
+        '<exclusiveGateway id="choose" default="f_other"/>'
+        '<inclusiveGateway id="fan" default="f_none"/>'
+        '<task id="a"/><task id="b"/><task id="other"/><task id="none"/>'
+        '<sequenceFlow id="f_a" sourceRef="choose" targetRef="a">'
+        '<conditionExpression>${score &gt; 5}</conditionExpression></sequenceFlow>'
+        '<sequenceFlow id="f_b" sourceRef="choose" targetRef="b">'
+        '<conditionExpression>score &gt; 2</conditionExpression></sequenceFlow>'
+        '<sequenceFlow id="f_other" sourceRef="choose" targetRef="other"/>'
+        '<sequenceFlow id="f_fan_a" sourceRef="fan" targetRef="a">'
+        '<conditionExpression>"x" in tags</conditionExpression></sequenceFlow>'
+        '<sequenceFlow id="f_fan_b" sourceRef="fan" targetRef="b">'
+        '<conditionExpression>"y" in tags</conditionExpression></sequenceFlow>'
+        '<sequenceFlow id="f_none" sourceRef="fan" targetRef="none"/>'
+        + flows(("start", "choose"))
+    )
+    model = load_model(path)
+
+    for score in (0, 3, 6):
+        assert_same_routing(path, "choose", {"score": score})
+    for tags in ([], ["x"], ["y"], ["x", "y"]):
+        assert_same_routing(path, "fan", {"tags": tags})
+    assert [model.flow_ids[flow] for flow in model.next_flows("choose", {"score": 6})] == ["f_a"]
+    assert [model.flow_ids[flow] for flow in model.next_flows("fan", {"tags": ["x", "y"]})] == ["f_fan_a", "f_fan_b"]
+
+
+def test_invalid_condition_fails_when_evaluated(write_definition):
+    path = write_definition(
+        '<startEvent id="start"/><exclusiveGateway id="choose"/><task id="a"/><task id="b"/>'
+        + flows(("start", "choose"), ("choose", "a", "score &gt;&gt; &gt; 1"), ("choose", "b", "True"))
+    )
+
+    model = load_model(path)
+
+    with pytest.raises(ConditionError, match="Invalid condition"):
+        model.next_flows("choose", {"score": 1})
+    assert model.successors("start") == ["choose"]
+
+
+def test_disk_cache_keeps_compiled_conditions(write_definition):
+    path = write_definition(
+        '<startEvent id="start"/><exclusiveGateway id="choose"/><task id="a"/><task id="b"/>'
+        + flows(("start", "choose"), ("choose", "a", "approved == True"), ("choose", "b", "approved == False"))
+    )
+    load_model(path)
+    before = compiled.stats()
+    # A new modification time misses the in-memory model but not the file-hash keyed disk cache
+    os.utime(path, ns=(0, 0))
+
+    model = load_model(path)
+
+    assert compiled.stats()["disk_hits"] == before["disk_hits"] + 1
+    for approved in (True, False):
+        assert_same_routing(path, "choose", {"approved": approved})
+    assert [model.flow_ids[flow] for flow in model.next_flows("choose", {"approved": False})] == ["f2_choose_b"]
@@ -0,0 +1,191 @@
+import os
+
+import pytest
+
+from conftest import WORKFLOWS, flows, service_task, workflow
+from gia_runtime.bpmn.execute import execute, load_fixture, sample_fixture
+from gia_runtime.cache import DiskCache
+from gia_runtime.claimcheck import ClaimCheckError, ClaimCheckStore, is_reference
+from gia_runtime.memo import ServiceMemo, memo_key
+from gia_runtime.spool import BlobSpool
+
+PRODUCT_INTELLIGENCE = workflow("product_intelligence/product_intelligence_workflow.bpmn")
+
+
+def entries(result, element_id):
+    return [entry for entry in result["timeline"] if entry["id"] == element_id]
+
+
+@pytest.mark.parametrize("path", WORKFLOWS, ids=lambda path: os.path.basename(path))
+def test_sample_fixture_runs_workflow_to_an_end_event(path):
+    fixture_path = sample_fixture(path)
+    assert fixture_path is not None, f"no fixture.json next to {path}"
+
+    result = execute(path, load_fixture(fixture_path), scale=0)
+
+    assert result["status"] == "completed", result["error"]
+
+
+def test_missing_required_field_fails_the_run(write_definition):
+    path = write_definition(
+        '<startEvent id="start"/>'
+        '<userTask id="ask"><extensionElements><formData>'
+        '<formField id="name" type="String" required="true"/>'
+        '<formField id="note" type="String" required="false"/>'
+        '<formField id="level" type="Number" required="true" defaultValue="1"/>'
+        '</formData></extensionElements></userTask>'
+        '<endEvent id="end"/>'
+        + flows(("start", "ask"), ("ask", "end"))
+    )
+
+    failed = execute(path, scale=0)
+    completed = execute(path, {"user_tasks": {"ask": {"name": "Ada"}}}, scale=0)
+
+    assert failed["status"] == "failed"
+    assert "required field 'name'" in failed["error"]
+    assert completed["status"] == "completed"
+    assert {name: completed["variables"][name] for name in ("name", "note", "level")} == {
+        "name": "Ada", "note": None, "level": "1"}
+
+
+def test_parallel_gateway_joins_once_after_every_branch(write_definition):
+    path = write_definition(
+        '<startEvent id="start"/>'
+        '<parallelGateway id="split"/>'
+        + service_task("slow", "slow_result", prompt="slow")
+        + service_task("fast", "fast_result", prompt="fast")
+        + '<parallelGateway id="join"/>'
+        + service_task("combine", "combined", prompt="{slow_result} + {fast_result}")
+        + '<endEvent id="end"/>'
+        + flows(("start", "split"), ("split", "slow"), ("split", "fast"), ("slow", "join"), ("fast", "join"),
+                ("join", "combine"), ("combine", "end"))
+    )
+    fixture = {"services": {"slow": {"latency": 0.2, "result": "S"}, "fast": {"latency": 0, "result": "F"},
+                            "combine": {"latency": 0}}}
+
+    result = execute(path, fixture)
+
+    assert result["status"] == "completed"
+    assert len(entries(result, "join")) == 1
+    assert len(entries(result, "combine")) == 1
+    assert entries(result, "combine")[0]["start"] >= entries(result, "slow")[0]["end"]
+    assert entries(result, "fast")[0]["end"] < entries(result, "slow")[0]["end"]
+    assert result["variables"]["combined"] == "[AI Agent.execute_agent] S + F"
+
+
+def test_parallel_branches_of_a_shipped_workflow_overlap():
+    fixture = load_fixture(sample_fixture(PRODUCT_INTELLIGENCE))
+
+    result = execute(PRODUCT_INTELLIGENCE, fixture, scale=0.005)
+
+    analyses = [entries(result, name)[0] for name in ("competitor_analysis", "sentiment_analysis", "metrics_analysis")]
+    reports = [entries(result, name)[0] for name in ("competitor_report", "sentiment_report", "metrics_report")]
+    assert result["status"] == "completed"
+    assert max(entry["start"] for entry in analyses) < min(entry["end"] for entry in analyses)
+    assert entries(result, "combine_reports")[0]["start"] >= max(entry["end"] for entry in reports)
+    assert len(entries(result, "join_reports")) == 1
+
+
+def test_memo_key_ignores_formatting_but_not_the_call():
+    key = memo_key("AI Agent", "execute_agent", {"tools": "['Google Search']", "top_k": 5.0, "prompt": "a\r\nb "})
+
+    assert key == memo_key("AI Agent", "execute_agent", {"prompt": "a\nb", "top_k": 5, "tools": ["Google Search"]})
+    assert key != memo_key("AI Agent", "execute_agent_advanced", {"prompt": "a\nb", "top_k": 5,
+                                                                  "tools": ["Google Search"]})
+    assert key != memo_key("Agent Call", "execute_agent", {"prompt": "a\nb", "top_k": 5, "tools": ["Google Search"]})
+    assert key != memo_key("AI Agent", "execute_agent", {"prompt": "a\nc", "top_k": 5, "tools": ["Google Search"]})
+
+
+def test_memo_serves_repeated_calls_and_skips_failures(tmp_path):
+    memo = ServiceMemo(DiskCache(str(tmp_path / "memo.sqlite3")))
+    calls = []
+
+    def invoke(result):
+        def call():
+            calls.append(result)
+            return result
+        return call
+
+    assert memo.call("AI Agent", "execute_agent", {"prompt": "x"}, invoke("first")) == "first"
+    assert memo.call("AI Agent", "execute_agent", {"prompt": " x "}, invoke("second")) == "first"
+    assert memo.call("AI Agent", "execute_agent", {"prompt": "y"}, invoke({"error": "quota"})) == {"error": "quota"}
+    assert memo.call("AI Agent", "execute_agent", {"prompt": "y"}, invoke("third")) == "third"
+    assert calls == ["first", {"error": "quota"}, "third"]
+
+
+def test_executor_memoizes_only_opted_in_tasks_per_parameters(tmp_path, write_definition):
+    path = write_definition(
+        '<startEvent id="start"/>'
+        + service_task("cached", "cached_result", memoize=True, prompt="About {topic}")
+        + service_task("uncached", "uncached_result", prompt="About {topic}")
+        + '<endEvent id="end"/>'
+        + flows(("start", "cached"), ("cached", "uncached"), ("uncached", "end"))
+    )
+    calls = []
+
+    def stub(function, parameters):
+        calls.append(parameters["prompt"])
+        return f"result {len(calls)}"
+
+    memo = ServiceMemo(DiskCache(str(tmp_path / "memo.sqlite3")))
+    runs = [execute(path, {"variables": {"topic": topic}}, stubs={"AI Agent": stub}, scale=0, memo=memo)
+            for topic in ("a", "a", "b")]
+
+    assert [run["variables"]["cached_result"] for run in runs] == ["result 1", "result 1", "result 4"]
+    assert calls == ["About a", "About a", "About a", "About b", "About b"]
+    assert memo.stats()["functions"]["AI Agent:execute_agent"] == {"hits": 1, "misses": 2}
+
+
+def test_claim_check_round_trips_large_values(tmp_path):
+    store = ClaimCheckStore(BlobSpool(str(tmp_path / "claims")), min_bytes=64)
+    variables = {
+        "report": "x" * 100,
+        "pages": [{"page": i, "text": "y" * 10} for i in range(5)],
+        "image": b"\x00\xff" * 50,
+        "title": "short",
+        "count": 3,
+    }
+
+    persisted = store.offload(variables)
+
+    assert [name for name in variables if is_reference(persisted[name])] == ["report", "pages", "image"]
+    assert persisted["title"] == "short" and persisted["count"] == 3
+    assert dict(store.load(persisted).materialise_all()) == variables
+
+
+def test_claim_check_keeps_references_of_unchanged_values(tmp_path):
+    store = ClaimCheckStore(BlobSpool(str(tmp_path / "claims")), min_bytes=64)
+    persisted = store.offload({"report": "x" * 100, "notes": "n" * 100})
+
+    loaded = store.load(persisted)
+    assert loaded["report"] == "x" * 100
+    loaded["notes"] = "changed " * 20
+    saved = store.offload(loaded)
+
+    assert saved["report"] is persisted["report"]
+    assert saved["notes"] != persisted["notes"]
+    assert store.materialise(saved["notes"]) == "changed " * 20
+    assert store.stats()["reused"] == 1
+
+
+def test_claim_check_reports_missing_blobs(tmp_path):
+    spool = BlobSpool(str(tmp_path / "claims"))
+    store = ClaimCheckStore(spool, min_bytes=64)
+    reference = store.put("x" * 100)
+    os.remove(spool.blob_path(reference["$claim"]))
+
+    with pytest.raises(ClaimCheckError):
+        store.load({"report": reference})["report"]
+
+
+def test_claim_checked_run_matches_plain_run(tmp_path):
+    fixture = load_fixture(sample_fixture(PRODUCT_INTELLIGENCE))
+    store = ClaimCheckStore(BlobSpool(str(tmp_path / "claims")), min_bytes=64)
+
+    plain = execute(PRODUCT_INTELLIGENCE, fixture, scale=0)
+    checked = execute(PRODUCT_INTELLIGENCE, fixture, scale=0, claims=store)
+
+    assert checked["status"] == plain["status"] == "completed"
+    assert checked["variables"] == plain["variables"]
+    assert checked["claim_check"]["offloaded"] > 0
+    assert checked["claim_check"]["materialised"] > 0
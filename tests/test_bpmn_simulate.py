@@ -0,0 +1,42 @@
+import argparse
+
+import pytest
+
+from conftest import flows, workflow
+from gia_runtime.bpmn.model import load_process
+from gia_runtime.bpmn.simulate import latency_table, parse_latency, simulate
+
+
+def test_parallel_branches_overlap_and_join_once():
+    process = load_process(workflow("product_intelligence/product_intelligence_workflow.bpmn"))
+
+    result = simulate(process, latency_table({"serviceTask": 10, "scriptTask": 0}), scale=0.01)
+
+    ids = [entry["id"] for entry in result["timeline"]]
+    assert ids.count("join_reports") == 1
+    assert ids.count("combine_reports") == 1
+    assert result["sequential"] == 60
+    # Three chains of two 10 s services run side by side
+    assert 20 <= result["elapsed"] < 40
+    assert result["speedup"] > 1.5
+
+
+def test_exclusive_gateway_takes_its_default_flow(write_definition):
+    path = write_definition(
+        '<startEvent id="start"/><exclusiveGateway id="choose" default="f_b"/>'
+        '<task id="a"/><task id="b"/><endEvent id="end"/>'
+        '<sequenceFlow id="f_a" sourceRef="choose" targetRef="a">'
+        '<conditionExpression>approved == True</conditionExpression></sequenceFlow>'
+        '<sequenceFlow id="f_b" sourceRef="choose" targetRef="b"/>'
+        + flows(("start", "choose"), ("a", "end"), ("b", "end"))
+    )
+
+    result = simulate(load_process(path), latency_table({"task": 0}), scale=0.01)
+
+    assert [entry["id"] for entry in result["timeline"]] == ["start", "choose", "b", "end"]
+
+
+def test_parse_latency():
+    assert parse_latency("competitor_analysis=45.5") == ("competitor_analysis", 45.5)
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_latency("serviceTask")
@@ -0,0 +1,91 @@
+"""Transcribes the uploaded recording with Whisper in parallel chunks. | Inputs: file_path | Outputs: transcription_result, _transcription_stats, _metrics"""
+import os
+
+WHISPER_CONFIG = "Whisper"
+WHISPER_METHOD = "transcribe_uploaded_audio_standalone"
+
+def get_client():
+    """Pooled GIA API client (keep-alive, timeouts, retries) shared across tasks."""
+    from gia_runtime.client import GiaClient
+
+    user_info = globals().get("user") or {}
+    return GiaClient(user_info.get("token") or os.getenv("GIA_API_TOKEN"))
+
+def start_tracing():
+    """Phase timings of this run (see gia_runtime.trace), or None without gia_runtime."""
+    try:
+        from gia_runtime.trace import start_trace
+    except ImportError:
+        return None
+    return start_trace("transcribe_audio", task="transcribe_audio")
+
+def whisper(client, path):
+    """Transcribe one stored audio/video file and return its text."""
+    response = client.execute_method(WHISPER_CONFIG, WHISPER_METHOD, {"file_path": path})
+    response.raise_for_status()
+    result = response.json()
+    if isinstance(result, dict):
+        if result.get("success") is False:
+            raise RuntimeError(result.get("error") or "Whisper call failed")
+        result = result.get("result", result)
+    if isinstance(result, dict):
+        result = result.get("text", "")
+    return str(result or "")
+
+def transcribe_chunked(client, media_path):
+    """Chunked transcription; returns (text, stats), or None when chunking is unavailable."""
+    try:
+        from gia_runtime.trace import in_context, span
+        from gia_runtime.transcribe import ffmpeg_available, transcribe_media
+    except ImportError:
+        return None
+    if not ffmpeg_available():
+        return None
+
+    import tempfile
+
+    base_name = os.path.splitext(os.path.basename(media_path))[0]
+    folder = f"transcription_chunks/{base_name}"
+
+    def transcribe_chunk(wav_bytes, chunk):
+        with span("upload", chunk=chunk["index"], bytes_out=len(wav_bytes)):
+            [chunk_path] = client.upload_files(folder, [(f"{base_name}_{chunk['index']:04d}.wav", wav_bytes, "audio/wav")])
+        with span("whisper", chunk=chunk["index"]) as phase:
+            text = whisper(client, chunk_path)
+            phase.add("bytes_in", len(text.encode("utf-8")))
+        return text
+
+    def report(chunk, text):
+        print(f"Transcribed {chunk['start']:.0f}-{chunk['end']:.0f}s ({len(text)} chars)")
+
+    with span("download", path=media_path) as phase, \
+            tempfile.NamedTemporaryFile(suffix=os.path.splitext(media_path)[1], delete=False) as media_file:
+        client.download_to_file(media_path, media_file)
+        phase.add("bytes_in", media_file.tell())
+    try:
+        # Chunks run on a thread pool; in_context keeps their spans in this trace
+        return transcribe_media(media_file.name, in_context(transcribe_chunk), on_chunk=report)
+    finally:
+        os.remove(media_file.name)
+
+# Main block: Variables defined here are GLOBAL and VISIBLE in UI
+_tracer = start_tracing()
+try:
+    _client = get_client()
+    _chunked = transcribe_chunked(_client, file_path)
+    if _chunked is not None:
+        transcription_result, _transcription_stats = _chunked
+        print(f"Transcribed {_transcription_stats['duration']}s of audio in "
+              f"{_transcription_stats['transcribed_chunks']} chunks, {_transcription_stats['elapsed']}s")
+    else:
+        # Without ffmpeg/gia_runtime: one request for the whole file, as before
+        transcription_result = whisper(_client, file_path)
+        _transcription_stats = None
+    del _client, _chunked
+except Exception as e:
+    import traceback
+    traceback.print_exc()
+    raise
+finally:
+    _metrics = _tracer.finish() if _tracer is not None else None
+    del _tracer
@@ -1,8 +1,11 @@
 // WebsiteInputForm - Input form for website URL
+// More URLs or a link depth above 0 switch the scraper to crawl mode
 
 const WebsiteInputForm = () => {
     const [formData, setFormData] = useState({
-        website_url: ''
+        website_url: '',
+        website_urls: '',
+        crawl_depth: 0
     });
     const [submitting, setSubmitting] = useState(false);
 
@@ -44,6 +47,30 @@ const WebsiteInputForm = () => {
                         variant="outlined"
                         helperText="Enter the full URL including https://"
                     />
+
+                    <TextField
+                        fullWidth
+                        label="More URLs to Crawl (optional)"
+                        placeholder={"https://example.com/about\nhttps://example.org"}
+                        value={formData.website_urls}
+                        onChange={(e) => handleChange('website_urls', e.target.value)}
+                        multiline
+                        minRows={2}
+                        maxRows={6}
+                        variant="outlined"
+                        helperText="One URL per line; they are scraped together with the URL above"
+                    />
+
+                    <TextField
+                        fullWidth
+                        label="Link Depth"
+                        value={formData.crawl_depth}
+                        onChange={(e) => handleChange('crawl_depth', Math.max(0, parseInt(e.target.value, 10) || 0))}
+                        type="number"
+                        inputProps={{ min: 0, max: 3 }}
+                        variant="outlined"
+                        helperText="0 scrapes only the URLs given; 1 or more also follows their same-site links"
+                    />
                     
                     <Button
                         variant="contained"